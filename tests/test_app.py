@@ -0,0 +1,120 @@
+import torch
+
+from theanimescripter.app import VideoProcessor
+from theanimescripter.pipeline import PipelineFrame
+
+
+class FakeReadBuffer:
+    yuv = False
+
+    def release(self, frame):
+        pass
+
+
+class FakeWriteBuffer:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+
+class FakeDedup:
+    def __init__(self):
+        self.lastFrame = None
+
+    def runWindow(self, frames):
+        # Frames holding the same value are duplicates of each other
+        flags = []
+        for frame in frames:
+            flags.append(self.lastFrame is not None and torch.equal(frame, self.lastFrame))
+            if not flags[-1]:
+                self.lastFrame = frame
+        return flags
+
+
+class FakeInterpolation:
+    def __init__(self, factor):
+        """
+        Writes the timesteps it is asked for instead of frames, the first frame only fills the cache like the real ones.
+        """
+        self.factor = factor
+        self.cached = None
+        self.calls = []
+
+    def run(self, frame, benchmark, writeBuffer, timesteps=None):
+        if self.cached is None:
+            self.cached = frame
+            return
+        if timesteps is None:
+            timesteps = [step / self.factor for step in range(1, self.factor)]
+        self.calls.append(timesteps)
+        for timestep in timesteps:
+            writeBuffer.write(("interpolated", timestep))
+        self.cached = frame
+
+    def cacheFrameReset(self, frame):
+        self.cached = frame
+
+
+def retimer(interpolateFactor=0, window=3):
+    processor = VideoProcessor.__new__(VideoProcessor)
+    processor.readBuffer = FakeReadBuffer()
+    processor.writeBuffer = FakeWriteBuffer()
+    processor.dedup_process = FakeDedup()
+    processor.interpolate_process = FakeInterpolation(interpolateFactor)
+    processor.interpolate = interpolateFactor > 0
+    processor.interpolate_factor = interpolateFactor
+    processor.dedup_retime = True
+    processor.dedup_window = window
+    processor.firstPassMap = None
+    processor.denoise = False
+    processor.upscale = False
+    processor.benchmark = False
+    processor.dedupCount = 0
+    processor.dedupQueue = []
+    processor.heldFrame = None
+    processor.lastIndex = 0
+    processor.previousIndex = None
+    return processor
+
+
+def render(processor, values, sceneChanges=()):
+    items = []
+    for index, value in enumerate(values):
+        items.extend(processor.dedupStage(PipelineFrame(torch.tensor([value]), index)))
+    items.extend(processor.flushDedup())
+
+    for item in items:
+        item.isSceneChange = item.index in sceneChanges
+        processor.outputStage(item)
+    return [frame if isinstance(frame, tuple) else int(frame) for frame in processor.writeBuffer.frames]
+
+
+def testDuplicatesAreRepeated():
+    processor = retimer()
+    assert render(processor, [0, 0, 0, 1, 2, 2, 3, 3]) == [0, 0, 0, 1, 2, 2, 3, 3]
+    assert processor.dedupCount == 4
+
+
+def testGapsAreInterpolatedEvenly():
+    values = [0, 0, 0, 1, 2, 2, 3, 3]
+    processor = retimer(interpolateFactor=2)
+    output = render(processor, values)
+
+    # As many frames as interpolating every source frame would give
+    assert len(output) == (len(values) - 1) * 2 + 1
+    assert processor.interpolate_process.calls == [
+        [1 / 6, 2 / 6, 3 / 6, 4 / 6, 5 / 6],
+        [1 / 2],
+        [1 / 4, 2 / 4, 3 / 4],
+    ]
+    assert output[-3:] == [3, 3, 3]
+
+
+def testSceneChangesHoldTheFrameOverTheGap():
+    processor = retimer(interpolateFactor=2)
+    output = render(processor, [0, 0, 0, 1, 2], sceneChanges={3})
+
+    assert output[:7] == [0, 1, 1, 1, 1, 1, 1]
+    assert len(output) == (5 - 1) * 2 + 1
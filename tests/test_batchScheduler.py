@@ -0,0 +1,168 @@
+import os
+import json
+import argparse
+
+from concurrent.futures import Future
+
+import pytest
+
+import theanimescripter.app as app
+import theanimescripter.batchScheduler as batchScheduler
+from theanimescripter.batchScheduler import BatchScheduler, ModelPool
+
+
+class FakeModel:
+    def __init__(self):
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+
+class FakeProcessor:
+    def __init__(self, width=1280, height=720):
+        self.width = width
+        self.height = height
+
+
+def fakeModels(processor):
+    return [processor.width * 2, processor.height * 2, FakeModel(), FakeModel(), None, FakeModel(), FakeModel()]
+
+
+def testModelPoolReusesSetsPerResolution(monkeypatch):
+    built = []
+    monkeypatch.setattr(
+        batchScheduler, "initializeModels", lambda processor: built.append(processor) or fakeModels(processor)
+    )
+    pool = ModelPool()
+
+    key, models = pool.acquire(FakeProcessor())
+    # A second video at the same time gets its own set
+    otherKey, otherModels = pool.acquire(FakeProcessor())
+    assert key == otherKey == (1280, 720)
+    assert models is not otherModels
+    assert len(built) == 2
+
+    pool.release(key, models)
+    assert all(model.resets == 1 for model in models[2:] if model is not None)
+
+    assert pool.acquire(FakeProcessor())[1] is models
+    assert pool.acquire(FakeProcessor(1920, 1080))[1] is not otherModels
+    assert len(built) == 3
+
+
+def batchArgs(output, resume=False):
+    return argparse.Namespace(
+        input="", output=output, batch_jobs=1, resume=resume, preview=False, profile=False, progress_bar=True
+    )
+
+
+@pytest.fixture
+def videos(tmp_path, monkeypatch):
+    monkeypatch.setattr(batchScheduler, "outputNameGenerator", lambda args: os.path.basename(args.input) + ".out.mp4")
+    paths = []
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        path = tmp_path / name
+        path.write_bytes(b"video")
+        paths.append(str(path))
+    return paths
+
+
+def fakeVideoProcessor(results, processed):
+    """
+    Stands in for VideoProcessor, writes a non-empty output and reports the result listed for the input.
+    """
+
+    class Processor:
+        def __init__(self, args, modelPool=None):
+            processed.append(args.input)
+            with open(args.output, "wb") as f:
+                f.write(b"partial output")
+            self.succeeded = results.get(os.path.basename(args.input), True)
+
+    return Processor
+
+
+def testFailedRenderWithAnOutputIsNotDone(tmp_path, videos, monkeypatch):
+    processed = []
+    monkeypatch.setattr(app, "VideoProcessor", fakeVideoProcessor({"b.mp4": False}, processed))
+    output = str(tmp_path / "out")
+
+    BatchScheduler(batchArgs(output), videos, str(tmp_path)).run()
+
+    with open(os.path.join(output, "batchManifest.json")) as f:
+        manifest = json.load(f)
+    assert [manifest[video]["status"] for video in videos] == ["done", "failed", "done"]
+    assert os.path.exists(manifest[videos[1]]["output"])
+
+
+def testResumeOnlyRetriesUnfinishedFiles(tmp_path, videos, monkeypatch):
+    processed = []
+    monkeypatch.setattr(app, "VideoProcessor", fakeVideoProcessor({"b.mp4": False}, processed))
+    output = str(tmp_path / "out")
+    BatchScheduler(batchArgs(output), videos, str(tmp_path)).run()
+    with open(os.path.join(output, "batchManifest.json")) as f:
+        firstOutput = json.load(f)[videos[1]]["output"]
+
+    processed.clear()
+    monkeypatch.setattr(app, "VideoProcessor", fakeVideoProcessor({}, processed))
+    scheduler = BatchScheduler(batchArgs(output, resume=True), videos, str(tmp_path))
+    scheduler.run()
+
+    assert processed == [videos[1]]
+    # The retry overwrites the partial output instead of adding another file
+    assert scheduler.manifest[videos[1]] == {"status": "done", "output": firstOutput}
+
+
+def testResumeRedoesFilesWhoseOutputWasDeleted(tmp_path, videos, monkeypatch):
+    processed = []
+    monkeypatch.setattr(app, "VideoProcessor", fakeVideoProcessor({}, processed))
+    output = str(tmp_path / "out")
+    scheduler = BatchScheduler(batchArgs(output), videos, str(tmp_path))
+    scheduler.run()
+    os.remove(scheduler.manifest[videos[2]]["output"])
+
+    processed.clear()
+    BatchScheduler(batchArgs(output, resume=True), videos, str(tmp_path)).run()
+    assert processed == [videos[2]]
+
+
+def testWithoutResumeEverythingRuns(tmp_path, videos, monkeypatch):
+    processed = []
+    monkeypatch.setattr(app, "VideoProcessor", fakeVideoProcessor({}, processed))
+    output = str(tmp_path / "out")
+    BatchScheduler(batchArgs(output), videos, str(tmp_path)).run()
+    BatchScheduler(batchArgs(output), videos, str(tmp_path)).run()
+    assert processed == videos * 2
+
+
+def processorResult(processedFrames, totalFrames=72, exactFrames=False, stageErrors=0, encoderFailed=False):
+    processor = app.VideoProcessor.__new__(app.VideoProcessor)
+    processor.input = "input.mp4"
+    processor.processedFrames = processedFrames
+    processor.totalFrames = totalFrames
+    processor.exactFrames = exactFrames
+    processor.stageErrors = stageErrors
+    processor.writeBuffer = argparse.Namespace(failed=encoderFailed)
+    return processor
+
+
+def finishedTask(error=None):
+    task = Future()
+    if error is None:
+        task.set_result(None)
+    else:
+        task.set_exception(error)
+    return task
+
+
+def testCheckResult():
+    tasks = [finishedTask() for _ in range(3)]
+    assert processorResult(72).checkResult(tasks)
+    # Estimated frame counts can be a frame off, exact ones can not
+    assert processorResult(71).checkResult(tasks)
+    assert not processorResult(71, exactFrames=True).checkResult(tasks)
+    assert not processorResult(40).checkResult(tasks)
+    assert not processorResult(72, stageErrors=1).checkResult(tasks)
+    assert not processorResult(72, encoderFailed=True).checkResult(tasks)
+    assert not processorResult(72).checkResult([finishedTask(), finishedTask(RuntimeError("boom")), finishedTask()])
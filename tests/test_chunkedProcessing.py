@@ -0,0 +1,33 @@
+from theanimescripter.chunkedProcessing import splitAtKeyframes
+
+# 100 frames at 10 fps with a keyframe every 12 frames
+FRAME_TIMES = [index / 10 for index in range(100)]
+KEYFRAMES = list(range(0, 100, 12))
+
+
+def testEvenSplitOnKeyframes():
+    assert splitAtKeyframes(FRAME_TIMES, KEYFRAMES, 4, 0, 0) == [(0, 24), (24, 48), (48, 72), (72, 100)]
+
+
+def testChunksCoverTheRange():
+    chunks = splitAtKeyframes(FRAME_TIMES, KEYFRAMES, 3, 1.0, 9.0)
+    assert chunks[0][0] == 10 and chunks[-1][1] == 90
+    for (_, end), (start, _) in zip(chunks[:-1], chunks[1:]):
+        assert end == start
+        assert start in KEYFRAMES
+
+
+def testFewerKeyframesThanChunks():
+    assert splitAtKeyframes(FRAME_TIMES, [0, 50], 4, 0, 0) == [(0, 50), (50, 100)]
+    assert splitAtKeyframes(FRAME_TIMES, [0], 4, 0, 0) == [(0, 100)]
+
+
+def testPrefersNearbySceneChanges():
+    keyframes = [0, 24, 27, 36, 48, 72]
+    # 27 is within an eighth of a chunk of the even split at 25, 36 is not
+    assert splitAtKeyframes(FRAME_TIMES, keyframes, 4, 0, 0, {27})[1][0] == 27
+    assert splitAtKeyframes(FRAME_TIMES, keyframes, 4, 0, 0, {36})[1][0] == 24
+
+
+def testEmptyRange():
+    assert splitAtKeyframes(FRAME_TIMES, KEYFRAMES, 4, 20.0, 0) == []
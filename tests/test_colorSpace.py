@@ -0,0 +1,52 @@
+import torch
+
+from theanimescripter.colorSpace import rgbToYUV420, splitPlanes, yuv420ToRGB
+
+WIDTH, HEIGHT = 64, 48
+
+
+def randomYUV(batch=(), bitDepth=8):
+    # Samples that stay inside the RGB gamut, clamped colors can not round trip
+    generator = torch.Generator().manual_seed(0)
+    scale = 1 << (bitDepth - 8)
+    frame = torch.empty((*batch, HEIGHT * 3 // 2, WIDTH), dtype=torch.int16)
+    y, u, v = splitPlanes(frame, WIDTH, HEIGHT)
+    y.copy_(torch.randint(60 * scale, 180 * scale, y.shape, generator=generator))
+    u.copy_(torch.randint(108 * scale, 148 * scale, u.shape, generator=generator))
+    v.copy_(torch.randint(108 * scale, 148 * scale, v.shape, generator=generator))
+    return frame.to(torch.uint8) if bitDepth == 8 else frame
+
+
+def testRoundTrip8Bit():
+    frame = randomYUV()
+    rgb = yuv420ToRGB(frame, WIDTH, HEIGHT)
+    assert rgb.shape == (HEIGHT, WIDTH, 3)
+
+    back = rgbToYUV420(rgb)
+    assert back.dtype == torch.uint8
+    assert back.shape == frame.shape
+    assert (back.int() - frame.int()).abs().max() <= 1
+
+
+def testRoundTrip10Bit():
+    frame = randomYUV(bitDepth=10)
+    back = rgbToYUV420(yuv420ToRGB(frame, WIDTH, HEIGHT, bitDepth=10), bitDepth=10)
+    assert back.dtype == torch.int16
+    assert (back.int() - frame.int()).abs().max() <= 1
+
+
+def testBatchMatchesSingleFrames():
+    frames = randomYUV(batch=(3,))
+    rgb = yuv420ToRGB(frames, WIDTH, HEIGHT)
+    assert rgb.shape == (3, HEIGHT, WIDTH, 3)
+    for index in range(3):
+        assert torch.equal(rgb[index], yuv420ToRGB(frames[index], WIDTH, HEIGHT))
+
+    assert torch.equal(rgbToYUV420(rgb)[1], rgbToYUV420(rgb[1]))
+
+
+def testGrayHasNeutralChroma():
+    rgb = torch.full((HEIGHT, WIDTH, 3), 128.0)
+    y, u, v = splitPlanes(rgbToYUV420(rgb), WIDTH, HEIGHT)
+    assert (u == 128).all() and (v == 128).all()
+    assert (y.int() - 126).abs().max() <= 1
@@ -0,0 +1,37 @@
+import torch
+
+from theanimescripter.dedup.dedup import DedupMSE, DedupSSIM
+
+# A slow fade, neighbouring frames are 4 apart and count as duplicates below a distance of 10
+PAN = [torch.full((32, 32, 3), 4.0 * step) for step in range(11)]
+EXPECTED = [False, True, True, False, True, True, False, True, True, False, True]
+
+
+def testComparesAgainstTheLastKeptFrame():
+    assert DedupMSE(mseThreshold=100, sampleSize=16).runWindow(PAN) == EXPECTED
+
+
+def testWindowsCarryTheReferenceOver():
+    dedup = DedupMSE(mseThreshold=100, sampleSize=16)
+    flags = []
+    for start in range(0, len(PAN), 4):
+        flags.extend(dedup.runWindow(PAN[start : start + 4]))
+    assert flags == EXPECTED
+
+    single = DedupMSE(mseThreshold=100, sampleSize=16)
+    assert [single.run(frame) for frame in PAN] == EXPECTED
+
+
+def testResetForgetsTheReference():
+    dedup = DedupMSE(mseThreshold=100, sampleSize=16)
+    dedup.runWindow(PAN[:2])
+    dedup.reset()
+    assert dedup.runWindow(PAN[1:3]) == [False, True]
+
+
+def testSSIMKeepsDifferentFrames():
+    generator = torch.Generator().manual_seed(0)
+    frame = torch.randint(0, 256, (32, 32, 3), generator=generator).float()
+    other = torch.randint(0, 256, (32, 32, 3), generator=generator).float()
+    dedup = DedupSSIM(ssimThreshold=0.9, sampleSize=16)
+    assert dedup.runWindow([frame, frame.clone(), other, other.clone()]) == [False, True, False, True]
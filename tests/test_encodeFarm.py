@@ -0,0 +1,115 @@
+import os
+import torch
+
+from queue import Queue
+
+from theanimescripter import encodeFarm
+from theanimescripter.encodeFarm import SegmentWriteBuffer
+
+
+def fakeWriter(tmp_path, monkeypatch, segments=2, segmentLength=3, frameLimit=None):
+    """
+    SegmentWriteBuffer whose encoders record what they are sent instead of running FFMPEG.
+    """
+    monkeypatch.setattr(encodeFarm, "ffmpegLogPath", str(tmp_path / "ffmpeg.log"))
+
+    writer = SegmentWriteBuffer.__new__(SegmentWriteBuffer)
+    writer.output = str(tmp_path / "output.mp4")
+    writer.ffmpegPath = "ffmpeg"
+    writer.queueSize = 8
+    writer.frameLimit = frameLimit
+    writer.frameRing = None
+    writer.hostFrame = torch.empty(1, dtype=torch.uint8)
+    writer.segments = segments
+    writer.segmentLength = segmentLength
+    writer.maxBuffers = segments * (segmentLength + 2)
+    writer.freeBuffers = Queue()
+    writer.allocatedBuffers = 0
+    writer.toHost = lambda frame, out=None: out.copy_(frame)
+    writer.encodeSettings = lambda verbose=False, output=None: ["ffmpeg", output]
+
+    writer.received = {}
+    writer.joined = None
+
+    def encodeSegments(queue, logFile):
+        segment = None
+        while (item := queue.get()) is not None:
+            if isinstance(item, str):
+                segment = os.path.basename(item)
+                writer.received[segment] = []
+                continue
+            writer.received[segment].append(int(item[0]))
+            writer.freeBuffers.put(item)
+
+    def concatSegments(paths, segmentDir):
+        writer.joined = [os.path.basename(path) for path in paths]
+
+    writer.encodeSegments = encodeSegments
+    writer.concatSegments = concatSegments
+    return writer
+
+
+def feed(writer, frames):
+    queue = Queue()
+    for index in range(frames):
+        queue.put(torch.tensor([index], dtype=torch.uint8))
+    queue.put(None)
+    writer.start(queue)
+
+
+def testSegmentsGoRoundRobin(tmp_path, monkeypatch):
+    writer = fakeWriter(tmp_path, monkeypatch)
+    feed(writer, 8)
+
+    assert writer.joined == ["segment_00000.mp4", "segment_00001.mp4", "segment_00002.mp4"]
+    assert writer.received == {
+        "segment_00000.mp4": [0, 1, 2],
+        "segment_00001.mp4": [3, 4, 5],
+        "segment_00002.mp4": [6, 7],
+    }
+    assert not writer.failed and writer.isWritingDone
+    # The segment folder is removed once the segments are joined
+    assert [name for name in os.listdir(tmp_path) if name.startswith("segments_")] == []
+
+
+def testHostBuffersAreRecycled(tmp_path, monkeypatch):
+    writer = fakeWriter(tmp_path, monkeypatch)
+    feed(writer, 100)
+
+    assert sum(len(frames) for frames in writer.received.values()) == 100
+    assert writer.allocatedBuffers <= writer.maxBuffers
+
+
+def testFrameLimit(tmp_path, monkeypatch):
+    writer = fakeWriter(tmp_path, monkeypatch, frameLimit=4)
+    feed(writer, 8)
+    assert writer.joined == ["segment_00000.mp4", "segment_00001.mp4"]
+    assert writer.received["segment_00001.mp4"] == [3]
+
+
+def testFailedSegmentsAreKept(tmp_path, monkeypatch):
+    writer = fakeWriter(tmp_path, monkeypatch)
+
+    def concatSegments(paths, segmentDir):
+        raise RuntimeError("concat failed")
+
+    writer.concatSegments = concatSegments
+    feed(writer, 4)
+
+    assert writer.failed and writer.isWritingDone
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("segments_")]) == 1
+
+
+def testConcatListEscapesQuotes(tmp_path, monkeypatch):
+    writer = SegmentWriteBuffer.__new__(SegmentWriteBuffer)
+    writer.ffmpegPath = "ffmpeg"
+    writer.output = str(tmp_path / "output.mp4")
+    writer.muxSettings = lambda verbose=False: ["-map", "0:v"]
+
+    commands = []
+    monkeypatch.setattr(encodeFarm.subprocess, "run", lambda command, check: commands.append(command))
+    writer.concatSegments([str(tmp_path / "it's.mp4")], str(tmp_path))
+
+    with open(tmp_path / "segments.txt", encoding="utf-8") as f:
+        assert f.read() == f"file '{tmp_path}/it'\\''s.mp4'\n"
+    assert commands[0][-4:] == ["0:v", "-c:v", "copy", writer.output]
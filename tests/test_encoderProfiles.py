@@ -0,0 +1,120 @@
+import json
+
+from theanimescripter.encoderProfiles import (
+    BUILTIN_PROFILES,
+    SPEED_MARGIN,
+    EncoderCalibration,
+    isCPUEncoder,
+    loadProfile,
+)
+from theanimescripter.ffmpegSettings import PRESET_LADDERS, applyPreset, matchEncoder
+
+LADDER = PRESET_LADDERS["libx264"]
+
+
+class FakeCalibration(EncoderCalibration):
+    def __init__(self, path, speeds, sample=b"frames"):
+        """
+        Calibration whose encoder speeds come from a dict of preset to fps instead of FFMPEG.
+        """
+        super().__init__(str(path))
+        self.speeds = speeds
+        self.sampleData = sample
+        self.samples = 0
+        self.measured = []
+
+    def sample(self, input, ffmpegPath, width, height, bitDepth, ffprobePath=None):
+        self.samples += 1
+        return self.sampleData
+
+    def measure(self, ffmpegPath, encodeMethod, preset, sample, width, height, fps, bitDepth, segments=1):
+        self.measured.append(preset)
+        return self.speeds.get(preset)
+
+
+def choose(calibration, segments=1):
+    return calibration.choosePreset("input.mp4", "ffmpeg", "x264", 1920, 1080, 24, "8bit", "setup", segments)
+
+
+def testApplyPresetSwapsPresetAndQuality():
+    command = applyPreset(matchEncoder("x264"), "slow", 20)
+    assert command[command.index("-preset") + 1] == "slow"
+    assert command[command.index("-crf") + 1] == "20"
+    assert matchEncoder("x264")[matchEncoder("x264").index("-preset") + 1] == "veryfast"
+
+
+def testApplyPresetKeepsUnknownPresets():
+    assert applyPreset(matchEncoder("x264"), "p7") == matchEncoder("x264")
+    assert applyPreset(matchEncoder("x264")) == matchEncoder("x264")
+
+
+def testLoadProfileMergesUserProfiles(tmp_path):
+    path = tmp_path / "encoderProfiles.json"
+    path.write_text(json.dumps({"speed": {"encode_method": "nvenc_h264"}, "mine": {"encode_method": "x265"}}))
+
+    assert loadProfile("speed", str(path)) == {"encode_method": "nvenc_h264"}
+    assert loadProfile("mine", str(path)) == {"encode_method": "x265"}
+    assert loadProfile("archive", str(path)) == BUILTIN_PROFILES["archive"]
+    assert loadProfile("missing", str(path)) is None
+
+
+def testLoadProfileSurvivesABrokenFile(tmp_path):
+    path = tmp_path / "encoderProfiles.json"
+    path.write_text("{not json")
+    assert loadProfile("balanced", str(path)) == BUILTIN_PROFILES["balanced"]
+
+
+def testCPUEncoders():
+    assert isCPUEncoder("x265")
+    assert not isCPUEncoder("nvenc_h264")
+
+
+def testKeepsTheDefaultUntilThePipelineIsMeasured(tmp_path):
+    calibration = FakeCalibration(tmp_path / "calibration.json", {})
+    assert choose(calibration) is None
+    assert calibration.samples == 0
+
+
+def testPicksTheSlowestPresetThatKeepsUp(tmp_path):
+    speeds = {preset: 400 / (index + 1) for index, preset in enumerate(LADDER)}
+    calibration = FakeCalibration(tmp_path / "calibration.json", speeds)
+    calibration.recordPipeline("setup", 100)
+
+    expected = [preset for preset in LADDER if speeds[preset] >= 100 * SPEED_MARGIN][-1]
+    assert choose(calibration) == expected
+    # The search stops at the first preset that falls behind and samples the input once
+    assert calibration.measured == LADDER[: LADDER.index(expected) + 2]
+    assert calibration.samples == 1
+
+
+def testFastestPresetWhenNothingKeepsUp(tmp_path):
+    calibration = FakeCalibration(tmp_path / "calibration.json", {preset: 10 for preset in LADDER})
+    calibration.recordPipeline("setup", 100)
+    assert choose(calibration) == LADDER[0]
+
+
+def testMeasurementsAreCachedPerSetup(tmp_path):
+    speeds = {preset: 400 / (index + 1) for index, preset in enumerate(LADDER)}
+    calibration = FakeCalibration(tmp_path / "calibration.json", speeds)
+    calibration.recordPipeline("setup", 100)
+    first = choose(calibration)
+
+    again = FakeCalibration(tmp_path / "calibration.json", {})
+    assert choose(again) == first
+    assert again.measured == [] and again.samples == 0
+
+    # Another amount of segments is a different encoder setup
+    assert choose(again, segments=4) is None
+
+
+def testNoSampleKeepsTheDefault(tmp_path):
+    calibration = FakeCalibration(tmp_path / "calibration.json", {preset: 1000 for preset in LADDER}, sample=None)
+    calibration.recordPipeline("setup", 100)
+    assert choose(calibration) is None
+    assert calibration.measured == []
+
+
+def testEncodersWithoutPresets(tmp_path):
+    calibration = FakeCalibration(tmp_path / "calibration.json", {})
+    calibration.recordPipeline("setup", 100)
+    assert calibration.choosePreset("input.mp4", "ffmpeg", "prores", 1920, 1080, 24, "8bit", "setup") is None
@@ -0,0 +1,134 @@
+import os
+
+from theanimescripter.utils.engineRegistry import EngineRegistry, shapeBound
+
+SHAPE = [1, 3, 720, 1280]
+# The smallest shape UniversalTensorRT builds its dynamic engines for
+MIN = [1, 3, 8, 8]
+
+
+def fakeRegistry(built=None, trtVersion="10.0"):
+    built = [] if built is None else built
+
+    def builder(modelPath, enginePath, fp16, inputsMin, inputsOpt, inputsMax, inputName):
+        with open(enginePath, "wb") as f:
+            f.write(b"engine")
+        built.append(enginePath)
+        return enginePath, "context"
+
+    def loader(enginePath):
+        return enginePath, "context"
+
+    return EngineRegistry(builder=builder, loader=loader, trtVersion=trtVersion)
+
+
+def writeModel(tmp_path, content=b"model"):
+    modelPath = os.path.join(tmp_path, "span.onnx")
+    with open(modelPath, "wb") as f:
+        f.write(content)
+    return modelPath
+
+
+def testStaticEngineKeepsItsLegacyName():
+    registry = fakeRegistry()
+    assert registry.enginePath("w/span.onnx", True, SHAPE, SHAPE, SHAPE) == "w/span_fp16_720x1280.engine"
+    assert registry.enginePath("w/span.onnx", False, [4, 3, 64, 64], [4, 3, 64, 64], [4, 3, 64, 64]) == "w/span_fp32_64x64_b4.engine"
+
+
+def testDynamicEngineNamesItsRange():
+    path = fakeRegistry().enginePath("span.onnx", True, [1, 3, 64, 64], SHAPE, shapeBound(SHAPE))
+    assert path == "span_fp16_1x3x64x64-1x3x1080x1920.engine"
+
+
+def testShapeBound():
+    assert shapeBound([1, 3, 720, 1280]) == [1, 3, 1080, 1920]
+    assert shapeBound([1, 3, 1080, 2000]) == [1, 3, 1440, 2560]
+    assert shapeBound([1, 3, 4320, 7680]) == [1, 3, 4320, 7680]
+
+
+def testCovers():
+    registry = fakeRegistry()
+    identity = {"modelHash": "abc", "modelSize": 5}
+    manifest = registry.describe(identity, True, [1, 3, 64, 64], SHAPE, [1, 3, 1080, 1920], "input")
+
+    assert registry.covers(manifest, identity, True, SHAPE, SHAPE)
+    assert registry.covers(manifest, identity, True, [1, 3, 64, 64], [1, 3, 1080, 1920])
+    assert not registry.covers(manifest, identity, True, [1, 3, 1440, 2560], [1, 3, 1440, 2560])
+    assert not registry.covers(manifest, identity, False, SHAPE, SHAPE)
+    assert not registry.covers(manifest, {"modelHash": "def"}, True, SHAPE, SHAPE)
+    assert not fakeRegistry(trtVersion="9.0").covers(manifest, identity, True, SHAPE, SHAPE)
+
+
+def testDynamicEngineIsReusedForSmallerShapes(tmp_path):
+    built = []
+    registry = fakeRegistry(built)
+    modelPath = writeModel(tmp_path)
+
+    registry.load(modelPath, True, MIN, SHAPE, SHAPE, dynamic=True)
+    assert len(built) == 1
+
+    smaller = [1, 3, 480, 640]
+    engine, _ = registry.load(modelPath, True, MIN, smaller, smaller, dynamic=True)
+    assert engine == built[0]
+    assert len(built) == 1
+
+
+def testFindPrefersTheExactOptimalShape(tmp_path):
+    built = []
+    registry = fakeRegistry(built)
+    modelPath = writeModel(tmp_path)
+    identity = registry.modelIdentity(modelPath)
+
+    full = [1, 3, 1080, 1920]
+    registry.load(modelPath, True, MIN, SHAPE, SHAPE, dynamic=True)
+    # Loading would reuse the dynamic engine, a static one has to be built explicitly
+    registry.build(modelPath, identity, True, full, full, full)
+    assert len(built) == 2
+
+    assert registry.find(modelPath, identity, True, SHAPE, SHAPE, SHAPE) == built[0]
+    assert registry.find(modelPath, identity, True, full, full, full) == built[1]
+    assert registry.find(modelPath, identity, False, SHAPE, SHAPE, SHAPE) is None
+
+
+def testChangedModelRebuilds(tmp_path):
+    built = []
+    modelPath = writeModel(tmp_path)
+    fakeRegistry(built).load(modelPath, True, SHAPE, SHAPE, SHAPE)
+
+    writeModel(tmp_path, b"retrained model")
+    fakeRegistry(built).load(modelPath, True, SHAPE, SHAPE, SHAPE)
+    assert len(built) == 2
+
+
+def testLegacyEngineIsAdopted(tmp_path):
+    built = []
+    registry = fakeRegistry(built)
+    modelPath = writeModel(tmp_path)
+    legacyPath = registry.enginePath(modelPath, True, SHAPE, SHAPE, SHAPE)
+    with open(legacyPath, "wb") as f:
+        f.write(b"engine")
+
+    engine, _ = registry.load(modelPath, True, SHAPE, SHAPE, SHAPE)
+    assert engine == legacyPath
+    assert not built
+    assert registry.readManifest(legacyPath)["modelHash"] == registry.modelIdentity(modelPath)["modelHash"]
+
+
+def testAdoptedEngineOnlyCoversItsShape(tmp_path):
+    built = []
+    registry = fakeRegistry(built)
+    modelPath = writeModel(tmp_path)
+    legacyPath = registry.enginePath(modelPath, True, SHAPE, SHAPE, SHAPE)
+    with open(legacyPath, "wb") as f:
+        f.write(b"engine")
+
+    # UniversalTensorRT asks for a dynamic range, the legacy engine is still only built for SHAPE
+    engine, _ = registry.load(modelPath, True, MIN, SHAPE, SHAPE, dynamic=True)
+    assert engine == legacyPath
+    manifest = registry.readManifest(legacyPath)
+    assert manifest["min"] == manifest["max"] == SHAPE
+
+    smaller = [1, 3, 480, 640]
+    engine, _ = registry.load(modelPath, True, MIN, smaller, smaller, dynamic=True)
+    assert engine != legacyPath
+    assert built == [engine]
@@ -0,0 +1,142 @@
+import numpy as np
+import torch
+
+from theanimescripter.colorSpace import rgbToYUV420
+from theanimescripter.ffmpegSettings import MAX_RING_BYTES, FrameRing, WriteBuffer, audioCodec, ringSlots
+
+
+def muxer(output, audioCodec=None, subtitleStreams=0, frameLimit=0, outpoint=0):
+    """
+    WriteBuffer whose source streams are given instead of probed.
+    """
+    writer = WriteBuffer.__new__(WriteBuffer)
+    writer.input = "input.mkv"
+    writer.output = output
+    writer.audio = True
+    writer.benchmark = False
+    writer.fps = 24
+    writer.frameLimit = frameLimit
+    writer.inpoint = 1.5
+    writer.outpoint = outpoint
+    writer.sourceStreams = lambda: {
+        "audioCodec": audioCodec,
+        "audioStreams": int(audioCodec is not None),
+        "subtitleStreams": subtitleStreams,
+    }
+    writer.hasAudio = lambda: audioCodec is not None
+    return writer
+
+
+def option(command, flag):
+    return command[command.index(flag) + 1] if flag in command else None
+
+
+def testAudioCodecCopiesWhatTheContainerHolds():
+    assert audioCodec("output.mp4", "aac") == "copy"
+    assert audioCodec("OUTPUT.MP4", "opus") == "copy"
+    assert audioCodec("output.webm", "opus") == "copy"
+
+
+def testAudioCodecEncodesWhatTheContainerCanNotHold():
+    assert audioCodec("output.mp4", "pcm_s16le") == "aac"
+    assert audioCodec("output.mov", "opus") == "aac"
+    assert audioCodec("output.webm", "aac") == "libopus"
+    assert audioCodec("output.mp4", None) == "aac"
+
+
+def testAudioCodecCopiesIntoOtherContainers():
+    assert audioCodec("output.mkv", "pcm_s16le") == "copy"
+    assert audioCodec("output.mkv", None) == "copy"
+
+
+def testMuxSettingsEncodeUnsupportedAudio():
+    command = muxer("output.mp4", "pcm_s24le").muxSettings()
+    assert option(command, "-c:a") == "aac"
+    assert option(command, "-i") == "input.mkv"
+    assert "-shortest" not in command
+
+
+def testMuxSettingsCopySubtitlesIntoMatroska():
+    command = muxer("output.mkv", "flac", subtitleStreams=1).muxSettings()
+    assert option(command, "-c:a") == "copy"
+    assert option(command, "-c:s") == "copy"
+    assert "-c:s" not in muxer("output.mp4", "aac", subtitleStreams=1).muxSettings()
+
+
+def testMuxSettingsWithoutAudio():
+    assert muxer("output.mp4").muxSettings() == ["-an"]
+
+
+def testMuxSettingsBoundTheAudio():
+    command = muxer("output.mp4", "aac", frameLimit=48, outpoint=10).muxSettings()
+    assert option(command, "-ss") == "1.5"
+    assert option(command, "-to") == "10"
+    assert option(command, "-t") == "2.0"
+
+
+def testRingSlotsCoverQueueAndPipeline():
+    assert ringSlots(50, 10, 1024) == 60
+
+
+def testRingSlotsTrimTheQueueToTheBudget():
+    slotBytes = MAX_RING_BYTES // 20
+    assert ringSlots(50, 10, slotBytes) == 20
+    # The frames the pipeline holds back are never trimmed
+    assert ringSlots(50, 30, slotBytes) == 32
+
+
+def testFrameRingRecyclesReleasedSlots():
+    ring = FrameRing(slots=2, rawShape=(6, 4), frameShape=None)
+    first = ring.acquire()
+    frame = ring.frames[first]
+    ring.retain(frame)
+
+    ring.release(frame)
+    assert ring.freeSlots.qsize() == 1
+    ring.release(frame)
+    assert ring.freeSlots.qsize() == 2
+
+    # Frames that do not come from the ring are ignored
+    ring.retain(torch.empty((6, 4), dtype=torch.uint8))
+    ring.release(torch.empty((6, 4), dtype=torch.uint8))
+    assert ring.freeSlots.qsize() == 2
+
+
+def encoder(yuv, bitDepth="8bit"):
+    writer = WriteBuffer.__new__(WriteBuffer)
+    writer.yuv = yuv
+    writer.bitDepth = bitDepth
+    writer.preview = False
+    writer.hostFrame = None
+    return writer
+
+
+def rgbFrame():
+    generator = torch.Generator().manual_seed(0)
+    return torch.randint(0, 256, (48, 64, 3), generator=generator).float()
+
+
+def testToHostConvertsRGBToYUV():
+    frame = rgbFrame()
+    host = encoder(yuv=True).toHost(frame)
+    assert host.shape == (72, 64) and host.dtype == np.uint8
+    assert np.array_equal(host, rgbToYUV420(frame).numpy())
+
+
+def testToHostConvertsRGBTo10BitYUV():
+    frame = rgbFrame()
+    host = encoder(yuv=True, bitDepth="16bit").toHost(frame)
+    assert host.dtype == np.int16
+    assert np.array_equal(host, rgbToYUV420(frame, 10).numpy())
+
+
+def testToHostPassesYUVThrough():
+    frame = rgbToYUV420(rgbFrame())
+    assert np.array_equal(encoder(yuv=True).toHost(frame), frame.numpy())
+
+
+def testToHostWidensRGBTo16Bit():
+    frame = torch.tensor([[[0.0, 128.0, 255.0]]])
+    host = encoder(yuv=False, bitDepth="16bit").toHost(frame)
+    assert host.dtype == np.uint16
+    assert host.tolist() == [[[0, 128 * 257, 65535]]]
@@ -0,0 +1,54 @@
+from theanimescripter.frameIndex import FrameIndex
+
+# 24 fps with a keyframe every 12 frames, the timestamps carry the microsecond rounding of ffprobe
+FRAME_TIMES = [round(index / 24, 6) for index in range(48)]
+KEYFRAMES = [0, 12, 24, 36]
+
+
+def index():
+    return FrameIndex(FRAME_TIMES, KEYFRAMES)
+
+
+def testWholeVideo():
+    assert index().frameRange(0, 0) == (0, 48)
+
+
+def testRangeOnFrameBoundaries():
+    # Exactly one second keeps frames 24 to 47, the frame at the outpoint is not presented
+    assert index().frameRange(1, 2) == (24, 48)
+    assert index().frameRange(0.5, 1) == (12, 24)
+
+
+def testRangeBetweenFrames():
+    # A time between two frames starts at the next one
+    assert index().frameRange(0.51, 1.01) == (13, 25)
+
+
+def testRoundedTimestamps():
+    # 1 / 24 is stored rounded down, an inpoint a hair above it still starts on that frame
+    assert index().frameRange(1 / 24, 0) == (1, 48)
+
+
+def testEmptyRanges():
+    assert index().frameRange(1.5, 1.0) == (36, 36)
+    assert index().frameRange(5, 0) == (48, 48)
+
+
+def testKeyframeBefore():
+    frameIndex = index()
+    assert frameIndex.keyframeBefore(0) == 0
+    assert frameIndex.keyframeBefore(11) == 0
+    assert frameIndex.keyframeBefore(12) == 12
+    assert frameIndex.keyframeBefore(47) == 36
+
+
+def testKeyframeBeforeFirstKeyframe():
+    # Open GOP files can start on a frame that is not a keyframe
+    assert FrameIndex(FRAME_TIMES, [5, 20]).keyframeBefore(3) == 0
+
+
+def testSeekTimeStaysBeforeTheFrame():
+    frameIndex = index()
+    assert frameIndex.seekTime(0) == 0
+    assert frameIndex.seekTime(24) < FRAME_TIMES[24]
+    assert frameIndex.frameRange(frameIndex.seekTime(24), 0)[0] == 24
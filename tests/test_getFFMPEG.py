@@ -0,0 +1,49 @@
+import os
+import platform
+
+import pytest
+
+import theanimescripter.getFFMPEG as getFFMPEG
+
+FFPROBE = "ffprobe.exe" if platform.system() == "Windows" else "ffprobe"
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    def download(ffmpegPath):
+        raise AssertionError("nothing should be downloaded")
+
+    monkeypatch.setattr(getFFMPEG, "downloadAndExtractFFMPEG", download)
+    monkeypatch.setattr(getFFMPEG, "mainPath", str(tmp_path / "tas"))
+    monkeypatch.setattr(getFFMPEG.shutil, "which", lambda name: None)
+    return tmp_path
+
+
+def testFFPROBENextToFFMPEGComesFirst(offline, monkeypatch):
+    ffmpegDir = offline / "custom"
+    ffmpegDir.mkdir()
+    (ffmpegDir / FFPROBE).write_bytes(b"")
+    monkeypatch.setattr(getFFMPEG.shutil, "which", lambda name: "/usr/bin/ffprobe")
+
+    assert getFFMPEG.getFFPROBE(str(ffmpegDir / "ffmpeg")) == str(ffmpegDir / FFPROBE)
+
+
+def testFallsBackToTheSystemPath(offline, monkeypatch):
+    monkeypatch.setattr(getFFMPEG.shutil, "which", lambda name: "/usr/bin/ffprobe")
+    assert getFFMPEG.getFFPROBE(str(offline / "custom" / "ffmpeg")) == "/usr/bin/ffprobe"
+
+
+def testFallsBackToTheFolderOfTAS(offline):
+    ffmpegDir = offline / "tas" / "ffmpeg"
+    ffmpegDir.mkdir(parents=True)
+    (ffmpegDir / FFPROBE).write_bytes(b"")
+    assert getFFMPEG.getFFPROBE() == str(ffmpegDir / FFPROBE)
+
+
+def testMissingEverywhereDownloadsIntoTheFolderOfTAS(offline, monkeypatch):
+    downloads = []
+    monkeypatch.setattr(getFFMPEG, "downloadAndExtractFFMPEG", downloads.append)
+
+    with pytest.raises(FileNotFoundError):
+        getFFMPEG.getFFPROBE(str(offline / "custom" / "ffmpeg"))
+    assert downloads == [os.path.join(str(offline / "tas"), "ffmpeg", os.path.basename(downloads[0]))]
@@ -0,0 +1,51 @@
+import torch
+
+from theanimescripter.scenechange import SceneChangeAdaptive
+
+# Regular motion with a little noise, and two cuts
+FEATURES = [None] + [(0.02 + 0.002 * (index % 5), 0.03 + 0.01 * (index % 3)) for index in range(60)]
+FEATURES[20] = FEATURES[45] = (0.4, 0.35)
+
+
+def testCalibrateSetsTheStatistics():
+    detector = SceneChangeAdaptive()
+    detector.calibrate(FEATURES)
+
+    # The median ignores the cuts
+    assert abs(detector.mean - 0.024) < 1e-6
+    assert 0 < detector.variance < 0.002**2 * 4
+    assert detector.seen == detector.warmup
+    assert 0.05 <= detector.histThreshold < 0.35
+
+
+def testCalibratedDetectorDecidesFromTheFirstFrame():
+    cut = (0.4, 0.35)
+
+    # Uncalibrated, the statistics are not trusted yet and the histogram change alone is not strong enough
+    assert not SceneChangeAdaptive().decide(cut)
+
+    detector = SceneChangeAdaptive()
+    detector.calibrate(FEATURES)
+    assert detector.decide(cut)
+
+
+def testCalibrateNeedsEnoughFrames():
+    detector = SceneChangeAdaptive(warmup=5)
+    detector.calibrate([None, (0.5, 0.5), (0.5, 0.5)])
+    assert detector.seen == 0
+    assert detector.histThreshold == 0.15
+
+
+def testCalibrateThenRun():
+    generator = torch.Generator().manual_seed(0)
+    frames = []
+    for index in range(40):
+        base = 60.0 if index < 20 else 190.0
+        frames.append(base + torch.randn((72, 128, 3), generator=generator) * 4)
+
+    detector = SceneChangeAdaptive()
+    detector.calibrate(detector.features(frames))
+    assert detector.I0 is None
+
+    flags = detector.runWindow(frames)
+    assert [index for index, flag in enumerate(flags) if flag] == [20]
@@ -0,0 +1,69 @@
+import torch
+import pytest
+
+from torch.nn import functional as F
+
+from theanimescripter.utils.tiling import TiledUpscaler, featherRamp, tileStarts
+
+
+def nearest(tile):
+    # A model without a receptive field, stitching its tiles has to give back exactly the full frame
+    return F.interpolate(tile, scale_factor=2, mode="nearest")
+
+
+def frame(height, width):
+    return torch.rand((1, 3, height, width), generator=torch.Generator().manual_seed(0))
+
+
+def testTileStartsCoverTheAxis():
+    assert tileStarts(100, 128, 16) == [0]
+    assert tileStarts(300, 128, 16) == [0, 112, 172]
+    assert tileStarts(240, 128, 16) == [0, 112]
+
+
+def testFeatherRamp():
+    ramp = featherRamp(8, 3, blendStart=True, blendEnd=False)
+    assert torch.allclose(ramp[:3], torch.tensor([0.25, 0.5, 0.75]))
+    assert (ramp[3:] == 1).all()
+    assert (featherRamp(8, 3, False, False) == 1).all()
+
+
+@pytest.mark.parametrize("height, width", [(64, 64), (100, 150), (97, 211)])
+def testStitchingMatchesTheWholeFrame(height, width):
+    shapes = set()
+
+    def runTile(tile):
+        shapes.add(tuple(tile.shape))
+        return nearest(tile)
+
+    upscaler = TiledUpscaler(runTile, upscaleFactor=2, tileSize=48, overlap=8)
+    image = frame(height, width)
+    output = upscaler.run(image)
+
+    assert output.shape == (1, 3, height * 2, width * 2)
+    assert torch.allclose(output, nearest(image), atol=1e-5)
+    # Every tile has the same shape, engines built for one tile run all of them
+    assert shapes == {(1, 3, 48, 48)}
+
+
+def testFrameSmallerThanATile():
+    upscaler = TiledUpscaler(nearest, upscaleFactor=2, tileSize=128, overlap=16)
+    image = frame(40, 60)
+    assert torch.equal(upscaler.run(image), nearest(image))
+
+
+def testThreadedStitchingMatches():
+    image = frame(100, 150)
+    expected = TiledUpscaler(nearest, tileSize=48, overlap=8).run(image)
+    threaded = TiledUpscaler(nearest, tileSize=48, overlap=8, threads=4)
+    assert torch.allclose(threaded.run(image), expected, atol=1e-6)
+    # The layout is reused for the next frame of the same size
+    assert torch.allclose(threaded.run(image), expected, atol=1e-6)
+
+
+def testNegativeOverlapStillCoversTheFrame():
+    upscaler = TiledUpscaler(nearest, tileSize=40, overlap=-8)
+    image = frame(100, 100)
+    output = upscaler.run(image)
+    assert torch.isfinite(output).all()
+    assert torch.allclose(output, nearest(image), atol=1e-5)
@@ -0,0 +1,65 @@
+import torch
+
+from theanimescripter.rifearches.IFNet_rife415 import IFNet
+from theanimescripter.unifiedInterpolate import RifeCuda
+
+SIZE = 64
+
+
+class CollectWrites:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+
+def cpuRife(interpolateFactor):
+    # The model pieces RifeCuda.handle_model sets up, with random weights instead of a download
+    rife = RifeCuda.__new__(RifeCuda)
+    rife.half = False
+    rife.width = rife.height = SIZE
+    rife.interpolateFactor = interpolateFactor
+    rife.maxBatch = 8
+    rife.model = IFNet(False, 1, interpolateFactor).eval()
+    rife.isCudaAvailable = False
+    rife.device = torch.device("cpu")
+    rife.padding = (0, 0, 0, 0)
+    rife.firstRun = True
+    rife.stream = None
+    rife.timestepCache = {}
+    rife.batchTimesteps = False
+    return rife
+
+
+def frame(value):
+    return torch.full((SIZE, SIZE, 3), value, dtype=torch.uint8)
+
+
+def testEveryPairUsesTheEncodingOfItsNewFrame():
+    rife = cpuRife(4)
+    encoded = []
+    usedEncodings = []
+    rife.model.encode.register_forward_hook(
+        lambda module, inputs, output: encoded.append(round(inputs[0].mean().item() * 255))
+    )
+    # The frame the latest encoding came from, at every call of the model
+    rife.model.register_forward_hook(lambda module, inputs, output: usedEncodings.append(encoded[-1]))
+    writes = CollectWrites()
+
+    rife.run(frame(10), False, writes)
+    # Normal pairs and retimed gaps of 2 and 3 source frames, the gaps leave the call count of the model mid cycle
+    pairs = [
+        (20, None),
+        (30, [step / 8 for step in range(1, 8)]),
+        (40, None),
+        (50, None),
+        (60, [step / 12 for step in range(1, 12)]),
+        (70, None),
+    ]
+    for value, timesteps in pairs:
+        usedEncodings.clear()
+        rife.run(frame(value), False, writes, timesteps)
+        assert usedEncodings == [value] * len(timesteps or range(3))
+
+    assert len(writes.frames) == 3 + 7 + 3 + 3 + 11 + 3
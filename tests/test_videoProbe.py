@@ -0,0 +1,77 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from theanimescripter.videoProbe import ProbeCache
+
+
+def writeVideo(path, content=b"video" * 100):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def testSectionsLiveSideBySide(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache"))
+    video = writeVideo(tmp_path / "input.mp4")
+
+    assert cache.get(video, "metadata") is None
+    cache.put(video, "metadata", {"width": 1920})
+    cache.put(video, "frameIndex", {"keyframes": [0, 12]})
+
+    assert cache.get(video, "metadata") == {"width": 1920}
+    assert cache.get(video, "frameIndex") == {"keyframes": [0, 12]}
+
+
+def testChangedFileMissesTheCache(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache"))
+    video = writeVideo(tmp_path / "input.mp4")
+    cache.put(video, "metadata", {"width": 1920})
+
+    writeVideo(video, b"other" * 100)
+    assert cache.get(video, "metadata") is None
+
+
+def testReplacedInPlaceKeepingTheModificationTime(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache"))
+    video = writeVideo(tmp_path / "input.mp4")
+    stat = os.stat(video)
+    cache.put(video, "metadata", {"width": 1920})
+
+    writeVideo(video, b"VIDEO" * 100)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(video, "metadata") is None
+
+
+def testCopiesAreCachedSeparately(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache"))
+    first = writeVideo(tmp_path / "first.mp4")
+    second = writeVideo(tmp_path / "second.mp4")
+    cache.put(first, "metadata", {"width": 1920})
+    assert cache.get(second, "metadata") is None
+
+
+def testUnreadableEntryMissesTheCache(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache"))
+    video = writeVideo(tmp_path / "input.mp4")
+    cache.put(video, "metadata", {"width": 1920})
+
+    for name in os.listdir(cache.cacheDir):
+        if name.endswith(".json"):
+            with open(os.path.join(cache.cacheDir, name), "w") as f:
+                f.write("{")
+    assert cache.get(video, "metadata") is None
+
+
+def storeKey(cacheDir, video, key):
+    ProbeCache(cacheDir).update(video, "firstPass", lambda maps: {**(maps or {}), key: key})
+
+
+def testParallelUpdatesAreKept(tmp_path):
+    cacheDir = str(tmp_path / "cache")
+    video = writeVideo(tmp_path / "input.mp4")
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(storeKey, [cacheDir] * 32, [video] * 32, [str(index) for index in range(32)]))
+
+    assert len(ProbeCache(cacheDir).get(video, "firstPass")) == 32
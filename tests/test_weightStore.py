@@ -0,0 +1,97 @@
+import os
+import json
+
+import pytest
+
+from theanimescripter.weightStore import INDEX_NAME, WeightStore, hashFile
+
+MODEL = b"weights of a model"
+
+
+def writeFile(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    # Laid out with all the files in one place, with the checksums the mirror publishes
+    folder = tmp_path / "mirror"
+    writeFile(str(folder / "span.pth"), MODEL)
+    with open(folder / INDEX_NAME, "w") as f:
+        json.dump({"span.pth": {"sha256": hashFile(str(folder / "span.pth"))}}, f)
+    return str(folder)
+
+
+def testFetchFromMirror(tmp_path, mirror):
+    store = WeightStore(str(tmp_path / "weights"), mirror)
+    path = store.fetch("span/span.pth", [], progress=False)
+
+    with open(path, "rb") as f:
+        assert f.read() == MODEL
+    assert store.load()["span/span.pth"]["sha256"] == hashFile(path)
+    assert store.verify("span/span.pth")
+
+
+def testFetchFallsBackToTheUpstreamSources(tmp_path):
+    upstream = str(tmp_path / "upstream.pth")
+    writeFile(upstream, MODEL)
+
+    store = WeightStore(str(tmp_path / "weights"), str(tmp_path / "empty"))
+    assert store.sources("span/span.pth", [upstream])[-1] == upstream
+    assert os.path.isfile(store.fetch("span/span.pth", [upstream], progress=False))
+
+
+def testFetchRejectsAChecksumMismatch(tmp_path, mirror):
+    upstream = str(tmp_path / "upstream.pth")
+    writeFile(upstream, b"a different model")
+    os.remove(os.path.join(mirror, "span.pth"))
+
+    store = WeightStore(str(tmp_path / "weights"), mirror)
+    with pytest.raises(RuntimeError):
+        store.fetch("span/span.pth", [upstream], progress=False)
+    assert os.listdir(tmp_path / "weights" / "span") == []
+
+
+def testFetchWithoutAnySource(tmp_path):
+    with pytest.raises(RuntimeError):
+        WeightStore(str(tmp_path / "weights")).fetch("span/span.pth", [], progress=False)
+
+
+def testVerifyCatchesCorruptedModels(tmp_path, mirror):
+    store = WeightStore(str(tmp_path / "weights"), mirror)
+    path = store.fetch("span/span.pth", [], progress=False)
+
+    writeFile(path, b"x" * len(MODEL))
+    assert not store.verify("span/span.pth", deep=True)
+
+    writeFile(path, b"truncated")
+    assert not store.verify("span/span.pth")
+
+
+def testVerifyIndexesModelsFromBeforeTheIndex(tmp_path, mirror):
+    root = str(tmp_path / "weights")
+    writeFile(os.path.join(root, "span", "span.pth"), MODEL)
+
+    store = WeightStore(root, mirror)
+    assert store.verify("span/span.pth")
+    assert "span/span.pth" in store.load()
+    assert not store.verify("missing.pth")
+
+
+def testVerifyAllRemovesOnlyBrokenIndexedModels(tmp_path, mirror):
+    root = str(tmp_path / "weights")
+    store = WeightStore(root, mirror)
+    path = store.fetch("span/span.pth", [], progress=False)
+    # Engines and their manifests are rewritten by TensorRT and never in the index
+    engine = os.path.join(root, "span", "span_fp16_720x1280.engine")
+    writeFile(engine, b"engine")
+
+    assert store.verifyAll(deep=True) == 0
+
+    writeFile(path, b"x" * len(MODEL))
+    assert store.verifyAll(deep=True) == 1
+    assert not os.path.exists(path)
+    assert os.path.exists(engine)
+    assert store.load() == {}
@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 import sys
+import multiprocessing
 
 os.add_dll_directory(
     str((Path(sys.exec_prefix) / "app_packages/Library/bin").resolve())
@@ -8,4 +9,5 @@ os.add_dll_directory(
 from theanimescripter.app import main
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
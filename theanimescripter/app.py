@@ -28,7 +28,9 @@ import warnings
 import sys
 import logging
 import math
+import time
 import platform
+import torch
 
 from alive_progress import alive_bar
 from concurrent.futures import ThreadPoolExecutor
@@ -36,6 +38,13 @@ from theanimescripter.argumentsChecker import createParser
 from theanimescripter.getVideoMetadata import getVideoMetadata
 from theanimescripter.initializeModels import initializeModels, Segment, Depth, Stabilize, AutoClip
 from theanimescripter.ffmpegSettings import BuildBuffer, WriteBuffer
+from theanimescripter.colorSpace import yuv420ToRGB
+from theanimescripter.pipeline import Stage, StagePipeline
+from theanimescripter.profiler import profiler
+from theanimescripter.frameIndex import FrameIndex
+from theanimescripter.firstPass import FirstPassMap
+from theanimescripter.encoderProfiles import EncoderCalibration
+from theanimescripter.getFFMPEG import getFFPROBE
 from theanimescripter.generateOutput import outputNameGenerator
 from theanimescripter.coloredPrints import green, blue, red
 
@@ -61,9 +70,14 @@ else:
 scriptVersion = "1.9.6"
 warnings.filterwarnings("ignore")
 
+# Frame counts estimated from the duration can be a frame or two off, a render this close to them still counts as complete
+FRAME_COUNT_SLACK = 2
+
+encoderCalibration = EncoderCalibration()
+
 
 class VideoProcessor:
-    def __init__(self, args):
+    def __init__(self, args, modelPool=None):
         self.input = args.input
         self.output = args.output
         self.interpolate = args.interpolate
@@ -75,6 +89,8 @@ class VideoProcessor:
         self.dedup = args.dedup
         self.dedup_method = args.dedup_method
         self.dedup_sens = args.dedup_sens
+        self.dedup_window = max(1, args.dedup_window)
+        self.dedup_retime = args.dedup_retime
         self.half = args.half
         self.inpoint = args.inpoint
         self.outpoint = args.outpoint
@@ -93,6 +109,9 @@ class VideoProcessor:
         self.resize_method = args.resize_method
         self.custom_model = args.custom_model
         self.custom_encoder = args.custom_encoder
+        self.encode_preset = args.encode_preset
+        self.encode_quality = args.encode_quality
+        self.encode_segments = args.encode_segments
         self.buffer_limit = args.buffer_limit
         self.audio = args.audio
         self.denoise = args.denoise
@@ -104,15 +123,53 @@ class VideoProcessor:
         self.scenechange = args.scenechange
         self.scenechange_sens = args.scenechange_sens
         self.scenechange_method = args.scenechange_method
+        self.scenechange_window = max(1, args.scenechange_window)
+        self.first_pass = args.first_pass
         self.upscale_skip = args.upscale_skip
         self.bit_depth = args.bit_depth
         self.stabilize = args.stabilize
         self.preview = args.preview
+        self.ring_buffer = args.ring_buffer
+        self.multiprocess = args.multiprocess
+        self.yuv_pipeline = args.yuv_pipeline
+        self.parallel_chunks = args.parallel_chunks
+        self.upscale_batch_size = args.upscale_batch_size
+        self.upscale_tile_size = args.upscale_tile_size
+        self.upscale_tile_overlap = args.upscale_tile_overlap
+        self.upscale_tile_threads = args.upscale_tile_threads
+        self.pipelined = args.pipelined
+        self.profile = args.profile
+        self.profile_live = args.profile_live
+        self.modelPool = modelPool
+        # Whether the whole range was rendered, None for the modes that do not go through start
+        self.succeeded = None
+
+        # Set by the chunked mode on the copies it hands to its workers, they are not CLI options
+        self.progress_bar = getattr(args, "progress_bar", True)
+        self.frame_limit = getattr(args, "frame_limit", 0)
+        self.profile_path = getattr(
+            args, "profile_path", os.path.join(mainPath, "profile.json")
+        )
 
-        self.width, self.height, self.fps, self.totalFrames = getVideoMetadata(
-            self.input, self.inpoint, self.outpoint
+        try:
+            self.ffprobe_path = getFFPROBE(self.ffmpeg_path)
+        except Exception as e:
+            logging.error(f"Could not find FFPROBE, falling back to OpenCV for the metadata: {e}")
+            self.ffprobe_path = None
+
+        self.width, self.height, self.fps, self.totalFrames, _ = getVideoMetadata(
+            self.input, self.inpoint, self.outpoint, self.ffprobe_path
         )
 
+        # The chunked mode knows the exact frame count of every chunk from its packets
+        self.decodeInpoint = self.inpoint
+        self.exactFrames = False
+        if getattr(args, "total_frames", 0):
+            self.totalFrames = args.total_frames
+            self.exactFrames = True
+        elif self.outpoint != 0 and self.ffprobe_path is not None:
+            self.indexFrames()
+
         self.outputFPS = (
             self.fps * self.interpolate_factor if self.interpolate else self.fps
         )
@@ -148,65 +205,332 @@ class VideoProcessor:
             # opticalFlow(self)
             pass
 
+        elif self.parallel_chunks > 1:
+            from theanimescripter.chunkedProcessing import ChunkedProcessor
+
+            logging.info(f"Processing in {self.parallel_chunks} parallel chunks")
+            ChunkedProcessor(args, self.fps, mainPath)
+
         else:
             self.start()
 
-    def processFrame(self, frame):
+    def pipelineDepth(self) -> int:
+        """
+        The most decoded frames the processing can hold at once, the frame ring is sized from it.
+        """
+        stages = 2 + sum(map(bool, [self.dedup, self.scenechange, self.denoise, self.upscale]))
+        # A threaded stage holds the frame it works on and the ones waiting in its queue
+        depth = stages * (5 if self.pipelined else 1)
+        if self.dedup:
+            depth += self.dedup_window
+        if self.scenechange:
+            depth += self.scenechange_window
+        if self.upscale:
+            depth += self.upscaleBatchSize
+        # The frame interpolation starts from and the one dedup holds back
+        return depth + 2
+
+    def pipelineKey(self) -> str:
+        """
+        The processing setup the speed of the pipeline is recorded for, encoder settings are left out on purpose.
+        """
+        return "|".join(
+            map(
+                str,
+                [
+                    f"{self.width}x{self.height}",
+                    f"{self.new_width}x{self.new_height}",
+                    self.interpolate and f"{self.interpolate_method}x{self.interpolate_factor}",
+                    self.upscale and self.upscale_method,
+                    self.denoise and self.denoise_method,
+                    self.dedup and self.dedup_method,
+                    self.scenechange and self.scenechange_method,
+                    self.half,
+                    self.bit_depth,
+                    self.device,
+                ],
+            )
+        )
+
+    def indexFrames(self):
+        """
+        Replace the estimated frame count of an inpoint / outpoint segment with the exact one from the packet timestamps.
+        """
         try:
-            if self.dedup:
-                if self.dedup_process.run(frame):
-                    self.dedupCount += 1
-                    return
-
-            if self.scenechange:
-                self.isSceneChange = self.scenechange_process.run(frame)
-                if self.isSceneChange:
-                    self.sceneChangeCounter += 1
-
-            if self.denoise:
-                frame = self.denoise_process.run(frame)
-
-            if self.upscale:
-                frame = self.upscale_process.run(frame)
-
-            if self.interpolate:
-                if self.isSceneChange:
-                    for _ in range(self.interpolate_factor - 1):
-                        self.writeBuffer.write(frame)
-                    self.interpolate_process.cacheFrameReset(frame)
-                else:
+            frameIndex = FrameIndex.load(self.ffprobe_path, self.input)
+        except Exception as e:
+            logging.error(f"Could not index the frames, falling back to the estimated frame count: {e}")
+            return
+
+        start, end = frameIndex.frameRange(self.inpoint, self.outpoint)
+        if start == end:
+            logging.error("No frames between the inpoint and outpoint, falling back to the estimated frame count")
+            return
+
+        self.totalFrames = end - start
+        self.decodeInpoint = frameIndex.seekTime(start)
+        self.exactFrames = True
+        logging.info(
+            f"Decoding frames {start} to {end - 1} from the keyframe at frame {frameIndex.keyframeBefore(start)}"
+        )
+
+    def runFirstPass(self):
+        """
+        Find the duplicates and scene changes of the whole range up front at a low resolution, the pipeline then looks
+        them up by frame index instead of running the detectors on full resolution frames.
+        """
+        sceneChangeProcess = self.scenechange_process if self.scenechange else None
+        if self.scenechange_method == "differential-tensorrt":
+            # The engine is built for full resolution frames
+            logging.info("Differential TensorRT needs full resolution frames, scene changes are detected while processing")
+            sceneChangeProcess = None
+
+        try:
+            self.firstPassMap = FirstPassMap.load(
+                self.input,
+                self.ffmpeg_path,
+                self.decodeInpoint,
+                self.outpoint,
+                self.totalFrames,
+                self.exactFrames,
+                dedupProcess=self.dedup_process if self.dedup else None,
+                dedupWindow=self.dedup_window,
+                sceneChangeProcess=sceneChangeProcess,
+                settings={
+                    "dedupMethod": self.dedup_method,
+                    "dedupSens": self.dedup_sens,
+                    "sceneChangeMethod": self.scenechange_method,
+                    "sceneChangeSens": self.scenechange_sens,
+                },
+                size=self.sample_size,
+                width=self.width,
+                height=self.height,
+            )
+        except Exception as e:
+            logging.error(f"The first pass failed, detecting duplicates and scene changes while processing: {e}")
+            self.firstPassMap = None
+
+    def buildStages(self):
+        """
+        The enabled processing steps in the order every frame goes through them.
+        """
+        stages = []
+        if self.readBuffer.yuv:
+            stages.append(Stage("convert", self.convertStage))
+        if self.dedup:
+            stages.append(Stage("dedup", self.dedupStage, self.flushDedup))
+        if self.scenechange:
+            stages.append(Stage("scenechange", self.sceneChangeStage, self.flushSceneChange))
+        if self.denoise:
+            stages.append(Stage("denoise", self.denoiseStage))
+        if self.upscale:
+            stages.append(
+                Stage(
+                    "upscale",
+                    self.upscaleStage,
+                    self.flushUpscale if self.upscaleBatchSize > 1 else None,
+                )
+            )
+        stages.append(Stage("output", self.outputStage))
+        return stages
+
+    def releaseFrame(self, item):
+        if item.sourceFrame is not None:
+            self.readBuffer.release(item.sourceFrame)
+            item.sourceFrame = None
+
+    def convertStage(self, item):
+        item.frame = yuv420ToRGB(
+            item.frame.to(self.device, non_blocking=True),
+            self.width,
+            self.height,
+            bitDepth=8 if self.bit_depth == "8bit" else 10,
+        )
+        return [item]
+
+    def dedupStage(self, item):
+        self.dedupQueue.append(item)
+        if len(self.dedupQueue) == self.dedup_window:
+            return self.dedupWindow()
+        return []
+
+    def dedupWindow(self):
+        """
+        Compare the queued frames in one pass and send the ones that are not duplicates down the rest of the pipeline.
+        """
+        items, self.dedupQueue = self.dedupQueue, []
+        if not items:
+            return []
+
+        keep = []
+        if self.firstPassMap is not None and self.firstPassMap.duplicates is not None:
+            duplicates = self.firstPassMap.duplicateFlags([item.index for item in items])
+        else:
+            duplicates = self.dedup_process.runWindow([item.frame for item in items])
+        for item, isDuplicate in zip(items, duplicates):
+            if isDuplicate:
+                self.dedupCount += 1
+                self.releaseFrame(item)
+            else:
+                keep.append(item)
+
+        if not self.dedup_retime:
+            return keep
+
+        # How long a frame is held only becomes known once the next unique frame shows up
+        self.lastIndex = items[-1].index
+        ready = []
+        for item in keep:
+            if self.heldFrame is not None:
+                if not self.interpolate:
+                    self.heldFrame.repeat = item.index - self.heldFrame.index - 1
+                ready.append(self.heldFrame)
+            self.heldFrame = item
+        return ready
+
+    def flushDedup(self):
+        items = self.dedupWindow()
+        if self.dedup_retime and self.heldFrame is not None:
+            # Interpolation fills the gaps between unique frames, only the duplicates at the very end are repeated
+            factor = int(self.interpolate_factor) if self.interpolate else 1
+            self.heldFrame.repeat = (self.lastIndex - self.heldFrame.index) * factor
+            items.append(self.heldFrame)
+            self.heldFrame = None
+        return items
+
+    def sceneChangeStage(self, item):
+        if self.firstPassMap is not None and self.firstPassMap.sceneChanges is not None:
+            item.isSceneChange = self.firstPassMap.isSceneChange(item.index)
+            self.sceneChangeCounter += item.isSceneChange
+            return [item]
+
+        self.sceneChangeQueue.append(item)
+        if len(self.sceneChangeQueue) == self.scenechange_window:
+            return self.flushSceneChange()
+        return []
+
+    def flushSceneChange(self):
+        """
+        Score the queued frames against their predecessors in one pass and send them down the rest of the pipeline.
+        """
+        items, self.sceneChangeQueue = self.sceneChangeQueue, []
+        if not items:
+            return []
+
+        sceneChanges = self.scenechange_process.runWindow([item.frame for item in items])
+        for item, isSceneChange in zip(items, sceneChanges):
+            item.isSceneChange = isSceneChange
+            self.sceneChangeCounter += isSceneChange
+        return items
+
+    def denoiseStage(self, item):
+        item.frame = self.denoise_process.run(item.frame)
+        return [item]
+
+    def upscaleStage(self, item):
+        if self.upscaleBatchSize == 1:
+            item.frame = self.upscale_process.run(item.frame)
+            return [item]
+
+        # The copy into the batch lets the decoder reuse its buffer right away
+        if self.upscaleBatch is None:
+            self.upscaleBatch = torch.empty(
+                (self.upscaleBatchSize, *item.frame.shape),
+                dtype=item.frame.dtype,
+                device=item.frame.device,
+            )
+
+        self.upscaleBatch[len(self.upscaleQueue)].copy_(item.frame)
+        self.releaseFrame(item)
+        self.upscaleQueue.append(item)
+
+        if len(self.upscaleQueue) == self.upscaleBatchSize:
+            return self.flushUpscale()
+        return []
+
+    def flushUpscale(self):
+        """
+        Upscale the queued frames in one pass and send them down the rest of the pipeline in order.
+        """
+        items, self.upscaleQueue = self.upscaleQueue, []
+        if not items:
+            return []
+
+        outputs = self.upscale_process.runBatch(self.upscaleBatch[: len(items)])
+        for item, output in zip(items, outputs):
+            item.frame = output
+        return items
+
+    def outputStage(self, item):
+        # Untouched frames go back to the encoder in their original YUV form
+        outputFrame = (
+            item.sourceFrame
+            if self.readBuffer.yuv and not self.denoise and not self.upscale
+            else item.frame
+        )
+
+        if self.interpolate:
+            # Retimed frames can stand for several source frames, the gap is filled at evenly spaced timesteps
+            factor = int(self.interpolate_factor)
+            gap = 1
+            if self.dedup_retime and self.previousIndex is not None:
+                gap = item.index - self.previousIndex
+            self.previousIndex = item.index
+            timesteps = None
+            if gap != 1:
+                timesteps = [step / (gap * factor) for step in range(1, gap * factor)]
+
+            if item.isSceneChange:
+                for _ in range(gap * factor - 1):
+                    self.writeBuffer.write(outputFrame)
+                self.interpolate_process.cacheFrameReset(item.frame)
+            else:
+                with profiler.measure("interpolate"):
                     self.interpolate_process.run(
-                        frame, self.benchmark, self.writeBuffer
+                        item.frame, self.benchmark, self.writeBuffer, timesteps
                     )
 
-            if not self.benchmark:
-                self.writeBuffer.write(frame)
+        if not self.benchmark:
+            for _ in range(1 + item.repeat):
+                self.writeBuffer.write(outputFrame)
 
-        except Exception as e:
-            logging.exception(f"Something went wrong while processing the frames, {e}")
+        self.releaseFrame(item)
+        return []
 
     def process(self):
         frameCount = 0
         self.dedupCount = 0
-        self.isSceneChange = False
+        self.dedupQueue = []
+        self.heldFrame = None
+        self.lastIndex = 0
+        self.previousIndex = None
         self.sceneChangeCounter = 0
+        self.sceneChangeQueue = []
         increment = 1 if not self.interpolate else math.ceil(self.interpolate_factor)
+
+        pipeline = StagePipeline(
+            self.buildStages(), threaded=self.pipelined, onError=self.releaseFrame
+        )
         with alive_bar(
             self.totalFrames * increment,
             title="Processing",
             bar="smooth",
             unit="frames",
             enrich_print=False,
+            disable=not self.progress_bar,
         ) as bar:
             for _ in range(self.totalFrames):
                 frame = self.readBuffer.read()
                 if frame is None:
-                    self.writeBuffer.close()
                     break
-                self.processFrame(frame)
+                pipeline.submit(frame)
                 frameCount += 1
                 bar(increment)
 
+            pipeline.close()
+
+        self.processedFrames = frameCount
+        self.stageErrors = pipeline.errors
         logging.info(f"Processed {frameCount} frames")
         if self.dedupCount > 0:
             logging.info(f"Deduplicated {self.dedupCount} frames")
@@ -221,6 +545,12 @@ class VideoProcessor:
 
     def start(self):
         try:
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            if self.modelPool is not None:
+                modelKey, models = self.modelPool.acquire(self)
+            else:
+                models = initializeModels(self)
+
             (
                 self.new_width,
                 self.new_height,
@@ -229,12 +559,58 @@ class VideoProcessor:
                 self.denoise_process,
                 self.dedup_process,
                 self.scenechange_process,
-            ) = initializeModels(self)
+            ) = models
+
+            self.firstPassMap = None
+            if self.first_pass and (self.dedup or self.scenechange):
+                self.runFirstPass()
+
+            self.upscaleBatchSize = 1
+            self.upscaleBatch = None
+            self.upscaleQueue = []
+            if self.upscale and self.upscale_batch_size > 1:
+                if hasattr(self.upscale_process, "runBatch") and not self.upscale_skip:
+                    self.upscaleBatchSize = self.upscale_batch_size
+                    logging.info(f"Upscaling in batches of {self.upscaleBatchSize} frames")
+                else:
+                    logging.info(
+                        "Batched upscaling is only supported by the PyTorch upscalers without upscale skip, upscaling one frame at a time"
+                    )
 
-            self.readBuffer = BuildBuffer(
+            readBufferClass, writeBufferClass = BuildBuffer, WriteBuffer
+            if self.multiprocess:
+                from theanimescripter.sharedBuffers import (
+                    ProcessBuildBuffer,
+                    ProcessWriteBuffer,
+                )
+
+                readBufferClass, writeBufferClass = ProcessBuildBuffer, ProcessWriteBuffer
+
+            writeBufferOptions = {}
+            if self.encode_segments > 1:
+                from theanimescripter.encodeFarm import SegmentWriteBuffer
+
+                writeBufferClass = SegmentWriteBuffer
+                writeBufferOptions["segments"] = self.encode_segments
+
+            if self.encode_preset == "auto":
+                self.encode_preset = encoderCalibration.choosePreset(
+                    self.input,
+                    self.ffmpeg_path,
+                    self.encode_method,
+                    self.new_width,
+                    self.new_height,
+                    self.outputFPS,
+                    self.bit_depth,
+                    self.pipelineKey(),
+                    self.encode_segments,
+                    self.ffprobe_path,
+                )
+
+            self.readBuffer = readBufferClass(
                 self.input,
                 self.ffmpeg_path,
-                self.inpoint,
+                self.decodeInpoint,
                 self.outpoint,
                 self.dedup,
                 self.dedup_sens,
@@ -245,9 +621,14 @@ class VideoProcessor:
                 self.resize_method,
                 self.buffer_limit,
                 totalFrames=self.totalFrames,
+                ringBuffer=self.ring_buffer,
+                yuv=self.yuv_pipeline,
+                bitDepth=self.bit_depth,
+                exactFrames=self.exactFrames,
+                pipelineDepth=self.pipelineDepth(),
             )
 
-            self.writeBuffer = WriteBuffer(
+            self.writeBuffer = writeBufferClass(
                 self.input,
                 self.output,
                 self.ffmpeg_path,
@@ -267,6 +648,14 @@ class VideoProcessor:
                 inpoint=self.inpoint,
                 outpoint=self.outpoint,
                 preview=self.preview,
+                frameRing=self.readBuffer.frameRing,
+                # 16 bit input is always decoded as YUV, the encoder is fed the same way
+                yuv=self.readBuffer.yuv,
+                frameLimit=self.frame_limit,
+                ffprobePath=self.ffprobe_path,
+                encodePreset=self.encode_preset or None,
+                encodeQuality=self.encode_quality,
+                **writeBufferOptions,
             )
 
             if self.preview:
@@ -276,16 +665,68 @@ class VideoProcessor:
                     writeBuffer=self.writeBuffer,
                 )
 
-            with ThreadPoolExecutor(max_workers=4 if self.preview else 3) as executor:
-                executor.submit(self.readBuffer.start)
-                executor.submit(self.process)
-                executor.submit(self.writeBuffer.start)
-                if self.preview:
-                    executor.submit(self.preview.start)
+            if self.profile:
+                profiler.enable(self.profile_path, self.profile_live)
+
+            try:
+                processStart = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=4 if self.preview else 3) as executor:
+                    tasks = [
+                        executor.submit(self.readBuffer.start),
+                        executor.submit(self.process),
+                        executor.submit(self.writeBuffer.start),
+                    ]
+                    if self.preview:
+                        executor.submit(self.preview.start)
+
+                self.succeeded = self.checkResult(tasks)
+
+                # Time spent waiting on the encoder does not count, the next auto preset has to keep up with the processing alone
+                busy = time.perf_counter() - processStart - self.writeBuffer.writeStall
+                if self.writeBuffer.queuedFrames and busy > 0:
+                    encoderCalibration.recordPipeline(
+                        self.pipelineKey(), self.writeBuffer.queuedFrames / busy
+                    )
+            finally:
+                if self.modelPool is not None:
+                    self.modelPool.release(modelKey, models)
+
+                if self.multiprocess:
+                    self.readBuffer.frameRing.close()
+
+                if self.profile:
+                    profiler.stop()
+                    toPrint = f"Profiling report saved to {self.profile_path}"
+                    logging.info(toPrint)
+                    if self.progress_bar:
+                        print(green(toPrint))
 
         except Exception as e:
+            self.succeeded = False
             logging.exception(f"Something went wrong: {e}")
 
+    def checkResult(self, tasks: list) -> bool:
+        """
+        Whether the render is complete, every frame of the range went through the pipeline and the encoder finished cleanly.
+        Stages and encoders log their errors and keep going, an output file existing says nothing about it.
+
+        tasks: list - The futures of the decoder, the processing and the encoder.
+        """
+        problems = [f"{task.exception()}" for task in tasks if task.exception() is not None]
+        if getattr(self, "stageErrors", 0):
+            problems.append(f"{self.stageErrors} frames failed in the pipeline")
+        if getattr(self.writeBuffer, "failed", False):
+            problems.append("the encoder failed")
+
+        processedFrames = getattr(self, "processedFrames", 0)
+        slack = 0 if self.exactFrames else FRAME_COUNT_SLACK
+        if processedFrames < self.totalFrames - slack or processedFrames == 0:
+            problems.append(f"only {processedFrames} of {self.totalFrames} frames were processed")
+
+        for problem in problems:
+            logging.error(f"The render of {self.input} is incomplete, {problem}")
+        return not problems
+
 
 def main():
     logging.basicConfig(
@@ -319,26 +760,12 @@ def main():
         toPrint = f"Processing {len(videoFiles)} files"
         logging.info(toPrint)
         print(blue(toPrint))
-        copyArgsOutput = args.output if args.output else None
-        if args.output:
-            os.makedirs(args.output, exist_ok=True)
-
-        for videoFile in videoFiles:
-            args.input = os.path.abspath(videoFile)
-            toPrint = f"Processing {args.input}"
-            logging.info(toPrint)
-            print(green(toPrint))
-
-            if copyArgsOutput is None:
-                outputFolder = os.path.join(outputPath, "output")
-                os.makedirs(outputFolder, exist_ok=True)
-                args.output = os.path.join(outputFolder, outputNameGenerator(args))
-            elif os.path.isdir(copyArgsOutput):
-                args.output = os.path.join(copyArgsOutput, outputNameGenerator(args))
-
-            print(green(f"Output File: {args.output}"))
-            VideoProcessor(args)
-            args.output = copyArgsOutput
+
+        from theanimescripter.batchScheduler import BatchScheduler
+
+        BatchScheduler(
+            args, [os.path.abspath(videoFile) for videoFile in videoFiles], outputPath
+        ).run()
     else:
         toPrint = f"File or directory {args.input} does not exist, exiting"
         print(red(toPrint))
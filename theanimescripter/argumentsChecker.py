@@ -8,8 +8,8 @@ from .generateOutput import outputNameGenerator
 from .checkSpecs import checkSystem
 from .getFFMPEG import getFFMPEG
 from .ytdlp import VideoDownloader
-from .downloadModels import downloadModels, modelsList
-from .coloredPrints import green, red
+from .downloadModels import modelsList, prefetchModels, setMirror, weightStore
+from .coloredPrints import green, red, yellow
 
 
 def createParser(isFrozen, scriptVersion, mainPath, outputPath):
@@ -42,6 +42,49 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
     performanceGroup.add_argument(
         "--half", type=bool, help="Use half precision for inference", default=True
     )
+    performanceGroup.add_argument(
+        "--ring_buffer",
+        action="store_true",
+        help="Decode into a fixed ring of preallocated frame buffers to avoid per frame allocations",
+    )
+    performanceGroup.add_argument(
+        "--multiprocess",
+        action="store_true",
+        help="Decode and feed the encoder from separate processes, frames move between them through shared memory instead of contending for the GIL",
+    )
+    performanceGroup.add_argument(
+        "--yuv_pipeline",
+        action="store_true",
+        help="Keep frames in YUV420 between FFMPEG and the models, the color conversion runs on the inference device instead of the CPU",
+    )
+    performanceGroup.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Run every enabled processing step in its own thread so consecutive frames overlap, the throughput is then set by the slowest step",
+    )
+    performanceGroup.add_argument(
+        "--parallel_chunks",
+        type=int,
+        default=0,
+        help="Split the video at keyframes and process this many chunks at once in separate processes, meant for CPU nodes with many cores",
+    )
+    performanceGroup.add_argument(
+        "--batch_jobs",
+        type=int,
+        default=1,
+        help="When the input is a directory, process this many videos at once, models are loaded once per job and reused between videos",
+    )
+    performanceGroup.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time decoding, every processing step and encoding and write the latencies, queue depths and stalls to profile.json in the TAS folder",
+    )
+    performanceGroup.add_argument(
+        "--profile_live",
+        type=float,
+        default=0,
+        help="Rewrite the profiling report every this many seconds while processing, 0 only writes it at the end",
+    )
 
     # Interpolation options
     interpolationGroup = argParser.add_argument_group("Interpolation")
@@ -140,6 +183,30 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
         action="store_true",
         help="Use SSIM / SSIM-CUDA to skip duplicate frames when upscaling",
     )
+    upscaleGroup.add_argument(
+        "--upscale_batch_size",
+        type=int,
+        default=1,
+        help="Upscale this many frames in a single forward pass, helps small models that are bound by launch overhead. PyTorch upscalers only",
+    )
+    upscaleGroup.add_argument(
+        "--upscale_tile_size",
+        type=int,
+        default=0,
+        help="Upscale in tiles of this many pixels to bound memory usage, 0 disables tiling. PyTorch and DirectML upscalers only",
+    )
+    upscaleGroup.add_argument(
+        "--upscale_tile_overlap",
+        type=int,
+        default=16,
+        help="How many pixels neighbouring tiles share, the seams are blended across them",
+    )
+    upscaleGroup.add_argument(
+        "--upscale_tile_threads",
+        type=int,
+        default=1,
+        help="How many tiles to upscale at once, PyTorch upscalers only",
+    )
 
     # Deduplication options
     dedupGroup = argParser.add_argument_group("Deduplication")
@@ -159,6 +226,17 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
     dedupGroup.add_argument(
         "--sample_size", type=int, default=224, help="Sample size for deduplication"
     )
+    dedupGroup.add_argument(
+        "--dedup_window",
+        type=int,
+        default=8,
+        help="How many frames are compared at once, every frame is checked against the last frame that was kept",
+    )
+    dedupGroup.add_argument(
+        "--dedup_retime",
+        action="store_true",
+        help="Keep the timing of the input, duplicates are only processed once and the gaps they leave are filled by interpolation or by repeating the unique frame",
+    )
 
     # Video processing options
     processingGroup = argParser.add_argument_group("Video Processing")
@@ -240,6 +318,7 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
             "differential-tensorrt",
             "shift_lpips-tensorrt",
             "shift_lpips-directml",
+            "adaptive",
         ],
         help="Scene change detection method",
     )
@@ -249,6 +328,17 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
         default=50,
         help="Scene change detection sensitivity (0-100)",
     )
+    sceneGroup.add_argument(
+        "--scenechange_window",
+        type=int,
+        default=8,
+        help="How many frames are scored at once, the frames wait until their window is full",
+    )
+    sceneGroup.add_argument(
+        "--first_pass",
+        action="store_true",
+        help="Find the scene changes and duplicates in a fast low resolution pass before processing, the results are cached per file",
+    )
 
     # Depth estimation options
     depthGroup = argParser.add_argument_group("Depth Estimation")
@@ -307,6 +397,30 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
     encodingGroup.add_argument(
         "--custom_encoder", type=str, default="", help="Custom encoder settings"
     )
+    encodingGroup.add_argument(
+        "--encode_profile",
+        type=str,
+        default="",
+        help="A named encoder profile from encoderProfiles.json in the TAS folder or one of speed, balanced, archive and av1, it sets the encode method, preset, quality and segments",
+    )
+    encodingGroup.add_argument(
+        "--encode_preset",
+        type=str,
+        default="",
+        help="Replace the preset of the encode method, auto picks the slowest preset that keeps up with the processing",
+    )
+    encodingGroup.add_argument(
+        "--encode_quality",
+        type=int,
+        default=None,
+        help="Replace the CRF, CQ or QP of the encode method",
+    )
+    encodingGroup.add_argument(
+        "--encode_segments",
+        type=int,
+        default=1,
+        help="Encode this many segments of the output at once with CPU encoders and join them losslessly at the end",
+    )
 
     # Flow options
     flowGroup = argParser.add_argument_group("Optical Flow")
@@ -332,6 +446,11 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
     miscGroup.add_argument(
         "--benchmark", action="store_true", help="Benchmark the script"
     )
+    miscGroup.add_argument(
+        "--resume",
+        action="store_true",
+        help="When the input is a directory, skip the videos a previous run of the same batch already finished",
+    )
     miscGroup.add_argument(
         "--offline",
         type=str,
@@ -339,6 +458,31 @@ def createParser(isFrozen, scriptVersion, mainPath, outputPath):
         default="none",
         help="Download a specific model or multiple models for offline use, use keyword 'all' to download all models",
     )
+    miscGroup.add_argument(
+        "--weights_mirror",
+        type=str,
+        default=None,
+        help="A local directory or an HTTP server to fetch models from before the internet, defaults to the TAS_WEIGHTS_MIRROR environment variable",
+    )
+    miscGroup.add_argument(
+        "--verify_weights",
+        action="store_true",
+        help="Hash every downloaded model against its checksum instead of only checking its size and modification time",
+    )
+    miscGroup.add_argument(
+        "--build_engines",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Build the TensorRT engines of one or more models ahead of time, e.g. span-tensorrt rife4.22-tensorrt",
+    )
+    miscGroup.add_argument(
+        "--build_resolutions",
+        type=str,
+        nargs="*",
+        default=["1920x1080"],
+        help="The input resolutions --build_engines builds for, as WIDTHxHEIGHT",
+    )
     miscGroup.add_argument(
         "--ae",
         action="store_true",
@@ -388,31 +532,51 @@ __/\\\\\\\\\\\\\\\_____/\\\\\\\\\________/\\\\\\\\\\\___
     logging.info("\n============== Arguments Checker ==============")
     args.ffmpeg_path = getFFMPEG()
 
+    if args.weights_mirror:
+        setMirror(args.weights_mirror)
+
+    removed = weightStore.verifyAll(deep=args.verify_weights)
+    if removed:
+        toPrint = f"{removed} downloaded models did not match their checksums and will be downloaded again"
+        logging.warning(toPrint)
+        print(yellow(toPrint))
+
     if args.offline != "none":
         toPrint = "Offline mode enabled, downloading all available models, this can take some time but it will allow for the script to be used offline"
         logging.info(toPrint)
         print(green(toPrint))
 
         options = modelsList() if args.offline == ["all"] else args.offline
-        for option in options:
-            for precision in [True, False]:
-                try:
-                    option = option.lower()
-                    downloadModels(option, half=precision)
-                except Exception as e:
-                    logging.error(e)
-                    print(
-                        red(
-                            f"Failed to download model: {option} with precision: "
-                            + ("fp16" if precision else "fp32")
-                        )
-                    )
-
-        toPrint = "All models downloaded!"
+        failed = prefetchModels(options)
+
+        toPrint = (
+            f"{len(failed)} models failed to download: {', '.join(failed)}"
+            if failed
+            else "All models downloaded!"
+        )
         logging.info(toPrint)
-        print(green(toPrint))
+        print(red(toPrint) if failed else green(toPrint))
+
+    if args.build_engines:
+        from .utils.engineRegistry import buildEngines
+
+        buildEngines(
+            args.build_engines,
+            args.build_resolutions,
+            half=args.half,
+            upscaleFactor=args.upscale_factor,
+            interpolateFactor=int(args.interpolate_factor),
+            ensemble=args.ensemble,
+        )
 
-    if args.dedup:
+        if args.input is None:
+            sys.exit()
+
+    if args.dedup_retime and not args.dedup:
+        logging.info("Dedup retime requires dedup, disabling dedup retime")
+        args.dedup_retime = False
+
+    if args.dedup and not args.dedup_retime:
         logging.info("Dedup is enabled, audio will be disabled")
         args.audio = False
 
@@ -422,7 +586,33 @@ __/\\\\\\\\\\\\\\\_____/\\\\\\\\\________/\\\\\\\\\\\___
             f"New dedup sensitivity for {args.dedup_method} is: {args.dedup_sens}"
         )
 
-    if args.scenechange_sens:
+    if args.upscale_tile_size < 0:
+        toPrint = f"Upscale tile size {args.upscale_tile_size} can not be negative, disabling tiling"
+        logging.error(toPrint)
+        print(red(toPrint))
+        args.upscale_tile_size = 0
+
+    if args.upscale_tile_overlap < 0:
+        # Negative overlaps leave pixels between the tiles that no tile covers
+        toPrint = f"Upscale tile overlap {args.upscale_tile_overlap} can not be negative, clamping it to 0"
+        logging.error(toPrint)
+        print(red(toPrint))
+        args.upscale_tile_overlap = 0
+
+    if args.scenechange_method == "adaptive":
+        # The sensitivity becomes a threshold, 0 is a valid sensitivity and has to be mapped as well
+        if not 0 <= args.scenechange_sens <= 100:
+            toPrint = f"Scene change sensitivity {args.scenechange_sens} is out of range, it has to be between 0 and 100, clamping it"
+            logging.error(toPrint)
+            print(red(toPrint))
+            args.scenechange_sens = min(max(args.scenechange_sens, 0), 100)
+
+        # How many standard deviations above the running mean a frame difference has to be, 6 at 0 and 2 at 100
+        args.scenechange_sens = 6 - (args.scenechange_sens / 25)
+        logging.info(
+            f"New scenechange sensitivity for {args.scenechange_method} is: {args.scenechange_sens}"
+        )
+    elif args.scenechange_sens:
         if args.scenechange_method == [
             "differential",
             "differential-tensorrt",
@@ -452,6 +642,43 @@ __/\\\\\\\\\\\\\\\_____/\\\\\\\\\________/\\\\\\\\\\\___
     else:
         logging.info("No custom encoder specified, using default encoder")
 
+    if args.encode_profile:
+        from .encoderProfiles import loadProfile
+        from .ffmpegSettings import matchEncoder
+
+        profile = loadProfile(args.encode_profile)
+        if profile is None or not matchEncoder(profile.get("encode_method", args.encode_method)):
+            toPrint = f"Encoder profile {args.encode_profile} was not found or is invalid, keeping the encoder settings"
+            logging.error(toPrint)
+            print(red(toPrint))
+        else:
+            logging.info(f"Using the encoder profile {args.encode_profile}: {profile}")
+            args.encode_method = profile.get("encode_method", args.encode_method)
+            args.encode_preset = args.encode_preset or profile.get("preset", "")
+            if args.encode_quality is None:
+                args.encode_quality = profile.get("quality")
+            if args.encode_segments <= 1:
+                args.encode_segments = profile.get("segments", 1)
+
+    if args.custom_encoder and (args.encode_preset or args.encode_quality is not None):
+        logging.info("Custom encoder specified, ignoring the encode preset and quality")
+        args.encode_preset = ""
+        args.encode_quality = None
+
+    if args.encode_segments > 1:
+        from .encoderProfiles import isCPUEncoder
+
+        if any([args.benchmark, args.custom_encoder, args.encode_method in ["gif", "image"]]):
+            logging.error(
+                "Segmented encoding is not supported with benchmark, a custom encoder, GIF or Image encoding, disabling it"
+            )
+            args.encode_segments = 1
+        elif not isCPUEncoder(args.encode_method):
+            logging.info(
+                f"{args.encode_method} does not run on the CPU and gains nothing from segmented encoding, disabling it"
+            )
+            args.encode_segments = 1
+
     if args.upscale_skip:
         logging.info(
             "Upscale skip enabled, the script will skip frames that are upscaled to save time, this is far from perfect and can cause issues"
@@ -475,6 +702,28 @@ __/\\\\\\\\\\\\\\\_____/\\\\\\\\\________/\\\\\\\\\\\___
         )
         args.bit_depth = "8bit"
 
+    if args.parallel_chunks > 1:
+        if any([args.benchmark, args.preview, args.encode_method in ["gif", "image"]]):
+            logging.error(
+                "Parallel chunks are not supported with benchmark, preview, GIF or Image encoding, disabling parallel chunks"
+            )
+            args.parallel_chunks = 0
+        elif args.interpolate and args.dedup:
+            # A chunk can not tell how many frames dedup leaves of the pair that crosses into the next chunk, so the
+            # intermediates of every boundary would be lost
+            logging.error(
+                "Parallel chunks are not supported with interpolation and dedup together, disabling parallel chunks"
+            )
+            args.parallel_chunks = 0
+        elif args.custom_encoder:
+            logging.info(
+                "Parallel chunks with a custom encoder, make sure it produces a format FFMPEG's concat demuxer can join"
+            )
+
+    if args.profile_live > 0 and not args.profile:
+        logging.info("Live profiling requested, enabling profiling")
+        args.profile = True
+
     if args.encode_method in ["gif", "image"]:
         logging.info("GIF encoding selected, disabling audio")
         args.audio = False
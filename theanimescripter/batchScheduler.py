@@ -0,0 +1,179 @@
+import os
+import copy
+import json
+import logging
+import threading
+
+from alive_progress import alive_bar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .initializeModels import initializeModels
+from .generateOutput import outputNameGenerator
+from .coloredPrints import green, red, yellow
+
+
+class ModelPool:
+    def __init__(self):
+        """
+        Keeps initialized models around between videos so a batch only pays for model loading once per concurrent job.
+
+        Model sets are keyed by the processing resolution since TensorRT engines and padding depend on it,
+        a set is only ever used by one video at a time and is reset before it goes back into the pool.
+        """
+        self.lock = threading.Lock()
+        self.initLock = threading.Lock()
+        self.freeModels = {}
+
+    def acquire(self, processor):
+        """
+        Returns a key and a model set shaped like the output of initializeModels.
+
+        processor: VideoProcessor - The processor asking for models, its settings are used if a new set has to be built.
+        """
+        key = (processor.width, processor.height)
+        with self.lock:
+            if self.freeModels.get(key):
+                logging.info(f"Reusing models for {key[0]}x{key[1]}")
+                return key, self.freeModels[key].pop()
+
+        # Model initialization downloads weights and builds engines, doing that from several threads at once only races
+        with self.initLock:
+            return key, initializeModels(processor)
+
+    def release(self, key, models):
+        for model in models[2:]:
+            if model is not None and hasattr(model, "reset"):
+                model.reset()
+
+        with self.lock:
+            self.freeModels.setdefault(key, []).append(models)
+
+
+class BatchScheduler:
+    def __init__(self, args, videoFiles: list, outputPath: str):
+        """
+        Processes a directory of videos with a shared model pool, running several videos at once if asked to.
+
+        A manifest next to the outputs records the status of every file, with --resume files that already finished
+        are skipped which lets a killed batch pick up where it left off.
+
+        args: argparse.Namespace - The checked arguments, every video gets its own copy.
+        videoFiles: list - The videos to process.
+        outputPath: str - The default location for outputs when --output is not specified.
+        """
+        self.args = args
+        self.videoFiles = videoFiles
+        self.jobs = max(1, args.batch_jobs)
+        self.modelPool = ModelPool()
+        self.manifestLock = threading.Lock()
+
+        if args.output:
+            self.outputFolder = args.output
+        else:
+            self.outputFolder = os.path.join(outputPath, "output")
+        os.makedirs(self.outputFolder, exist_ok=True)
+
+        self.manifestPath = os.path.join(self.outputFolder, "batchManifest.json")
+        self.manifest = self.loadManifest() if args.resume else {}
+
+        if self.jobs > 1 and args.preview:
+            logging.error("Preview is not supported with concurrent batch jobs, disabling preview")
+            args.preview = False
+
+        if self.jobs > 1 and args.profile:
+            logging.error("Profiling is not supported with concurrent batch jobs, disabling profiling")
+            args.profile = False
+
+    def loadManifest(self):
+        if not os.path.exists(self.manifestPath):
+            return {}
+
+        try:
+            with open(self.manifestPath, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Could not read the batch manifest, starting over: {e}")
+            return {}
+
+    def updateManifest(self, input: str, **entry):
+        with self.manifestLock:
+            self.manifest.setdefault(input, {}).update(entry)
+            tempPath = self.manifestPath + ".tmp"
+            with open(tempPath, "w") as f:
+                json.dump(self.manifest, f, indent=4)
+            os.replace(tempPath, self.manifestPath)
+
+    def isDone(self, input: str) -> bool:
+        entry = self.manifest.get(input, {})
+        return entry.get("status") == "done" and os.path.exists(entry.get("output", ""))
+
+    def buildJobArgs(self, input: str):
+        args = copy.copy(self.args)
+        args.input = input
+
+        # Resumed files keep their output name so partial outputs get overwritten instead of piling up
+        entry = self.manifest.get(input, {})
+        args.output = entry.get("output") or os.path.join(
+            self.outputFolder, outputNameGenerator(args)
+        )
+
+        if self.jobs > 1:
+            args.progress_bar = False
+        return args
+
+    def runJob(self, args):
+        from theanimescripter.app import VideoProcessor
+
+        self.updateManifest(args.input, status="running", output=args.output)
+        logging.info(f"Processing {args.input}")
+        if self.jobs == 1:
+            print(green(f"Processing {args.input}"))
+            print(green(f"Output File: {args.output}"))
+
+        succeeded = False
+        try:
+            processor = VideoProcessor(args, modelPool=self.modelPool)
+            succeeded = processor.succeeded
+        except Exception as e:
+            logging.exception(f"Something went wrong while processing {args.input}: {e}")
+
+        # VideoProcessor logs its errors and keeps going, a non-empty output can still be a truncated one. Only the
+        # modes that do not report a result fall back to whether the output appeared
+        if succeeded is None:
+            succeeded = os.path.exists(args.output) and os.path.getsize(args.output) > 0
+
+        self.updateManifest(args.input, status="done" if succeeded else "failed")
+        return succeeded
+
+    def run(self):
+        pending = [input for input in self.videoFiles if not self.isDone(input)]
+        skipped = len(self.videoFiles) - len(pending)
+        if skipped:
+            toPrint = f"Resuming batch, skipping {skipped} finished files"
+            logging.info(toPrint)
+            print(yellow(toPrint))
+
+        jobArgs = [self.buildJobArgs(input) for input in pending]
+        failed = []
+
+        if self.jobs == 1:
+            for args in jobArgs:
+                if not self.runJob(args):
+                    failed.append(args.input)
+        else:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor, alive_bar(
+                len(jobArgs), title="Batch", bar="smooth", unit="files"
+            ) as bar:
+                futures = {executor.submit(self.runJob, args): args for args in jobArgs}
+                for future in as_completed(futures):
+                    args = futures[future]
+                    if future.result():
+                        print(green(f"Finished {args.input}"))
+                    else:
+                        failed.append(args.input)
+                        print(red(f"Failed {args.input}"))
+                    bar()
+
+        if failed:
+            toPrint = f"{len(failed)} files failed, rerun with --resume to retry them. Manifest: {self.manifestPath}"
+            logging.error(toPrint)
+            print(red(toPrint))
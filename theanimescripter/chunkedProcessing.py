@@ -0,0 +1,304 @@
+import os
+import copy
+import shutil
+import logging
+import subprocess
+import multiprocessing
+
+from alive_progress import alive_bar
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .getFFMPEG import getFFPROBE
+from .frameIndex import FrameIndex
+from .coloredPrints import green, red
+
+# The differential threshold the chunks are split with, what the default sensitivity gives the differential method.
+# args.scenechange_sens is already mapped for the configured method, for the adaptive one it is not a threshold at all
+SPLIT_SCENE_THRESHOLD = 0.85
+
+
+def splitAtKeyframes(
+    frameTimes: list,
+    keyframes: list,
+    chunks: int,
+    inpoint: float,
+    outpoint: float,
+    sceneChanges: set = None,
+):
+    """
+    Split the frames between inpoint and outpoint into roughly even chunks, every chunk but the first starts on a keyframe.
+
+    frameTimes: list - The frame timestamps in presentation order.
+    keyframes: list - The indices of the keyframes within frameTimes.
+    chunks: int - The desired amount of chunks, fewer are returned if there are not enough keyframes.
+    inpoint: float - The start time of the range to split.
+    outpoint: float - The end time of the range to split, 0 means the end of the video.
+    sceneChanges: set - Indices of frames that start a new scene, keyframes on a scene change are preferred as long as
+    they stay within an eighth of a chunk of the even split.
+
+    Returns a list of (startIndex, endIndex) frame ranges, endIndex is exclusive.
+    """
+    inRange = [
+        index
+        for index, time in enumerate(frameTimes)
+        if time >= inpoint and (outpoint == 0 or time < outpoint)
+    ]
+    if not inRange:
+        return []
+
+    first, last = inRange[0], inRange[-1] + 1
+    candidates = [index for index in keyframes if first < index < last]
+    # Nothing has to carry over a boundary on a scene change, the chunks on both sides start from a clean state
+    cuts = [index for index in candidates if index in (sceneChanges or ())]
+    tolerance = (last - first) / chunks / 8
+
+    boundaries = [first]
+    for i in range(1, chunks):
+        if not candidates:
+            break
+        target = first + (last - first) * i / chunks
+        nearest = min(candidates, key=lambda index: abs(index - target))
+        if cuts:
+            nearestCut = min(cuts, key=lambda index: abs(index - target))
+            if abs(nearestCut - target) <= tolerance:
+                nearest = nearestCut
+        if nearest > boundaries[-1]:
+            boundaries.append(nearest)
+    boundaries.append(last)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def processChunk(args, logPath: str, threads: int) -> str:
+    """
+    Worker entry point, runs a full VideoProcessor pipeline over a single chunk inside of its own process.
+    """
+    logging.basicConfig(
+        filename=logPath,
+        filemode="w",
+        format="%(message)s",
+        level=logging.INFO,
+        force=True,
+    )
+
+    import torch
+
+    torch.set_num_threads(threads)
+
+    from theanimescripter.app import VideoProcessor
+
+    VideoProcessor(args)
+
+    if not os.path.exists(args.output) or os.path.getsize(args.output) == 0:
+        raise RuntimeError(f"Chunk {args.output} was not encoded, check {logPath}")
+
+    return args.output
+
+
+class ChunkedProcessor:
+    def __init__(self, args, fps: float, mainPath: str):
+        """
+        Split the input at keyframes and run an independent decode, process and encode pipeline for every chunk
+        in a pool of worker processes, the encoded chunks are then losslessly joined with FFMPEG's concat demuxer.
+
+        args: argparse.Namespace - The checked arguments, every worker gets its own copy.
+        fps: float - The framerate of the input, used to place the chunk boundaries between frames.
+        mainPath: str - The path where the per chunk logs are stored.
+        """
+        self.args = args
+        self.fps = fps
+        self.mainPath = mainPath
+        self.workers = args.parallel_chunks
+        self.ffprobePath = getFFPROBE(args.ffmpeg_path)
+
+        frameIndex = FrameIndex.load(self.ffprobePath, args.input)
+        frameTimes = frameIndex.frameTimes
+        ranges = splitAtKeyframes(
+            frameTimes,
+            frameIndex.keyframes,
+            self.workers,
+            args.inpoint,
+            args.outpoint,
+            self.findSceneChanges(frameIndex) if args.first_pass else None,
+        )
+
+        if len(ranges) < 2:
+            logging.info("Not enough keyframes to split the video, processing it as a whole")
+            print(red("Not enough keyframes to split the video, processing it as a whole"))
+            self.runSingle()
+            return
+
+        logging.info(
+            f"Splitting the video into {len(ranges)} chunks at frames {[start for start, _ in ranges]}"
+        )
+
+        self.chunkDir = os.path.splitext(args.output)[0] + "_chunks"
+        os.makedirs(self.chunkDir, exist_ok=True)
+
+        chunkArgs = [
+            self.buildChunkArgs(index, start, end, frameTimes, last=index == len(ranges) - 1)
+            for index, (start, end) in enumerate(ranges)
+        ]
+
+        segments = self.runChunks(chunkArgs)
+        if segments is None:
+            return
+
+        self.concatSegments(segments)
+        shutil.rmtree(self.chunkDir, ignore_errors=True)
+
+    def findSceneChanges(self, frameIndex: FrameIndex) -> set:
+        """
+        Look for scene changes over the whole range in a low resolution first pass, so the chunks can be split on them.
+
+        The pixel difference detector is used whatever the scene change method is, it needs no model and the split
+        only has to be roughly right. The workers run their own first pass with the configured detectors.
+        """
+        from .firstPass import FirstPassMap
+        from .scenechange import SceneChangeCPU
+        from .videoProbe import probeVideo
+
+        start, end = frameIndex.frameRange(self.args.inpoint, self.args.outpoint)
+        if start == end:
+            return set()
+
+        try:
+            metadata = probeVideo(self.ffprobePath, self.args.input)
+            firstPass = FirstPassMap.load(
+                self.args.input,
+                self.args.ffmpeg_path,
+                frameIndex.seekTime(start),
+                totalFrames=end - start,
+                exactFrames=True,
+                sceneChangeProcess=SceneChangeCPU(SPLIT_SCENE_THRESHOLD),
+                settings={"sceneChangeMethod": "differential", "sceneChangeSens": SPLIT_SCENE_THRESHOLD},
+                width=metadata["width"],
+                height=metadata["height"],
+            )
+        except Exception as e:
+            logging.error(f"The first pass failed, splitting at keyframes only: {e}")
+            return set()
+
+        return {start + index for index in firstPass.sceneChanges}
+
+    def runSingle(self):
+        from theanimescripter.app import VideoProcessor
+
+        args = copy.copy(self.args)
+        args.parallel_chunks = 0
+        VideoProcessor(args)
+
+    def buildChunkArgs(self, index: int, start: int, end: int, frameTimes: list, last: bool):
+        """
+        Derive the arguments of a single chunk. Chunks start a microsecond before their first frame, ffprobe
+        rounds timestamps to the microsecond and starting any later would drop it, starting any earlier
+        makes FFMPEG pad the gap with a duplicated frame. Chunks end half a frame after their last frame.
+
+        When interpolating, every chunk but the last also decodes the first frame of the next chunk, which
+        gives the interpolator the pair that crosses the boundary. That frame is encoded by the next chunk,
+        so the writer stops right before it.
+        """
+        args = copy.copy(self.args)
+        halfFrame = 0.5 / self.fps
+        # argumentsChecker turns the chunks off for interpolation with dedup
+        overlap = args.interpolate and not last
+
+        args.inpoint = max(frameTimes[start] - 0.000001, 0)
+        if last:
+            args.outpoint = frameTimes[end - 1] + halfFrame
+        elif overlap:
+            args.outpoint = frameTimes[end] + halfFrame
+        else:
+            args.outpoint = frameTimes[end] - halfFrame
+
+        args.total_frames = end - start + 1 if overlap else end - start
+        args.frame_limit = (end - start) * int(args.interpolate_factor) if overlap else 0
+        args.output = os.path.join(
+            self.chunkDir, f"chunk_{index:04d}{os.path.splitext(self.args.output)[1]}"
+        )
+        args.audio = False
+        args.encode_segments = 1
+        args.preview = False
+        args.progress_bar = False
+        args.parallel_chunks = 0
+        args.profile_path = os.path.join(
+            self.mainPath, "chunkLogs", f"profile_chunk_{index:04d}.json"
+        )
+        return args
+
+    def runChunks(self, chunkArgs: list):
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        logDir = os.path.join(self.mainPath, "chunkLogs")
+        os.makedirs(logDir, exist_ok=True)
+
+        segments = [None] * len(chunkArgs)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context
+        ) as executor, alive_bar(
+            len(chunkArgs), title="Processing chunks", bar="smooth", unit="chunks"
+        ) as bar:
+            futures = {
+                executor.submit(
+                    processChunk,
+                    args,
+                    os.path.join(logDir, f"log_chunk_{index:04d}.txt"),
+                    threads,
+                ): index
+                for index, args in enumerate(chunkArgs)
+            }
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    segments[index] = future.result()
+                    logging.info(f"Chunk {index} finished")
+                except Exception as e:
+                    logging.error(f"Chunk {index} failed: {e}")
+                bar()
+
+        if None in segments:
+            toPrint = f"Some chunks failed, the finished chunks were kept in {self.chunkDir}"
+            logging.error(toPrint)
+            print(red(toPrint))
+            return None
+
+        return segments
+
+    def concatSegments(self, segments: list):
+        """
+        Join the encoded chunks without re-encoding and bring the audio of the original input along in the same pass.
+        """
+        from .ffmpegSettings import WriteBuffer
+
+        listPath = os.path.join(self.chunkDir, "chunks.txt")
+        with open(listPath, "w", encoding="utf-8") as f:
+            for segment in segments:
+                escaped = segment.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        # The audio is muxed the way a regular encode does it, transcoded when the container can not hold it
+        muxer = WriteBuffer(
+            self.args.input,
+            self.args.output,
+            self.args.ffmpeg_path,
+            audio=self.args.audio,
+            inpoint=self.args.inpoint,
+            outpoint=self.args.outpoint,
+            ffprobePath=self.ffprobePath,
+        )
+
+        command = [
+            self.args.ffmpeg_path,
+            "-v", "error",
+            "-stats",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", listPath,
+            *muxer.muxSettings(verbose=True),
+            "-c:v", "copy",
+            "-y", self.args.output,
+        ]
+
+        logging.info(f"Concatenating chunks with: {' '.join(command)}")
+        subprocess.run(command, check=True)
+        print(green(f"Joined {len(segments)} chunks into {self.args.output}"))
@@ -0,0 +1,120 @@
+import torch
+
+from torch.nn import functional as F
+
+# BT.601 limited range, the same matrix OpenCV uses for COLOR_YUV2RGB_I420 and
+# FFMPEG uses by default when going from rgb24 to yuv420p.
+YUVTORGB = {
+    "y": 1.164383,
+    "rv": 1.596027,
+    "gu": -0.391762,
+    "gv": -0.812968,
+    "bu": 2.017232,
+}
+
+RGBTOYUV = {
+    "yr": 0.256788,
+    "yg": 0.504129,
+    "yb": 0.097906,
+    "ur": -0.148223,
+    "ug": -0.290993,
+    "ub": 0.439216,
+    "vr": 0.439216,
+    "vg": -0.367788,
+    "vb": -0.071427,
+}
+
+
+def splitPlanes(frame: torch.Tensor, width: int, height: int):
+    """
+    Split planar I420 frames into their Y, U and V planes without copying.
+
+    frame: torch.Tensor - A (H * 3 // 2, W) frame or a (N, H * 3 // 2, W) batch of frames.
+    """
+    batch = frame.shape[:-2]
+    lumaSize = width * height
+    chromaSize = (width // 2) * (height // 2)
+
+    flat = frame.reshape(*batch, -1)
+    y = flat[..., :lumaSize].reshape(*batch, height, width)
+    u = flat[..., lumaSize : lumaSize + chromaSize].reshape(
+        *batch, height // 2, width // 2
+    )
+    v = flat[..., lumaSize + chromaSize :].reshape(*batch, height // 2, width // 2)
+    return y, u, v
+
+
+@torch.inference_mode()
+def yuv420ToRGB(
+    frame: torch.Tensor,
+    width: int,
+    height: int,
+    dtype: torch.dtype = torch.float32,
+    bitDepth: int = 8,
+) -> torch.Tensor:
+    """
+    Convert planar YUV420 frames to RGB on whatever device the frames live on.
+
+    frame: torch.Tensor - A (H * 3 // 2, W) frame or a (N, H * 3 // 2, W) batch of frames.
+    width: int - The width of the frame.
+    height: int - The height of the frame.
+    dtype: torch.dtype - The floating point type used for the conversion.
+    bitDepth: int - The bit depth of the samples, 10 bit input keeps its extra precision as fractional values.
+
+    Returns a (H, W, 3) or (N, H, W, 3) tensor in the 0-255 range, the same layout BuildBuffer emits in RGB mode.
+    """
+    y, u, v = splitPlanes(frame, width, height)
+    scale = 1 / (1 << (bitDepth - 8))
+
+    y = (y.to(dtype) * scale - 16).mul_(YUVTORGB["y"])
+    u = (u.to(dtype) * scale - 128).repeat_interleave(2, dim=-1).repeat_interleave(2, dim=-2)
+    v = (v.to(dtype) * scale - 128).repeat_interleave(2, dim=-1).repeat_interleave(2, dim=-2)
+
+    r = y + v * YUVTORGB["rv"]
+    g = y + u * YUVTORGB["gu"] + v * YUVTORGB["gv"]
+    b = y + u * YUVTORGB["bu"]
+
+    return torch.stack([r, g, b], dim=-1).clamp_(0, 255)
+
+
+@torch.inference_mode()
+def rgbToYUV420(frame: torch.Tensor, bitDepth: int = 8) -> torch.Tensor:
+    """
+    Convert RGB frames in the 0-255 range to planar YUV420 on whatever device the frames live on.
+
+    frame: torch.Tensor - A (H, W, 3) frame or a (N, H, W, 3) batch of frames.
+    bitDepth: int - 8 for yuv420p or 10 for yuv420p10le, the 10 bit samples are returned as int16.
+
+    Returns a contiguous (H * 3 // 2, W) or (N, H * 3 // 2, W) tensor ready to be piped into FFMPEG.
+    """
+    height, width = frame.shape[-3], frame.shape[-2]
+    batch = frame.shape[:-3]
+
+    frame = frame.float() if not frame.is_floating_point() else frame
+    r, g, b = frame.unbind(-1)
+
+    y = r * RGBTOYUV["yr"] + g * RGBTOYUV["yg"] + b * RGBTOYUV["yb"] + 16
+
+    # Chroma is averaged over 2x2 blocks before the matrix, it is linear so this is
+    # the same as subsampling the full resolution U and V planes.
+    rgb = frame.reshape(-1, height, width, 3).permute(0, 3, 1, 2)
+    rgb = F.avg_pool2d(rgb, kernel_size=2, stride=2)
+    r, g, b = rgb.unbind(1)
+
+    u = r * RGBTOYUV["ur"] + g * RGBTOYUV["ug"] + b * RGBTOYUV["ub"] + 128
+    v = r * RGBTOYUV["vr"] + g * RGBTOYUV["vg"] + b * RGBTOYUV["vb"] + 128
+
+    scale = 1 << (bitDepth - 8)
+    maxValue = (1 << bitDepth) - 1
+
+    output = torch.empty(
+        (*batch, height * 3 // 2, width),
+        dtype=torch.uint8 if bitDepth == 8 else torch.int16,
+        device=frame.device,
+    )
+    outY, outU, outV = splitPlanes(output, width, height)
+    outY.copy_(y.mul_(scale).round_().clamp_(0, maxValue))
+    outU.copy_(u.reshape(outU.shape).mul_(scale).round_().clamp_(0, maxValue))
+    outV.copy_(v.reshape(outV.shape).mul_(scale).round_().clamp_(0, maxValue))
+
+    return output
@@ -1,141 +1,225 @@
-import numpy as np
+import torch
+import torch.nn.functional as F
 
-class DedupSSIMCuda:
+from abc import ABC, abstractmethod
+
+# BT.601 luma weights, duplicates are judged on brightness alone
+LUMA = (0.299, 0.587, 0.114)
+
+
+class WindowedDedup(ABC):
     def __init__(
         self,
-        ssimThreshold=0.9,
-        sampleSize=224,
-        half=True,
+        threshold: float,
+        sampleSize: int = 224,
+        device: str = "cpu",
+        half: bool = False,
     ):
         """
-        A Cuda accelerated version of the SSIM deduplication method
+        Deduplication over windows of frames, the frames of a window are downsampled and scored in batched ops.
 
-        Args:
-            ssimThreshold: float, SSIM threshold to consider two frames as duplicates
-            sampleSize: int, size of the frame to be used for comparison
-            half: bool, use half precision for the comparison
+        Frames are compared against the last frame that was kept rather than against their direct predecessor.
+        On a slow pan neighbouring frames are always nearly identical, comparing neighbours drops the whole pan while
+        the distance to the last kept frame keeps growing until a frame is kept again.
+
+        While nothing is dropped the last kept frame is the direct predecessor, so every neighbouring pair of the window
+        is scored in one batch up front. Once a frame is dropped the reference is scored against the rest of the window
+        in another batch, a window costs a handful of batched ops instead of one comparison per frame.
+
+        threshold: float - The score at which two frames count as duplicates.
+        sampleSize: int - The frames are area downsampled to sampleSize x sampleSize before being compared.
+        device: str - The device the comparisons run on.
+        half: bool - Downsample in half precision, the scores are always computed in full precision.
         """
-        self.ssimThreshold = ssimThreshold
+        self.threshold = threshold
         self.sampleSize = sampleSize
-        self.prevFrame = None
-        self.half = half
-
-        import torch
-        import torch.nn.functional as F
-        from torchmetrics.image import StructuralSimilarityIndexMeasure
-
-        self.torch = torch
-        self.F = F
-        self.DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-        self.ssim = StructuralSimilarityIndexMeasure(data_range=1.0).to(self.DEVICE)
-
-    def run(self, frame):
-        """
-        Returns True if the frames are duplicates
-        """
-        if self.prevFrame is None:
-            self.prevFrame = self.processFrame(frame)
-            return False
-
-        frame = self.processFrame(frame)
-        similarity = self.ssim(self.prevFrame, frame).item()
-        self.prevFrame = frame.clone()
-
-        return similarity > self.ssimThreshold
-
-    def processFrame(self, frame):
-        frame = (
-            frame
-            .to(self.DEVICE)
-            .permute(2, 0, 1)
-            .unsqueeze(0)
-            .float()
-            if not self.half
-            else frame
-            .to(self.DEVICE)
-            .permute(2, 0, 1)
-            .unsqueeze(0)
-            .half()
-        ).mul(1 / 255.0)
-        frame = self.F.interpolate(
-            frame, (self.sampleSize, self.sampleSize), mode="nearest"
+        self.device = torch.device(device)
+        self.half = half and self.device.type == "cuda"
+        self.luma = torch.tensor(LUMA, device=self.device).view(1, 3, 1, 1)
+        self.reference = None
+
+    def prepare(self, frames: list) -> torch.Tensor:
+        """
+        Turns a list of (H, W, 3) frames in the 0-255 range into a (N, 1, sampleSize, sampleSize) batch of luma samples.
+        """
+        if self.device.type != "cuda":
+            # Stacking full frames on the CPU only adds a copy that does not fit in the cache, the samples are stacked instead
+            return torch.cat([self.downsample(frame.unsqueeze(0)) for frame in frames])
+
+        return self.downsample(
+            torch.stack([frame.to(self.device, non_blocking=True) for frame in frames])
         )
-        return frame
 
-class DedupSSIM:
-    def __init__(
-        self,
-        ssimThreshold=0.9,
-        sampleSize=224,
-    ):
-        self.ssimThreshold = ssimThreshold
-        self.sampleSize = sampleSize
-        self.prevFrame = None
+    def downsample(self, batch: torch.Tensor) -> torch.Tensor:
+        batch = batch.to(self.device).permute(0, 3, 1, 2)
+        batch = batch.half() if self.half else batch.float()
 
-        from skimage.metrics import structural_similarity as ssim
-        from skimage import color
+        # Luma is linear, taking it after the downsampling only touches the small samples
+        batch = F.adaptive_avg_pool2d(batch, self.sampleSize).float()
+        return (batch * self.luma).sum(dim=1, keepdim=True)
 
-        self.ssim = ssim
-        self.color = color
+    def statistics(self, samples: torch.Tensor):
+        """
+        Per frame values a metric can share between all the pairs a frame is part of.
+        """
+        return None
 
-    def run(self, frame):
+    @abstractmethod
+    def scorePairs(self, samples: torch.Tensor, stats, first: torch.Tensor, second: torch.Tensor) -> torch.Tensor:
         """
-        Returns True if the frames are duplicates
+        Score the pairs (samples[first[k]], samples[second[k]]) all at once.
         """
-        if self.prevFrame is None:
-            self.prevFrame = self.processFrame(frame)
-            return False
 
-        frame = self.processFrame(frame)
+    @abstractmethod
+    def isDuplicate(self, score: float) -> bool:
+        """
+        Whether a score means the two frames are duplicates.
+        """
 
-        score = self.ssim(self.prevFrame, frame, data_range=frame.max() - frame.min())
-        self.prevFrame = frame.copy()
+    @torch.inference_mode()
+    def runWindow(self, frames: list) -> list:
+        """
+        Returns a list with True for every frame that duplicates the last frame kept before it.
 
-        return score > self.ssimThreshold
+        frames: list - Consecutive (H, W, 3) frames, the reference carries over from one call to the next.
+        """
+        samples = self.prepare(frames)
+        flags = []
+        if self.reference is None:
+            self.reference = samples[0]
+            flags.append(False)
+            samples = samples[1:]
+            if len(samples) == 0:
+                return flags
+
+        samples = torch.cat([self.reference.unsqueeze(0), samples])
+        stats = self.statistics(samples)
+        indices = torch.arange(len(samples), device=self.device)
+        neighbourScores = self.scorePairs(samples, stats, indices[:-1], indices[1:]).tolist()
+
+        reference = 0
+        referenceScores = None
+        for index in range(1, len(samples)):
+            if reference == index - 1:
+                score = neighbourScores[reference]
+            else:
+                if referenceScores is None:
+                    later = indices[index:]
+                    referenceScores = self.scorePairs(
+                        samples, stats, torch.full_like(later, reference), later
+                    ).tolist()
+                score = referenceScores[index - (len(samples) - len(referenceScores))]
+
+            isDuplicate = self.isDuplicate(score)
+            if not isDuplicate:
+                reference = index
+                referenceScores = None
+            flags.append(isDuplicate)
+
+        self.reference = samples[reference].clone()
+        return flags
+
+    def run(self, frame: torch.Tensor) -> bool:
+        """
+        Returns True if the frame duplicates the last frame that was kept.
+        """
+        return self.runWindow([frame])[0]
 
-    def processFrame(self, frame):
-        frame = frame.cpu().numpy()
-        frame = np.resize(frame, (self.sampleSize, self.sampleSize, 3))
-        frame = self.color.rgb2gray(frame)
+    def reset(self):
+        """
+        Forget the previous video so the instance can be reused for another one.
+        """
+        self.reference = None
+
+
+class DedupSSIMBase(WindowedDedup):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        coords = torch.arange(11, dtype=torch.float32, device=self.device) - 5
+        gauss = torch.exp(-(coords**2) / (2 * 1.5**2))
+        gauss /= gauss.sum()
+        self.kernelY = gauss.view(1, 1, 11, 1)
+        self.kernelX = gauss.view(1, 1, 1, 11)
+
+    def blur(self, x):
+        # The 11x11 gaussian window of the reference SSIM, applied as two separable passes
+        return F.conv2d(F.conv2d(x, self.kernelY), self.kernelX)
+
+    def statistics(self, samples):
+        mu = self.blur(samples)
+        sigmaSq = self.blur(samples * samples) - mu * mu
+        return mu, sigmaSq
+
+    def scorePairs(self, samples, stats, first, second):
+        mu, sigmaSq = stats
+        muX, muY = mu[first], mu[second]
+        sigmaXY = self.blur(samples[first] * samples[second]) - muX * muY
+
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        ssim = ((2 * muX * muY + c1) * (2 * sigmaXY + c2)) / (
+            (muX * muX + muY * muY + c1) * (sigmaSq[first] + sigmaSq[second] + c2)
+        )
+        return ssim.mean(dim=(1, 2, 3))
 
-        return frame
+    def isDuplicate(self, score):
+        return score > self.threshold
 
 
-class DedupMSE:
-    def __init__(
-        self,
-        mseThreshold=1000,
-        sampleSize=224,
-    ):
-        self.mseThreshold = mseThreshold
-        self.sampleSize = sampleSize
-        self.prevFrame = None
+class DedupMSEBase(WindowedDedup):
+    def scorePairs(self, samples, stats, first, second):
+        return (samples[first] - samples[second]).square().mean(dim=(1, 2, 3))
+
+    def isDuplicate(self, score):
+        return score < self.threshold
+
 
-        from skimage.metrics import mean_squared_error as mse
-        from skimage import color
+class DedupSSIM(DedupSSIMBase):
+    def __init__(self, ssimThreshold=0.9, sampleSize=224):
+        """
+        SSIM deduplication on the CPU, frames with an SSIM above ssimThreshold count as duplicates.
+        """
+        super().__init__(ssimThreshold, sampleSize, "cpu")
 
-        self.mse = mse
-        self.color = color
 
-    def run(self, frame):
+class DedupMSE(DedupMSEBase):
+    def __init__(self, mseThreshold=1000, sampleSize=224):
         """
-        Returns True if the frames are duplicates
+        MSE deduplication on the CPU, frames whose mean squared luma difference on the 0-255 scale is below mseThreshold count as duplicates.
         """
-        if self.prevFrame is None:
-            self.prevFrame = self.processFrame(frame)
-            return False
+        super().__init__(mseThreshold, sampleSize, "cpu")
+
 
-        frame = self.processFrame(frame)
+class DedupSSIMCuda(DedupSSIMBase):
+    def __init__(self, ssimThreshold=0.9, sampleSize=224, half=True):
+        """
+        A Cuda accelerated version of the SSIM deduplication method
 
-        score = self.mse(self.prevFrame, frame)
-        self.prevFrame = frame.copy()
+        Args:
+            ssimThreshold: float, SSIM threshold to consider two frames as duplicates
+            sampleSize: int, size of the frame to be used for comparison
+            half: bool, use half precision for the downsampling
+        """
+        super().__init__(
+            ssimThreshold,
+            sampleSize,
+            "cuda" if torch.cuda.is_available() else "cpu",
+            half,
+        )
 
-        return score < self.mseThreshold
 
-    def processFrame(self, frame):
-        frame = frame.cpu().numpy()
-        frame = np.resize(frame, (self.sampleSize, self.sampleSize, 3))
-        frame = self.color.rgb2gray(frame)
+class DedupMSECuda(DedupMSEBase):
+    def __init__(self, mseThreshold=1000, sampleSize=224, half=True):
+        """
+        A Cuda accelerated version of the MSE deduplication method
 
-        return frame
\ No newline at end of file
+        Args:
+            mseThreshold: float, MSE threshold below which two frames are duplicates
+            sampleSize: int, size of the frame to be used for comparison
+            half: bool, use half precision for the downsampling
+        """
+        super().__init__(
+            mseThreshold,
+            sampleSize,
+            "cuda" if torch.cuda.is_available() else "cpu",
+            half,
+        )
@@ -1,8 +1,8 @@
 import os
 import logging
-import requests
-from alive_progress import alive_bar
-from .coloredPrints import green
+from concurrent.futures import ThreadPoolExecutor
+from .coloredPrints import green, red
+from .weightStore import WeightStore
 
 import platform
 
@@ -23,6 +23,9 @@ else:
 
     weightsDir = os.path.join(mainPath, "weights")
 
+# Models are fetched from here before the upstream URLs, a local directory or an HTTP server, see setMirror
+weightStore = WeightStore(weightsDir, os.getenv("TAS_WEIGHTS_MIRROR") or None)
+
 TASURL = "https://github.com/NevermindNilas/TAS-Modes-Host/releases/download/main/"
 DEPTHURL = (
     "https://huggingface.co/spaces/LiheYoung/Depth-Anything/resolve/main/checkpoints/"
@@ -456,70 +459,62 @@ def modelsMap(
             raise ValueError(f"Model {model} not found.")
 
 
+def setMirror(mirror: str):
+    """
+    Fetch models from a local directory or an HTTP server before the upstream URLs, chunk workers inherit the mirror.
+    """
+    os.environ["TAS_WEIGHTS_MIRROR"] = mirror
+    weightStore.mirror = mirror
+    weightStore.mirrorIndex = None
+
+
 def downloadAndLog(
-    model: str, filename: str, download_url: str, folderPath: str, retries: int = 3
+    model: str,
+    filename: str,
+    download_url: str | list,
+    folderPath: str,
+    retries: int = 3,
+    progress: bool = True,
 ):
+    # Zipped models are extracted into a folder named after the archive
+    relative = f"{os.path.basename(folderPath)}/{filename}"
+    isArchive = filename.endswith(".zip")
+    path = os.path.join(folderPath, filename)
+    finalPath = path[:-4] if isArchive else path
+
+    if os.path.exists(finalPath) and weightStore.verify(relative[:-4] if isArchive else relative):
+        toLog = f"{model.upper()} model already exists at: {finalPath}"
+        logging.info(toLog)
+        return finalPath
+
+    if isArchive and weightStore.mirrorFolder(relative[:-4]) is not None:
+        return finalPath
+
+    urls = download_url if isinstance(download_url, list) else [download_url]
     for attempt in range(retries):
         try:
-            if os.path.exists(os.path.join(folderPath, filename)):
-                toLog = f"{model.upper()} model already exists at: {os.path.join(folderPath, filename)}"
-                logging.info(toLog)
-                return os.path.join(folderPath, filename)
-
             toLog = f"Downloading {model.upper()} model... (Attempt {attempt + 1}/{retries})"
             logging.info(toLog)
 
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
+            weightStore.fetch(
+                relative,
+                urls,
+                title=model.capitalize(),
+                progress=progress,
+                record=not isArchive,
+            )
 
-            try:
-                total_size_in_bytes = int(response.headers.get("content-length", 0))
-                total_size_in_mb = total_size_in_bytes / (
-                    1024 * 1024
-                )  # Convert bytes to MB
-            except Exception as e:
-                total_size_in_mb = 0  # If there's an error, default to 0 MB
-                logging.error(e)
-
-            with alive_bar(
-                int(total_size_in_mb + 1),  # Hacky but it works
-                title=f"Downloading {model.capitalize()} model",
-                bar="smooth",
-                unit="MB",
-                spinner=True,
-                enrich_print=False,
-                receipt=True,
-                monitor=True,
-                elapsed=True,
-                stats=False,
-                dual_line=False,
-                force_tty=True,
-            ) as bar:
-                with open(os.path.join(folderPath, filename), "wb") as file:
-                    for data in response.iter_content(chunk_size=1024 * 1024):
-                        file.write(data)
-                        bar(int(len(data) / (1024 * 1024)))
-
-            if filename.endswith(".zip"):
-                import zipfile
-
-                with zipfile.ZipFile(
-                    os.path.join(folderPath, filename), "r"
-                ) as zip_ref:
-                    zip_ref.extractall(folderPath)
-                os.remove(os.path.join(folderPath, filename))
-                filename = filename[:-4]
-
-            toLog = f"Downloaded {model.capitalize()} model to: {os.path.join(folderPath, filename)}"
+            if isArchive:
+                weightStore.extract(relative, path)
+
+            toLog = f"Downloaded {model.capitalize()} model to: {finalPath}"
             logging.info(toLog)
             print(green(toLog))
 
-            return os.path.join(folderPath, filename)
+            return finalPath
 
-        except (requests.exceptions.RequestException, zipfile.BadZipFile) as e:
+        except Exception as e:
             logging.error(f"Error during download: {e}")
-            if os.path.exists(os.path.join(folderPath, filename)):
-                os.remove(os.path.join(folderPath, filename))
             if attempt == retries - 1:
                 raise
 
@@ -532,6 +527,7 @@ def downloadModels(
     modelType: str = "pth",
     half: bool = True,
     ensemble: bool = False,
+    progress: bool = True,
 ) -> str:
     """
     Downloads the model.
@@ -559,14 +555,10 @@ def downloadModels(
         "shift_lpips-tensorrt",
         "shift_lpips-directml",
     ]:
-        fullUrl = f"{SUDOURL}{filename}"
-        try:
-            # Just adds a redundant check if sudo decides to nuke his models.
-            return downloadAndLog(model, filename, fullUrl, folderPath)
-        except Exception as e:
-            logging.warning(f"Failed to download from SUDOURL: {e}")
-            fullUrl = f"{TASURL}{filename}"
-            return downloadAndLog(model, filename, fullUrl, folderPath)
+        # TASURL is a redundant source in case sudo decides to nuke his models.
+        return downloadAndLog(
+            model, filename, [f"{SUDOURL}{filename}", f"{TASURL}{filename}"], folderPath, progress=progress
+        )
 
     elif model == "small_v2":
         fullUrl = f"{DEPTHV2URLSMALL}{filename}"
@@ -577,4 +569,38 @@ def downloadModels(
     else:
         fullUrl = f"{TASURL}{filename}"
 
-    return downloadAndLog(model, filename, fullUrl, folderPath)
+    return downloadAndLog(model, filename, fullUrl, folderPath, progress=progress)
+
+
+def prefetchModels(models: list, workers: int = 4) -> list:
+    """
+    Download models in both precisions in parallel, for offline use or to seed a mirror.
+    Returns the models that could not be downloaded.
+    """
+    jobs = {}
+    for model in models:
+        model = model.lower()
+        for half in [True, False]:
+            try:
+                key = (model, modelsMap(model, half=half))
+            except Exception:
+                key = (model, half)
+            # Most models share one file between both precisions
+            jobs.setdefault(key, (model, half))
+
+    failed = []
+
+    def fetch(job):
+        model, half = job
+        try:
+            downloadModels(model, half=half, progress=False)
+        except Exception as e:
+            logging.error(e)
+            precision = "fp16" if half else "fp32"
+            failed.append(f"{model} {precision}")
+            print(red(f"Failed to download model: {model} with precision: {precision}"))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, jobs.values()))
+
+    return failed
@@ -0,0 +1,195 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+import torch
+
+from queue import Queue
+from .ffmpegSettings import WriteBuffer, ffmpegLogPath
+from .profiler import profiler
+
+# Every segment starts on a keyframe, longer segments compress better but keep more frames waiting for their encoder
+SEGMENT_SECONDS = 2
+
+
+class SegmentWriteBuffer(WriteBuffer):
+    def __init__(self, *args, segments: int = 2, **kwargs):
+        """
+        WriteBuffer that spreads the output over several encoders. Consecutive segments of the output go round robin to one
+        FFMPEG process each, so CPU encoders like libx265 and libsvtav1 use the whole machine. The segments are joined without
+        re-encoding and the audio of the source is muxed in the same pass.
+
+        Takes the same arguments as WriteBuffer.
+
+        segments: int - How many segments are encoded at once.
+        """
+        super().__init__(*args, **kwargs)
+        self.segments = max(1, segments)
+        self.segmentLength = max(1, round(self.fps * SEGMENT_SECONDS))
+
+        # Every encoder can fall up to one segment behind, the host buffers are recycled once they are written
+        self.maxBuffers = self.segments * (self.segmentLength + 2)
+        self.freeBuffers = Queue()
+        self.allocatedBuffers = 0
+
+    def hostBuffer(self, frame: torch.Tensor) -> torch.Tensor:
+        if self.freeBuffers.empty() and self.allocatedBuffers < self.maxBuffers:
+            self.allocatedBuffers += 1
+            if self.hostFrame is None:
+                # Lets toHost pick the shape and the type of the buffers
+                self.toHost(frame)
+            return torch.empty(
+                self.hostFrame.shape,
+                dtype=self.hostFrame.dtype,
+                pin_memory=torch.cuda.is_available(),
+            )
+
+        return profiler.get(self.freeBuffers, "encodeSlot")
+
+    def encodeSegments(self, queue: Queue, logFile):
+        """
+        Runs in one thread per encoder, a path opens a new segment, frames are written into it and None ends the encoder.
+        """
+        process = None
+        item = ""
+        try:
+            while True:
+                item = queue.get()
+                if isinstance(item, str) or item is None:
+                    if process is not None:
+                        process.stdin.close()
+                        process.wait()
+                        if process.returncode != 0:
+                            self.failed = True
+                            logging.error(f"Encoding {process.args[-1]} failed with code {process.returncode}")
+                        process = None
+
+                    if item is None:
+                        break
+
+                    process = subprocess.Popen(
+                        self.encodeSettings(output=item),
+                        stdin=subprocess.PIPE,
+                        stdout=logFile,
+                        stderr=subprocess.STDOUT,
+                    )
+                    continue
+
+                process.stdin.write(memoryview(item.numpy()).cast("B"))
+                self.freeBuffers.put(item)
+        except Exception as e:
+            self.failed = True
+            logging.error(f"An error occurred: {str(e)}")
+            # Keep draining so the feeding thread never blocks on a dead encoder
+            while item is not None:
+                item = queue.get()
+                if isinstance(item, torch.Tensor):
+                    self.freeBuffers.put(item)
+            if process is not None:
+                process.kill()
+
+    def start(self, queue: Queue = None):
+        """
+        Feeds the encoders from the queue and joins their segments at the end, meant to be used in a separate thread like WriteBuffer.start.
+        """
+        self.latestFrame = None
+        self.writeBuffer = queue if queue is not None else Queue(maxsize=self.queueSize)
+        self.isWritingDone = False
+        self.failed = False
+
+        extension = os.path.splitext(self.output)[1]
+        segmentDir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(self.output) or None)
+        paths = []
+
+        command = self.encodeSettings(verbose=True, output=os.path.join(segmentDir, f"segment{extension}"))
+        logging.info(f"Encoding options: {' '.join(map(str, command))}")
+        logging.info(f"Encoding {self.segments} segments of {self.segmentLength} frames at once")
+
+        queues = [Queue(maxsize=self.segmentLength + 2) for _ in range(self.segments)]
+        with open(ffmpegLogPath, "w") as logFile:
+            workers = [
+                threading.Thread(target=self.encodeSegments, args=(workerQueue, logFile), daemon=True)
+                for workerQueue in queues
+            ]
+            for worker in workers:
+                worker.start()
+
+            try:
+                writtenFrames = 0
+                while True:
+                    frame = profiler.get(self.writeBuffer, "encodeQueue")
+                    if frame is None:
+                        logging.info(f"Encoded {writtenFrames} frames")
+                        break
+
+                    if self.frameLimit and writtenFrames >= self.frameLimit:
+                        if self.frameRing is not None:
+                            self.frameRing.release(frame)
+                        continue
+
+                    encodeStart = time.perf_counter()
+                    segment, offset = divmod(writtenFrames, self.segmentLength)
+                    workerQueue = queues[segment % self.segments]
+                    if offset == 0:
+                        paths.append(os.path.join(segmentDir, f"segment_{segment:05d}{extension}"))
+                        workerQueue.put(paths[-1])
+
+                    buffer = self.hostBuffer(frame)
+                    self.toHost(frame, buffer)
+                    profiler.put(workerQueue, buffer, "encodeSegment")
+                    writtenFrames += 1
+                    if profiler.enabled:
+                        profiler.record("encode", time.perf_counter() - encodeStart)
+
+                    if self.frameRing is not None:
+                        self.frameRing.release(frame)
+
+            except Exception as e:
+                self.failed = True
+                logging.error(f"An error occurred: {str(e)}")
+
+            finally:
+                for workerQueue in queues:
+                    workerQueue.put(None)
+                for worker in workers:
+                    worker.join()
+
+        try:
+            if self.failed or not paths:
+                logging.error(f"Not all segments were encoded, the finished ones were kept in {segmentDir}")
+            else:
+                self.concatSegments(paths, segmentDir)
+                shutil.rmtree(segmentDir, ignore_errors=True)
+        except Exception as e:
+            self.failed = True
+            logging.error(f"Could not join the segments, they were kept in {segmentDir}: {e}")
+        finally:
+            self.isWritingDone = True
+
+    def concatSegments(self, paths: list, segmentDir: str):
+        """
+        Join the segments without re-encoding, the audio of the source comes along in the same pass.
+        """
+        listPath = os.path.join(segmentDir, "segments.txt")
+        with open(listPath, "w", encoding="utf-8") as f:
+            for path in paths:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [
+            self.ffmpegPath,
+            "-y",
+            "-v", "error",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", listPath,
+            *self.muxSettings(),
+            "-c:v", "copy",
+            self.output,
+        ]
+
+        logging.info(f"Joining segments with: {' '.join(command)}")
+        subprocess.run(command, check=True)
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+
+from .ffmpegSettings import (
+    PRESET_LADDERS,
+    applyPreset,
+    encoderName,
+    matchEncoder,
+)
+from .videoProbe import mainPath, probeVideo
+
+profilesPath = os.path.join(mainPath, "encoderProfiles.json")
+calibrationPath = os.path.join(mainPath, "encoderCalibration.json")
+
+# Profiles that are always available, the ones in encoderProfiles.json take precedence over them
+BUILTIN_PROFILES = {
+    "speed": {"encode_method": "x264", "preset": "ultrafast"},
+    "balanced": {"encode_method": "x264", "preset": "auto"},
+    "archive": {"encode_method": "x265_10bit", "preset": "auto", "quality": 16},
+    "av1": {"encode_method": "av1", "preset": "auto", "segments": 4},
+}
+
+# Encoders that run on the CPU and gain from several segments being encoded at once
+CPU_ENCODERS = ["libx264", "libx265", "libsvtav1", "prores_ks"]
+
+# An encoder has to be this much faster than the pipeline to not become the bottleneck
+SPEED_MARGIN = 1.15
+
+# The calibration sample stays below this many bytes of raw frames
+SAMPLE_BYTES = 256 * 1024**2
+
+
+def loadProfile(name: str, path: str = profilesPath) -> dict:
+    """
+    Look up a named encoder profile.
+
+    A profile is a dict with an encode_method and optionally a preset ("auto" to calibrate), a quality and a number of segments,
+    user profiles are read from encoderProfiles.json in the TAS folder. Returns None if there is no profile with that name.
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    if os.path.isfile(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                profiles.update(json.load(f))
+        except Exception as e:
+            logging.error(f"Could not read the encoder profiles from {path}: {e}")
+
+    return profiles.get(name)
+
+
+def isCPUEncoder(encodeMethod: str) -> bool:
+    return encoderName(matchEncoder(encodeMethod)) in CPU_ENCODERS
+
+
+class EncoderCalibration:
+    def __init__(self, path: str = calibrationPath):
+        """
+        Picks the slowest preset of an encoder that still keeps up with the pipeline.
+
+        The speed the pipeline produced frames at is recorded after every run per processing setup, encoder speeds are measured
+        on a sample of the input and cached per encoder, preset, resolution and amount of segments. Both live in one JSON file.
+
+        path: str - Where the measurements are stored.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
+
+        data.setdefault("pipelineFps", {})
+        data.setdefault("encoderFps", {})
+        return data
+
+    def save(self, data: dict):
+        # Chunk workers calibrate at the same time, a half written file must never be visible
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+            os.replace(temporary, self.path)
+        except Exception as e:
+            logging.error(f"Could not save the encoder calibration: {e}")
+
+    def recordPipeline(self, key: str, fps: float):
+        """
+        Remember how many frames per second the pipeline produced for a processing setup.
+        """
+        with self.lock:
+            data = self.load()
+            data["pipelineFps"][key] = round(fps, 3)
+            self.save(data)
+
+    def choosePreset(
+        self,
+        input: str,
+        ffmpegPath: str,
+        encodeMethod: str,
+        width: int,
+        height: int,
+        fps: float,
+        bitDepth: str,
+        pipelineKey: str,
+        segments: int = 1,
+        ffprobePath: str = None,
+    ) -> str:
+        """
+        Returns the slowest preset that encodes faster than the pipeline produces frames, None to keep the default preset.
+
+        input: str - The video a sample is taken from.
+        ffmpegPath: str - The path to the FFMPEG executable.
+        encodeMethod: str - The encode method, see matchEncoder.
+        width: int - The width of the output.
+        height: int - The height of the output.
+        fps: float - The frame rate of the output.
+        bitDepth: str - "8bit" or "16bit".
+        pipelineKey: str - The processing setup the pipeline speed was recorded for.
+        segments: int - How many segments are encoded at once.
+        ffprobePath: str - The path to FFPROBE, used to take the sample from the middle of the input.
+        """
+        encoder = encoderName(matchEncoder(encodeMethod))
+        ladder = PRESET_LADDERS.get(encoder)
+        if not ladder:
+            logging.info(f"{encoder or encodeMethod} has no presets to calibrate, keeping the default")
+            return None
+
+        data = self.load()
+        target = data["pipelineFps"].get(pipelineKey)
+        if target is None:
+            logging.info(
+                "The speed of the pipeline has not been measured for these settings yet, keeping the default preset. "
+                "It is recorded at the end of this run and used by the next one"
+            )
+            return None
+
+        # The fastest preset is the best there is when even it falls behind
+        sample = None
+        chosen = ladder[0]
+        for preset in ladder:
+            key = f"{encodeMethod}|{preset}|{width}x{height}|{bitDepth}|{segments}"
+            encoderFps = data["encoderFps"].get(key)
+            if encoderFps is None:
+                if sample is None:
+                    sample = self.sample(input, ffmpegPath, width, height, bitDepth, ffprobePath)
+                    if sample is None:
+                        return None
+
+                encoderFps = self.measure(
+                    ffmpegPath, encodeMethod, preset, sample, width, height, fps, bitDepth, segments
+                )
+                if encoderFps is None:
+                    return None
+
+                with self.lock:
+                    data = self.load()
+                    data["encoderFps"][key] = round(encoderFps, 3)
+                    self.save(data)
+
+            logging.info(f"{encodeMethod} at preset {preset} encodes {encoderFps:.2f} fps, the pipeline produces {target:.2f} fps")
+
+            # Presets only get slower down the ladder, the first one that falls behind ends the search
+            if encoderFps < target * SPEED_MARGIN:
+                break
+            chosen = preset
+
+        logging.info(f"Calibrated the preset of {encodeMethod} to {chosen}")
+        return chosen
+
+    def sample(self, input, ffmpegPath, width, height, bitDepth, ffprobePath=None) -> bytes:
+        """
+        Decode a few frames from the middle of the input at the output resolution, in the format the encoder is fed.
+        """
+        frameBytes = width * height * 3 // 2 * (2 if bitDepth == "16bit" else 1)
+        frames = max(8, min(60, SAMPLE_BYTES // frameBytes))
+
+        start = 0.0
+        if ffprobePath is not None:
+            try:
+                start = probeVideo(ffprobePath, input)["duration"] / 2
+            except Exception as e:
+                logging.error(f"Could not probe the input, sampling from its start: {e}")
+
+        command = [
+            ffmpegPath,
+            "-v", "error",
+            "-ss", str(start),
+            "-i", input,
+            "-frames:v", str(frames),
+            "-vf", f"scale={width}:{height}",
+            "-f", "rawvideo",
+            "-pix_fmt", "yuv420p10le" if bitDepth == "16bit" else "yuv420p",
+            "-",
+        ]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if len(result.stdout) < frameBytes:
+            logging.error("Could not decode a sample for the encoder calibration, keeping the default preset")
+            return None
+
+        return result.stdout[: len(result.stdout) // frameBytes * frameBytes]
+
+    def measure(self, ffmpegPath, encodeMethod, preset, sample, width, height, fps, bitDepth, segments=1) -> float:
+        """
+        Encode the sample with segments encoders at once and return the frames per second they managed together.
+        """
+        frameBytes = width * height * 3 // 2 * (2 if bitDepth == "16bit" else 1)
+        command = [
+            ffmpegPath,
+            "-v", "error",
+            "-f", "rawvideo",
+            "-s", f"{width}x{height}",
+            "-pix_fmt", "yuv420p10le" if bitDepth == "16bit" else "yuv420p",
+            "-r", str(fps),
+            "-i", "-",
+            *applyPreset(matchEncoder(encodeMethod), preset),
+            "-f", "null",
+            "-",
+        ]
+
+        failed = []
+
+        def encode():
+            result = subprocess.run(command, input=sample, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if result.returncode != 0:
+                failed.append(result.returncode)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=encode) for _ in range(segments)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        if failed:
+            logging.error(f"{encodeMethod} failed at preset {preset} during the calibration")
+            return None
+        return len(sample) // frameBytes * segments / elapsed
@@ -1,14 +1,18 @@
 import logging
 import subprocess
 import os
-import shutil
 import torch
 import sys
 import numpy as np
 import cv2
 import platform
+import threading
+import time
 
 from queue import Queue
+from .colorSpace import rgbToYUV420
+from .profiler import profiler
+from .videoProbe import probeVideo
 
 if platform.system() == "Windows":
     appdata = os.getenv("APPDATA")
@@ -170,6 +174,195 @@ def matchEncoder(encode_method: str):
     return command
 
 
+# The presets of every encoder from the fastest to the slowest, used to swap the preset of an encode method
+PRESET_LADDERS = {
+    "libx264": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"],
+    "libx265": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"],
+    "libsvtav1": [str(preset) for preset in range(12, 1, -1)],
+    "h264_nvenc": [f"p{preset}" for preset in range(1, 8)],
+    "hevc_nvenc": [f"p{preset}" for preset in range(1, 8)],
+    "av1_nvenc": [f"p{preset}" for preset in range(1, 8)],
+    "h264_qsv": ["veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"],
+    "hevc_qsv": ["veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"],
+    "h264_amf": ["speed", "balanced", "quality"],
+    "hevc_amf": ["speed", "balanced", "quality"],
+}
+
+PRESET_FLAGS = ["-preset", "-quality"]
+QUALITY_FLAGS = ["-crf", "-cq", "-global_quality", "-qp", "-qscale:v"]
+
+
+def encoderName(command: list) -> str:
+    """
+    The FFMPEG encoder of a command from matchEncoder, e.g. "libx265".
+    """
+    return command[command.index("-c:v") + 1] if "-c:v" in command else ""
+
+
+def applyPreset(command: list, preset: str = None, quality: int = None) -> list:
+    """
+    Swap the preset and the quality of a command from matchEncoder.
+
+    command: list - The encoder arguments returned by matchEncoder.
+    preset: str - The preset to use instead, it has to be on the ladder of the encoder. None keeps the preset.
+    quality: int - The CRF, CQ or QP to use instead. None keeps the quality.
+    """
+    command = list(command)
+    encoder = encoderName(command)
+
+    if preset:
+        if preset not in PRESET_LADDERS.get(encoder, []):
+            logging.error(f"{preset} is not a preset of {encoder}, keeping the default preset")
+        else:
+            for flag in PRESET_FLAGS:
+                if flag in command:
+                    command[command.index(flag) + 1] = preset
+                    break
+
+    if quality is not None:
+        for flag in QUALITY_FLAGS:
+            if flag in command:
+                command[command.index(flag) + 1] = str(quality)
+                break
+
+    return command
+
+
+# The audio codecs a container can hold as they are and what the audio is encoded to otherwise, other containers copy whatever comes
+AUDIO_CODECS = {
+    ".mp4": (["aac", "mp3", "alac", "ac3", "eac3", "opus", "flac"], "aac"),
+    ".m4v": (["aac", "mp3", "alac", "ac3", "eac3"], "aac"),
+    ".mov": (["aac", "mp3", "alac", "ac3", "eac3", "pcm_s16le", "pcm_s24le"], "aac"),
+    ".webm": (["opus", "vorbis"], "libopus"),
+}
+
+
+def audioCodec(output: str, sourceCodec: str = None) -> str:
+    """
+    The -c:a for muxing the source audio into output, copy when the container can hold sourceCodec, None when it is unknown.
+    """
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in AUDIO_CODECS:
+        return "copy"
+
+    supported, fallback = AUDIO_CODECS[extension]
+    return "copy" if sourceCodec in supported else fallback
+
+
+# Pinned memory can not be swapped out, the frame rings stay below this many bytes unless the pipeline needs more to make progress
+MAX_RING_BYTES = 1 << 30
+
+
+def ringSlots(queueSize: int, pipelineDepth: int, slotBytes: int) -> int:
+    """
+    How many frames a ring needs, the decode queue plus the frames the pipeline holds at once. The decode queue is
+    trimmed to stay within MAX_RING_BYTES, the frames the pipeline holds back never are since it could not finish without them.
+
+    queueSize: int - The size of the decode queue.
+    pipelineDepth: int - The most frames the processing holds at once, dedup and scene change windows, stage queues and the like.
+    slotBytes: int - The size of one slot.
+    """
+    minimum = pipelineDepth + 2
+    return max(minimum, min(queueSize + pipelineDepth, MAX_RING_BYTES // max(1, slotBytes)))
+
+
+class FrameRing:
+    def __init__(
+        self,
+        slots: int = 66,
+        rawShape: tuple = (1620, 1920),
+        frameShape: tuple = (1080, 1920, 3),
+        rawDType: torch.dtype = torch.uint8,
+    ):
+        """
+        A fixed pool of preallocated frame buffers that BuildBuffer decodes into instead of allocating new arrays for every frame.
+        A slot goes back to the pool once every consumer that received the frame has released it.
+
+        slots: int - The amount of frames that can be alive at once, see ringSlots.
+        rawShape: tuple - The shape of the raw YUV420 frame coming out of FFMPEG.
+        frameShape: tuple - The shape of the converted RGB frame, None if the raw frames are handed out as they are.
+        rawDType: torch.dtype - The type of the raw samples, torch.int16 for high bit depth decoding.
+        """
+        pinMemory = torch.cuda.is_available()
+        if frameShape is None:
+            self.rawFrames = [
+                torch.empty(rawShape, dtype=rawDType, pin_memory=pinMemory)
+                for _ in range(slots)
+            ]
+            self.frames = self.rawFrames
+        else:
+            # The raw frame only stages the color conversion on the single decode thread, one unpinned buffer is enough
+            staging = torch.empty(rawShape, dtype=rawDType)
+            self.rawFrames = [staging] * slots
+            self.frames = [
+                torch.empty(frameShape, dtype=torch.uint8, pin_memory=pinMemory)
+                for _ in range(slots)
+            ]
+
+        self.rawViews = [rawFrame.numpy() for rawFrame in self.rawFrames]
+        self.frameViews = [frame.numpy() for frame in self.frames]
+        self.slotMap = {frame.data_ptr(): i for i, frame in enumerate(self.frames)}
+
+        self.refCounts = [0] * slots
+        self.lock = threading.Lock()
+        self.freeSlots = Queue()
+        for i in range(slots):
+            self.freeSlots.put(i)
+
+    def acquire(self) -> int:
+        """
+        Blocks until a slot is free and hands it to the decoder.
+        """
+        slot = profiler.get(self.freeSlots, "ringSlot")
+        self.refCounts[slot] = 1
+        return slot
+
+    def retain(self, frame: torch.Tensor):
+        """
+        Mark a frame as being held by one more consumer, frames that were not allocated by the ring are ignored.
+        """
+        slot = self.slotMap.get(frame.data_ptr())
+        if slot is None:
+            return
+
+        with self.lock:
+            self.refCounts[slot] += 1
+
+    def release(self, frame: torch.Tensor):
+        """
+        Drop one reference to a frame, the slot is recycled once nobody holds it anymore.
+        """
+        slot = self.slotMap.get(frame.data_ptr())
+        if slot is None:
+            return
+
+        self.releaseSlot(slot)
+
+    def releaseSlot(self, slot: int):
+        with self.lock:
+            self.refCounts[slot] -= 1
+            if self.refCounts[slot] > 0:
+                return
+            self.refCounts[slot] = 0
+
+        self.freeSlots.put(slot)
+
+
+def readInto(stream, buffer: np.ndarray) -> bool:
+    """
+    Fill a preallocated buffer from a stream, returns False if the stream ended before the buffer was full.
+    """
+    view = memoryview(buffer).cast("B")
+    total = 0
+    while total < len(view):
+        read = stream.readinto(view[total:])
+        if not read:
+            return False
+        total += read
+
+    return True
+
+
 class BuildBuffer:
     def __init__(
         self,
@@ -187,6 +380,11 @@ class BuildBuffer:
         buffSize: int = 10**8,
         queueSize: int = 50,
         totalFrames: int = 0,
+        ringBuffer: bool = False,
+        yuv: bool = False,
+        bitDepth: str = "8bit",
+        exactFrames: bool = False,
+        pipelineDepth: int = 16,
     ):
         """
         A class meant to Pipe the Output of FFMPEG into a Queue for further processing.
@@ -205,6 +403,11 @@ class BuildBuffer:
         buffSize: int - The size of the subprocess buffer in bytes, don't touch unless you are working with some ginormous 8K content.
         queueSize: int - The size of the queue.
         totalFrames: int - The total amount of frames to decode.
+        ringBuffer: bool - Whether to decode into a fixed ring of preallocated buffers, consumers have to call release once they are done with a frame.
+        yuv: bool - Whether to emit the planar YUV420 frames as (H * 3 // 2, W) tensors and leave the RGB conversion to the consumer.
+        bitDepth: str - "8bit" or "16bit", 16bit decodes yuv420p10le and always emits planar YUV, the 10 bit samples are stored in int16 tensors since torch barely supports uint16.
+        exactFrames: bool - Decode exactly totalFrames frames from inpoint on instead of cutting at outpoint, for frame counts that come from a FrameIndex.
+        pipelineDepth: int - The most frames the processing holds at once, sizes the ring together with queueSize.
         """
         self.input = os.path.normpath(input)
         self.ffmpegPath = os.path.normpath(ffmpegPath)
@@ -220,6 +423,28 @@ class BuildBuffer:
         self.buffSize = buffSize
         self.queueSize = queueSize
         self.totalFrames = totalFrames
+        self.exactFrames = exactFrames and totalFrames > 0
+        self.ringBuffer = ringBuffer
+        self.bitDepth = bitDepth
+        self.yuv = yuv or bitDepth == "16bit"
+        self.pipelineDepth = pipelineDepth
+
+        # The ring has to exist before start so that the WriteBuffer can share it
+        self.frameRing = None
+        if self.ringBuffer:
+            self.frameRing = FrameRing(
+                slots=self.ringSlots(),
+                rawShape=(self.height * 3 // 2, self.width),
+                frameShape=None if self.yuv else (self.height, self.width, 3),
+                rawDType=torch.int16 if self.bitDepth == "16bit" else torch.uint8,
+            )
+
+    def ringSlots(self) -> int:
+        if self.yuv:
+            slotBytes = self.width * self.height * 3 // 2 * (2 if self.bitDepth == "16bit" else 1)
+        else:
+            slotBytes = self.width * self.height * 3
+        return ringSlots(self.queueSize, self.pipelineDepth, slotBytes)
 
     def decodeSettings(self) -> list:
         """
@@ -239,7 +464,11 @@ class BuildBuffer:
             self.ffmpegPath,
         ]
 
-        if self.outpoint != 0:
+        # An input -ss seeks to the keyframe before inpoint and drops the frames in front of it while decoding,
+        # counting frames instead of cutting at a time keeps VFR and long GOP sources frame accurate
+        if self.exactFrames:
+            command.extend(["-ss", str(self.inpoint)])
+        elif self.outpoint != 0:
             command.extend(["-ss", str(self.inpoint), "-to", str(self.outpoint)])
 
         command.extend(
@@ -249,6 +478,11 @@ class BuildBuffer:
             ]
         )
 
+        if self.exactFrames:
+            command.extend(
+                ["-frames:v", str(self.totalFrames), "-fps_mode", "passthrough"]
+            )
+
         filters = []
         if self.resize:
             if self.resizeMethod in ["spline16", "spline36", "point"]:
@@ -266,7 +500,7 @@ class BuildBuffer:
         command.extend(
             [
                 "-f", "rawvideo",
-                "-pix_fmt", "yuv420p",
+                "-pix_fmt", "yuv420p10le" if self.bitDepth == "16bit" else "yuv420p",
                 "-"
             ]
         )
@@ -293,9 +527,9 @@ class BuildBuffer:
             uPlane = (self.width // 2) * (self.height // 2)
             vPlane = (self.width // 2) * (self.height // 2)
             reshape = (self.height * 3 // 2, self.width)
-            
-        
-            chunk = yPlane + uPlane + vPlane
+            dType = np.int16 if self.bitDepth == "16bit" else np.uint8
+
+            chunk = (yPlane + uPlane + vPlane) * np.dtype(dType).itemsize
             process = subprocess.Popen(
                 command,
                 stdout=subprocess.PIPE,
@@ -303,15 +537,25 @@ class BuildBuffer:
             )
             self.decodedFrames = 0
             self.readingDone = False
-        
-            while True:
-                rawFrame = process.stdout.read(chunk)
-                if not rawFrame:
-                    self.readBuffer.put(None)
-                    break
-        
-                self.readBuffer.put(torch.from_numpy(cv2.cvtColor(np.frombuffer(rawFrame, dtype=np.uint8).reshape(reshape), cv2.COLOR_YUV2RGB_I420)))
-                self.decodedFrames += 1
+
+            if self.frameRing is not None:
+                self.decodeIntoRing(process)
+            else:
+                while True:
+                    decodeStart = time.perf_counter()
+                    rawFrame = process.stdout.read(chunk)
+                    if not rawFrame:
+                        self.readBuffer.put(None)
+                        break
+
+                    rawFrame = np.frombuffer(rawFrame, dtype=dType).reshape(reshape)
+                    if not self.yuv:
+                        rawFrame = cv2.cvtColor(rawFrame, cv2.COLOR_YUV2RGB_I420)
+
+                    if profiler.enabled:
+                        profiler.record("decode", time.perf_counter() - decodeStart)
+                    profiler.put(self.readBuffer, torch.from_numpy(rawFrame), "decodeQueue")
+                    self.decodedFrames += 1
 
         except Exception as e:
             logging.error(f"An error occurred: {str(e)}")
@@ -322,11 +566,45 @@ class BuildBuffer:
             self.readBuffer.put(None)
             process.stdout.close()
 
+    def decodeIntoRing(self, process):
+        """
+        Zero allocation decoding loop, FFMPEG's output is read straight into a free slot of the ring and converted into its preallocated RGB buffer.
+        """
+        while True:
+            slot = self.frameRing.acquire()
+            decodeStart = time.perf_counter()
+            if not readInto(process.stdout, self.frameRing.rawViews[slot]):
+                self.frameRing.releaseSlot(slot)
+                self.readBuffer.put(None)
+                break
+
+            if self.yuv:
+                frame = self.frameRing.rawFrames[slot]
+            else:
+                cv2.cvtColor(
+                    self.frameRing.rawViews[slot],
+                    cv2.COLOR_YUV2RGB_I420,
+                    dst=self.frameRing.frameViews[slot],
+                )
+                frame = self.frameRing.frames[slot]
+
+            if profiler.enabled:
+                profiler.record("decode", time.perf_counter() - decodeStart)
+            profiler.put(self.readBuffer, frame, "decodeQueue")
+            self.decodedFrames += 1
+
     def read(self):
         """
-        Returns a numpy array in RGB format.
+        Returns a tensor in RGB format, or in planar YUV420 format if yuv or 16bit is enabled.
+        """
+        return profiler.get(self.readBuffer, "read")
+
+    def release(self, frame: torch.Tensor):
+        """
+        Hand a frame back to the ring once it is no longer needed, does nothing when the ring is disabled.
         """
-        return self.readBuffer.get()
+        if self.frameRing is not None:
+            self.frameRing.release(frame)
 
     def isReadingDone(self):
         """
@@ -375,6 +653,12 @@ class WriteBuffer:
         inpoint: float = 0.0,
         outpoint: float = 0.0,
         preview: bool = False,
+        frameRing: FrameRing = None,
+        yuv: bool = False,
+        frameLimit: int = 0,
+        ffprobePath: str = None,
+        encodePreset: str = None,
+        encodeQuality: int = None,
     ):
         """
         A class meant to Pipe the input to FFMPEG from a queue.
@@ -397,6 +681,12 @@ class WriteBuffer:
         inpoint: float - The start time of the segment to encode, in seconds.
         outpoint: float - The end time of the segment to encode, in seconds.
         preview: bool - Whether to preview the video.
+        frameRing: FrameRing - The ring of the BuildBuffer, frames coming from it are released once they have been written.
+        yuv: bool - Whether to pipe planar YUV420 into FFMPEG, RGB frames are converted on their own device and (H * 3 // 2, W) frames are written as they are.
+        frameLimit: int - Stop encoding after this many frames, later frames are still drained from the queue. 0 means no limit.
+        ffprobePath: str - The path to FFPROBE, used to look up the audio streams of the input from the probe cache.
+        encodePreset: str - Replaces the preset of the encode method, see PRESET_LADDERS. None keeps the default preset.
+        encodeQuality: int - Replaces the CRF, CQ or QP of the encode method. None keeps the default quality.
         """
         self.input = input
         self.output = os.path.normpath(output)
@@ -412,17 +702,27 @@ class WriteBuffer:
         self.queueSize = queueSize
         self.transparent = transparent
         self.audio = audio
+        self.ffprobePath = ffprobePath
         self.benchmark = benchmark
         self.bitDepth = bitDepth
         self.inpoint = inpoint
         self.outpoint = outpoint
         self.preview = preview
-
-    def encodeSettings(self, verbose: bool = False) -> list:
+        self.frameRing = frameRing
+        self.yuv = yuv
+        self.frameLimit = frameLimit
+        self.encodePreset = encodePreset
+        self.encodeQuality = encodeQuality
+        self.hostFrame = None
+        self.queuedFrames = 0
+        self.writeStall = 0.0
+
+    def encodeSettings(self, verbose: bool = False, output: str = None) -> list:
         """
         This will return the command for FFMPEG to work with, it will be used inside of the scope of the class.
 
         verbose : bool - Whether to log the progress of the encoding.
+        output : str - Encode into this file instead of the output, without the audio of the source.
         """
         if self.bitDepth == "8bit":
             inputPixFormat = "rgb24"
@@ -478,6 +778,9 @@ class WriteBuffer:
                 inputPixFormat = "rgb48le"
                 outputPixFormat = "yuv444p10le"
 
+        if self.yuv and not self.transparent and not self.grayscale:
+            inputPixFormat = "yuv420p" if self.bitDepth == "8bit" else "yuv420p10le"
+
         if not self.benchmark:
             command = [
                 self.ffmpegPath,
@@ -495,11 +798,18 @@ class WriteBuffer:
                 str(self.fps),
                 "-i",
                 "-",
-                "-an",
             ]
+            command.extend(self.muxSettings(verbose) if output is None else ["-an"])
+            output = output or self.output
 
             if not self.custom_encoder:
-                command.extend(matchEncoder(self.encode_method))
+                command.extend(
+                    applyPreset(
+                        matchEncoder(self.encode_method),
+                        self.encodePreset,
+                        self.encodeQuality,
+                    )
+                )
 
                 filters = []
                 if self.sharpen:
@@ -511,7 +821,7 @@ class WriteBuffer:
                 if filters:
                     command.extend(["-vf", ",".join(filters)])
 
-                command.extend(["-pix_fmt", outputPixFormat, self.output])
+                command.extend(["-pix_fmt", outputPixFormat, output])
 
             else:
                 customEncoderList = self.custom_encoder.split()
@@ -554,7 +864,7 @@ class WriteBuffer:
                     )
                     customEncoderList.extend(["-pix_fmt", outputPixFormat])
 
-                customEncoderList.append(self.output)
+                customEncoderList.append(output)
                 command.extend(customEncoderList)
 
 
@@ -585,6 +895,54 @@ class WriteBuffer:
 
         return command
 
+    def muxSettings(self, verbose: bool = False) -> list:
+        """
+        Adds the source as a second input so its audio, and its subtitles where the container can take them as they are,
+        are muxed while the frames are encoded instead of in a second pass over the finished output.
+
+        verbose : bool - Whether to log what is muxed.
+        """
+        if not self.audio or self.benchmark:
+            return ["-an"]
+
+        subtitles = self.output.endswith(".mkv") and self.sourceStreams()["subtitleStreams"] > 0
+        if not self.hasAudio() and not subtitles:
+            if verbose:
+                logging.info("No audio stream found, skipping audio")
+            return ["-an"]
+
+        command = []
+        if self.outpoint != 0:
+            command.extend(["-ss", str(self.inpoint), "-to", str(self.outpoint)])
+
+        command.extend(
+            [
+                "-i",
+                self.input,
+                "-map",
+                "0:v:0",
+                "-map",
+                "1:a:0?",
+            ]
+        )
+
+        # A stream copy the container can not hold would fail the whole render at the very end
+        sourceCodec = self.sourceStreams().get("audioCodec")
+        codec = audioCodec(self.output, sourceCodec)
+        command.extend(["-c:a", codec])
+        if verbose and codec != "copy":
+            logging.info(f"{sourceCodec or 'The source audio'} can not be copied into {self.output}, encoding it to {codec}")
+
+        if subtitles:
+            command.extend(["-map", "1:s?", "-c:s", "copy"])
+
+        # -shortest would cut the video as soon as the source runs out, which happens long before the last frame
+        # comes through the pipe, the audio is bounded by the segment and the frame limit instead
+        if self.frameLimit:
+            command.extend(["-t", str(self.frameLimit / self.fps)])
+
+        return command
+
     def start(self, queue: Queue = None):
         """
         The actual underlying logic for encoding, it starts a queue and gets the necessary FFMPEG command from encodeSettings.
@@ -598,10 +956,13 @@ class WriteBuffer:
 
         self.latestFrame = None
         self.writeBuffer = queue if queue is not None else Queue(maxsize=self.queueSize)
+        self.failed = False
 
         if verbose:
             logging.info(f"Encoding options: {' '.join(map(str, command))}")
 
+        sourceFrame = None
+        queueDone = False
         try:
             with open(ffmpegLogPath, "w") as log_file:
                 with subprocess.Popen(
@@ -613,46 +974,97 @@ class WriteBuffer:
                     writtenFrames = 0
                     self.isWritingDone = False
                     while True:
-                        frame = self.writeBuffer.get()
+                        frame = profiler.get(self.writeBuffer, "encodeQueue")
                         if frame is None:
+                            queueDone = True
                             if verbose:
                                 logging.info(f"Encoded {writtenFrames} frames")
                             break
-        
-                        if self.bitDepth == "8bit":
-                            frame = (
-                                frame
-                                .to(torch.uint8)
-                                .cpu()
-                                .numpy()
-                            )
-                        else:
-                            frame = (
-                                frame
-                                .to(torch.float32)
-                                .mul(257)
-                                .cpu()
-                                .numpy()
-                                .astype(np.uint16)
-                            )
-                        
-                        if self.preview:
-                            self.latestFrame = frame
-
-                        frame = np.ascontiguousarray(frame)
-                        
-                        self.process.stdin.write(frame.tobytes())
+
+                        if self.frameLimit and writtenFrames >= self.frameLimit:
+                            if self.frameRing is not None:
+                                self.frameRing.release(frame)
+                            continue
+
+                        encodeStart = time.perf_counter()
+                        sourceFrame = frame
+                        frame = self.toHost(frame)
+
+                        # The staging buffer goes into the pipe as it is, without a bytes copy of the frame
+                        self.process.stdin.write(memoryview(frame).cast("B"))
                         writtenFrames += 1
-        
+                        if profiler.enabled:
+                            profiler.record("encode", time.perf_counter() - encodeStart)
+
+                        if self.frameRing is not None:
+                            self.frameRing.release(sourceFrame)
+                        sourceFrame = None
+
+            if self.process.returncode != 0:
+                self.failed = True
+                logging.error(f"FFMPEG exited with code {self.process.returncode} while encoding")
+
         except Exception as e:
+            self.failed = True
             if verbose:
                 logging.error(f"An error occurred: {str(e)}")
-        
+
+            # Keep draining so the processing never blocks on a dead encoder, the frames go back to the ring
+            if self.frameRing is not None and sourceFrame is not None:
+                self.frameRing.release(sourceFrame)
+            while not queueDone:
+                frame = self.writeBuffer.get()
+                queueDone = frame is None
+                if self.frameRing is not None and not queueDone:
+                    self.frameRing.release(frame)
+
         finally:
             self.isWritingDone = True
-            if self.audio and not self.benchmark:
-                self.mergeAudio()
     
+    def toHost(self, frame: torch.Tensor, out: torch.Tensor = None) -> np.ndarray:
+        """
+        Quantize a frame from the queue straight into a host buffer laid out the way FFMPEG expects it and keep it around for the preview.
+
+        frame: torch.Tensor - An RGB frame in the 0-255 range, or a planar YUV420 frame in yuv mode.
+        out: torch.Tensor - The host buffer to fill, the preallocated staging buffer of the WriteBuffer if None.
+
+        Returns a numpy view of the filled buffer, it is overwritten by the next frame.
+        """
+        if self.yuv:
+            if frame.dim() == 3:
+                frame = rgbToYUV420(
+                    frame, 8 if self.bitDepth == "8bit" else 10
+                )
+        elif self.bitDepth != "8bit":
+            # Half precision overflows at 255 * 257, the int32 result is narrowed into the int16 buffer
+            # by the copy below which keeps the bit pattern of the uint16 samples
+            frame = frame.to(torch.float32).mul(257).to(torch.int32)
+
+        if out is None:
+            if self.hostFrame is None:
+                self.hostFrame = torch.empty(
+                    frame.shape,
+                    dtype=torch.uint8 if self.bitDepth == "8bit" else torch.int16,
+                    pin_memory=torch.cuda.is_available(),
+                )
+            out = self.hostFrame
+
+        # Casting and moving to the host in one copy, the 8 bit cast truncates just like .to(torch.uint8) did
+        out.copy_(frame)
+        frame = out.numpy()
+        if not self.yuv and self.bitDepth != "8bit":
+            frame = frame.view(np.uint16)
+
+        if self.preview:
+            if not self.yuv:
+                self.latestFrame = frame.copy()
+            elif self.bitDepth == "8bit":
+                self.latestFrame = cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420)
+            else:
+                self.latestFrame = cv2.cvtColor((frame >> 2).astype(np.uint8), cv2.COLOR_YUV2RGB_I420)
+
+        return frame
+
     def peek(self):
         """
         Peek the queue.
@@ -663,7 +1075,14 @@ class WriteBuffer:
         """
         Add a frame to the queue. Must be in RGB format.
         """
-        self.writeBuffer.put(frame)
+        if self.frameRing is not None:
+            self.frameRing.retain(frame)
+
+        # Time spent waiting on the encoder is kept apart so the speed of the pipeline itself can be measured
+        writeStart = time.perf_counter()
+        profiler.put(self.writeBuffer, frame, "write")
+        self.writeStall += time.perf_counter() - writeStart
+        self.queuedFrames += 1
 
     def close(self):
         """
@@ -671,57 +1090,28 @@ class WriteBuffer:
         """
         self.writeBuffer.put(None)
 
-    def mergeAudio(self):
-        try:
-            ffmpegCommand = [
-                self.ffmpegPath,
-                "-i",
-                self.input,
-            ]
-            result = subprocess.run(
-                ffmpegCommand, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            if "Stream #0:1" not in result.stderr.decode():
-                logging.info("No audio stream found, skipping audio merge")
-                return
-
-            fileExtension = os.path.splitext(self.output)[1]
-            mergedFile = os.path.splitext(self.output)[0] + "_merged" + fileExtension
-
-            ffmpegCommand = [
-                self.ffmpegPath,
-                "-v",
-                "error",
-                "-stats",
-            ]
-            
-            if self.outpoint != 0:
-                ffmpegCommand.extend(
-                    ["-ss", str(self.inpoint), "-to", str(self.outpoint)]
-                )
-            
-            ffmpegCommand.extend([
-                "-i",
-                self.input,
-                "-i",
-                self.output,
-                "-c:v",
-                "copy",
-                "-c:a",
-                "copy" if not self.output.endswith(".webm") else "libopus",
-                "-map",
-                "1:v:0",
-                "-map",
-                "0:a:0",
-                "-shortest",
-                "-y",
-                mergedFile,
-            ])
-
-            logging.info(f"Merging audio with: {' '.join(ffmpegCommand)}")
-
-            subprocess.run(ffmpegCommand)
-            shutil.move(mergedFile, self.output)
-
-        except Exception as e:
-            logging.error(f"An error occurred: {str(e)}")
\ No newline at end of file
+    def sourceStreams(self) -> dict:
+        """
+        The probed stream counts of the input, no streams when FFPROBE is not available.
+        """
+        if self.ffprobePath is not None:
+            try:
+                return probeVideo(self.ffprobePath, self.input)
+            except Exception as e:
+                logging.error(f"Could not probe the input for its streams: {e}")
+
+        return {"audioStreams": 0, "subtitleStreams": 0}
+
+    def hasAudio(self) -> bool:
+        if self.ffprobePath is not None:
+            try:
+                return probeVideo(self.ffprobePath, self.input)["hasAudio"]
+            except Exception as e:
+                logging.error(f"Could not probe the input for audio, asking FFMPEG instead: {e}")
+
+        result = subprocess.run(
+            [self.ffmpegPath, "-i", self.input],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return "Stream #0:1" in result.stderr.decode()
\ No newline at end of file
@@ -0,0 +1,234 @@
+import json
+import logging
+import threading
+
+from .ffmpegSettings import BuildBuffer
+from .videoProbe import probeCache
+
+# The shorter side of the first pass frames, the detectors downsample to about this size themselves so decoding straight
+# to it skips the full resolution frames
+FIRST_PASS_SIZE = 224
+
+# How many differently configured maps are kept per file
+MAX_MAPS = 8
+
+
+class FirstPassMap:
+    def __init__(self, sceneChanges: list = None, duplicates: list = None):
+        """
+        The scene changes and duplicates of a range of frames, found by a fast low resolution pass before processing.
+
+        sceneChanges: list - The indices of the frames that start a new scene, None if the pass did not look for them.
+        duplicates: list - The indices of the frames that duplicate the last kept frame, None if the pass did not look for them.
+        """
+        self.sceneChanges = set(sceneChanges) if sceneChanges is not None else None
+        self.duplicates = set(duplicates) if duplicates is not None else None
+
+    @classmethod
+    def load(
+        cls,
+        input: str,
+        ffmpegPath: str,
+        inpoint: float = 0.0,
+        outpoint: float = 0.0,
+        totalFrames: int = 0,
+        exactFrames: bool = False,
+        dedupProcess=None,
+        dedupWindow: int = 8,
+        sceneChangeProcess=None,
+        settings: dict = None,
+        size: int = FIRST_PASS_SIZE,
+        width: int = 0,
+        height: int = 0,
+    ):
+        """
+        Run the first pass over a range of frames, or take its result from the probe cache.
+
+        input: str - The path to the input video file.
+        ffmpegPath: str - The path to the FFMPEG executable.
+        inpoint: float - The start time of the range, as handed to BuildBuffer.
+        outpoint: float - The end time of the range, 0 means the end of the video.
+        totalFrames: int - The amount of frames in the range.
+        exactFrames: bool - Whether totalFrames is exact, see BuildBuffer.
+        dedupProcess: WindowedDedup - The deduplication to run, None to skip duplicate detection.
+        dedupWindow: int - How many frames are deduplicated at once.
+        sceneChangeProcess: object - The scene change detection to run on the frames that are kept, None to skip it.
+        settings: dict - The methods and sensitivities of the detectors, a map is only reused for the same settings.
+        size: int - The shorter side of the decoded frames.
+        width: int - The width of the source, keeps the aspect ratio of the decoded frames, square frames if 0.
+        height: int - The height of the source.
+        """
+        decodeWidth, decodeHeight = firstPassSize(size, width, height)
+        key = json.dumps(
+            {
+                "inpoint": inpoint,
+                "outpoint": outpoint,
+                "totalFrames": totalFrames,
+                "exactFrames": exactFrames,
+                "dedup": dedupProcess is not None,
+                "scenechange": sceneChangeProcess is not None,
+                "size": [decodeWidth, decodeHeight],
+                **(settings or {}),
+            },
+            sort_keys=True,
+        )
+
+        maps = probeCache.get(input, "firstPass") or {}
+        if key in maps:
+            logging.info(f"Loaded the first pass of {input} from the probe cache")
+            return cls(maps[key]["sceneChanges"], maps[key]["duplicates"])
+
+        sceneChanges, duplicates = runFirstPass(
+            input,
+            ffmpegPath,
+            inpoint,
+            outpoint,
+            totalFrames,
+            exactFrames,
+            dedupProcess,
+            dedupWindow,
+            sceneChangeProcess,
+            decodeWidth,
+            decodeHeight,
+        )
+
+        def store(maps):
+            # Chunk workers store their maps at the same time, the update runs on what is on disk right now
+            maps = maps or {}
+            maps.pop(key, None)
+            maps[key] = {"sceneChanges": sceneChanges, "duplicates": duplicates}
+            while len(maps) > MAX_MAPS:
+                maps.pop(next(iter(maps)))
+            return maps
+
+        probeCache.update(input, "firstPass", store)
+
+        return cls(sceneChanges, duplicates)
+
+    def isSceneChange(self, index: int) -> bool:
+        return index in self.sceneChanges
+
+    def duplicateFlags(self, indices: list) -> list:
+        return [index in self.duplicates for index in indices]
+
+
+def firstPassSize(size: int, width: int = 0, height: int = 0) -> tuple:
+    """
+    The even sized resolution the first pass decodes at, the shorter side becomes size and the aspect ratio of the source is kept.
+    The detectors then downsample these frames to their sample size the same way they do with full resolution frames.
+    """
+    size += size % 2
+    if not width or not height:
+        return size, size
+
+    if width >= height:
+        return round(size * width / height / 2) * 2, size
+    return size, round(size * height / width / 2) * 2
+
+
+def runFirstPass(
+    input: str,
+    ffmpegPath: str,
+    inpoint: float,
+    outpoint: float,
+    totalFrames: int,
+    exactFrames: bool,
+    dedupProcess,
+    dedupWindow: int,
+    sceneChangeProcess,
+    width: int,
+    height: int,
+):
+    """
+    Decode the range at width x height and run the detectors over it the same way the pipeline would, scene changes
+    are only looked for between the frames that survive deduplication.
+
+    Returns the sorted scene change and duplicate frame indices, None for a detector that was not run.
+    """
+    readBuffer = BuildBuffer(
+        input,
+        ffmpegPath,
+        inpoint,
+        outpoint,
+        width=width,
+        height=height,
+        resize=True,
+        resizeMethod="area",
+        totalFrames=totalFrames,
+        exactFrames=exactFrames,
+    )
+    decoder = threading.Thread(target=readBuffer.start, daemon=True)
+    decoder.start()
+
+    sceneChanges = [] if sceneChangeProcess is not None else None
+    duplicates = [] if dedupProcess is not None else None
+
+    # Detectors that calibrate themselves see the features of the whole range before they decide on any frame
+    calibrate = hasattr(sceneChangeProcess, "calibrate")
+    features = []
+
+    def detect(window):
+        flags = (
+            dedupProcess.runWindow([frame for _, frame in window])
+            if dedupProcess is not None
+            else [False] * len(window)
+        )
+        kept = []
+        for (index, frame), isDuplicate in zip(window, flags):
+            if isDuplicate:
+                duplicates.append(index)
+            else:
+                kept.append((index, frame))
+
+        if sceneChangeProcess is None or not kept:
+            return
+
+        if calibrate:
+            features.extend(
+                zip([index for index, _ in kept], sceneChangeProcess.features([frame for _, frame in kept]))
+            )
+        else:
+            flags = sceneChangeProcess.runWindow([frame for _, frame in kept])
+            sceneChanges.extend(index for (index, _), isSceneChange in zip(kept, flags) if isSceneChange)
+
+    if dedupProcess is not None:
+        dedupProcess.reset()
+    if sceneChangeProcess is not None:
+        sceneChangeProcess.reset()
+
+    try:
+        window = []
+        index = 0
+        while True:
+            frame = readBuffer.read()
+            if frame is None:
+                break
+
+            window.append((index, frame))
+            index += 1
+            if len(window) == dedupWindow:
+                detect(window)
+                window = []
+
+        if window:
+            detect(window)
+        decoder.join()
+
+        if calibrate:
+            sceneChangeProcess.calibrate([feature for _, feature in features])
+            sceneChanges.extend(
+                index for index, feature in features if sceneChangeProcess.decide(feature)
+            )
+    finally:
+        # The pipeline starts from a clean state, the detectors may run inline for the parts the pass did not cover
+        if dedupProcess is not None:
+            dedupProcess.reset()
+        if sceneChangeProcess is not None:
+            sceneChangeProcess.reset()
+
+    logging.info(
+        f"First pass over {index} frames found "
+        f"{len(sceneChanges) if sceneChanges is not None else 'unchecked'} scene changes and "
+        f"{len(duplicates) if duplicates is not None else 'unchecked'} duplicates"
+    )
+    return sceneChanges, duplicates
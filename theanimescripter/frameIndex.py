@@ -0,0 +1,105 @@
+import json
+import bisect
+import logging
+import subprocess
+
+from .videoProbe import probeCache
+
+
+def getVideoPackets(ffprobePath: str, input: str):
+    """
+    Read the presentation timestamps and keyframe flags of the first video stream without decoding it.
+
+    ffprobePath: str - The path to the FFPROBE executable.
+    input: str - The path to the input video file.
+
+    Returns the frame timestamps in presentation order and the indices of the keyframes among them,
+    the timestamps are relative to the start of the file, the same reference FFMPEG's -ss uses.
+    """
+    command = [
+        ffprobePath,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags:format=start_time",
+        "-of", "json",
+        input,
+    ]
+
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout)
+
+    startTime = float(probe.get("format", {}).get("start_time", 0) or 0)
+    packets = [
+        (float(packet["pts_time"]) - startTime, packet.get("flags", "").startswith("K"))
+        for packet in probe.get("packets", [])
+        if packet.get("pts_time", "N/A") != "N/A"
+    ]
+    packets.sort(key=lambda packet: packet[0])
+
+    frameTimes = [packet[0] for packet in packets]
+    keyframes = [index for index, packet in enumerate(packets) if packet[1]]
+    return frameTimes, keyframes
+
+
+class FrameIndex:
+    def __init__(self, frameTimes: list, keyframes: list):
+        """
+        The presentation timestamps and keyframes of a video, enough to turn a time range into exact frame numbers.
+
+        frameTimes: list - The frame timestamps in presentation order.
+        keyframes: list - The indices of the keyframes within frameTimes.
+        """
+        self.frameTimes = frameTimes
+        self.keyframes = keyframes
+
+    @classmethod
+    def load(cls, ffprobePath: str, input: str):
+        """
+        Build the index of a video, or take it from the probe cache if the file has not changed since it was last indexed.
+
+        Probing the packets of an hour long master takes a few seconds, rendering many short ranges out of the same
+        file only pays for it once.
+
+        ffprobePath: str - The path to the FFPROBE executable.
+        input: str - The path to the input video file.
+        """
+        cached = probeCache.get(input, "frameIndex")
+        if cached is not None:
+            logging.info(f"Loaded the frame index of {input} from the probe cache")
+            return cls(cached["frameTimes"], cached["keyframes"])
+
+        frameTimes, keyframes = getVideoPackets(ffprobePath, input)
+        probeCache.put(
+            input, "frameIndex", {"frameTimes": frameTimes, "keyframes": keyframes}
+        )
+
+        logging.info(f"Indexed {len(frameTimes)} frames and {len(keyframes)} keyframes of {input}")
+        return cls(frameTimes, keyframes)
+
+    def frameRange(self, inpoint: float, outpoint: float):
+        """
+        The frames FFMPEG presents between inpoint and outpoint, the same ones an accurate -ss / -to cut keeps.
+
+        inpoint: float - The start time of the range.
+        outpoint: float - The end time of the range, 0 means the end of the video.
+
+        Returns a (startIndex, endIndex) tuple, endIndex is exclusive.
+        """
+        # ffprobe rounds timestamps to the microsecond
+        start = bisect.bisect_left(self.frameTimes, inpoint - 0.000001)
+        end = (
+            len(self.frameTimes)
+            if outpoint == 0
+            else bisect.bisect_left(self.frameTimes, outpoint - 0.000001)
+        )
+        return start, max(start, end)
+
+    def seekTime(self, index: int) -> float:
+        """
+        An input -ss that makes FFMPEG start decoding at the keyframe before the frame and present that frame first.
+        """
+        return max(self.frameTimes[index] - 0.000001, 0)
+
+    def keyframeBefore(self, index: int) -> int:
+        position = bisect.bisect_right(self.keyframes, index) - 1
+        return self.keyframes[position] if position >= 0 else 0
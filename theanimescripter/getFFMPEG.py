@@ -21,6 +21,9 @@ else:
 
 os.makedirs(mainPath, exist_ok=True)
 
+# Seconds the FFMPEG download may stay silent before it is given up on
+TIMEOUT = 30
+
 
 def getFFMPEG():
     ffmpegPath = shutil.which("ffmpeg")
@@ -38,6 +41,38 @@ def getFFMPEG():
     return str(ffmpegPath)
 
 
+def getFFPROBE(ffmpegPath: str = None):
+    """
+    Locate FFPROBE, next to the FFMPEG in use first, then in the System Path and then in the FFMPEG folder of TAS.
+    Older installs only extracted FFMPEG and a system FFMPEG may come without FFPROBE, in both cases the archive
+    is downloaded into the folder of TAS, never next to a system binary.
+
+    ffmpegPath: str - The path returned by getFFMPEG.
+    """
+    isWindows = platform.system() == "Windows"
+    name = "ffprobe.exe" if isWindows else "ffprobe"
+
+    if ffmpegPath:
+        ffprobePath = os.path.join(os.path.dirname(os.path.abspath(ffmpegPath)), name)
+        if os.path.isfile(ffprobePath):
+            logging.info(f"FFPROBE was found next to FFMPEG: {ffprobePath}")
+            return str(ffprobePath)
+
+    ffprobePath = shutil.which("ffprobe")
+    if ffprobePath is not None:
+        logging.info(f"FFPROBE was found in System Path: {ffprobePath}")
+        return str(ffprobePath)
+
+    ffmpegDir = os.path.join(mainPath, "ffmpeg")
+    ffprobePath = os.path.join(ffmpegDir, name)
+    logging.info(f"FFPROBE Path: {ffprobePath}")
+    if not os.path.exists(ffprobePath):
+        downloadAndExtractFFMPEG(os.path.join(ffmpegDir, "ffmpeg.exe" if isWindows else "ffmpeg"))
+        if not os.path.exists(ffprobePath):
+            raise FileNotFoundError(f"The FFMPEG archive did not contain {name}")
+    return str(ffprobePath)
+
+
 def downloadAndExtractFFMPEG(ffmpegPath):
     logging.info("Getting FFMPEG")
     extractFunc = (
@@ -50,7 +85,9 @@ def downloadAndExtractFFMPEG(ffmpegPath):
 
     os.makedirs(ffmpegDir, exist_ok=True)
 
-    response = requests.get(FFMPEGURL, stream=True)
+    # Offline machines give up quickly instead of hanging, the callers fall back to what works without FFPROBE
+    response = requests.get(FFMPEGURL, stream=True, timeout=TIMEOUT)
+    response.raise_for_status()
     totalSizeInBytes = int(response.headers.get("content-length", 0))
     totalSizeInMB = totalSizeInBytes // (1024 * 1024)
 
@@ -68,10 +105,11 @@ def downloadAndExtractFFMPEG(ffmpegPath):
 def extractFFMPEGZip(ffmpegZipPath, ffmpegDir):
     with zipfile.ZipFile(ffmpegZipPath, "r") as zipRef:
         zipRef.extractall(ffmpegDir)
-    os.rename(
-        os.path.join(ffmpegDir, "ffmpeg-master-latest-win64-gpl", "bin", "ffmpeg.exe"),
-        os.path.join(ffmpegDir, "ffmpeg.exe"),
-    )
+    for binary in ["ffmpeg.exe", "ffprobe.exe"]:
+        os.replace(
+            os.path.join(ffmpegDir, "ffmpeg-master-latest-win64-gpl", "bin", binary),
+            os.path.join(ffmpegDir, binary),
+        )
     os.remove(ffmpegZipPath)
     shutil.rmtree(os.path.join(ffmpegDir, "ffmpeg-master-latest-win64-gpl"))
 
@@ -80,6 +118,7 @@ def extractFFMPEGTar(ffmpegTarPath, ffmpegDir):
     with tarfile.open(ffmpegTarPath, "r:xz") as tarRef:
         tarRef.extractall(ffmpegDir)
     for directory in glob.glob(os.path.join(ffmpegDir, "ffmpeg-*-static")):
-        os.rename(os.path.join(directory, "ffmpeg"), os.path.join(ffmpegDir, "ffmpeg"))
+        for binary in ["ffmpeg", "ffprobe"]:
+            os.replace(os.path.join(directory, binary), os.path.join(ffmpegDir, binary))
         shutil.rmtree(directory)
     os.remove(ffmpegTarPath)
\ No newline at end of file
@@ -2,7 +2,36 @@ import cv2
 import logging
 import textwrap
 
-def getVideoMetadata(inputPath, inPoint, outPoint):
+from .videoProbe import probeVideo
+
+
+def getOpenCVMetadata(inputPath):
+    """
+    Fallback for when FFPROBE is not available, only knows about the first video stream.
+    """
+    try:
+        cap = cv2.VideoCapture(inputPath)
+    except Exception as e:
+        logging.error(f"Error opening video file: {e}")
+        exit(1)
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    metadata = {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": fps,
+        "nbFrames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "codec": "".join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)]),
+        "pixFmt": "rgb24" if cap.get(cv2.CAP_PROP_FORMAT) == cv2.CV_8UC3 else "yuv420p",
+    }
+    metadata["duration"] = metadata["nbFrames"] / fps if fps else 0
+
+    cap.release()
+    return metadata
+
+
+def getVideoMetadata(inputPath, inPoint, outPoint, ffprobePath=None):
     """
     Get metadata from a video file.
 
@@ -10,18 +39,23 @@ def getVideoMetadata(inputPath, inPoint, outPoint):
     inputPath (str): The path to the video file.
     inPoint (float): The start time of the video clip.
     outPoint (float): The end time of the video clip.
+    ffprobePath (str): The path to FFPROBE, the results are cached per file. OpenCV is used when it is missing.
 
     Returns:
     tuple: A tuple containing the width, height, fps, total frames to be processed, and pixel format of the video.
     """
-    try:
-        cap = cv2.VideoCapture(inputPath)
-    except Exception as e:
-        logging.error(f"Error opening video file: {e}")
-        exit(1)
+    metadata = None
+    if ffprobePath is not None:
+        try:
+            metadata = probeVideo(ffprobePath, inputPath)
+        except Exception as e:
+            logging.error(f"Could not probe the video with FFPROBE, falling back to OpenCV: {e}")
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if metadata is None:
+        metadata = getOpenCVMetadata(inputPath)
+
+    width = metadata["width"]
+    height = metadata["height"]
 
     if width == 0 or height == 0:
         logging.error(
@@ -29,14 +63,11 @@ def getVideoMetadata(inputPath, inPoint, outPoint):
         )
         exit(1)
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    nframes = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
-
-    codec = "".join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)])
+    fps = metadata["fps"]
+    nframes = metadata["nbFrames"]
 
-    duration = round(nframes / fps, 2) if fps else 0
-    inOutDuration = round((outPoint - inPoint) / fps, 2) if fps else 0
+    duration = round(metadata["duration"], 2)
+    inOutDuration = round(outPoint - inPoint, 2) if outPoint != 0 else 0
 
     # Calculate total frames from inPoint to outPoint
     if outPoint != 0:
@@ -44,9 +75,6 @@ def getVideoMetadata(inputPath, inPoint, outPoint):
     else:
         totalFramesToBeProcessed = nframes
 
-    pix_fmt = cap.get(cv2.CAP_PROP_FORMAT)
-    pix_fmt_str = "rgb24" if pix_fmt == cv2.CV_8UC3 else "yuv420p"
-
     logging.info(
         textwrap.dedent(f"""
     ============== Video Metadata ==============
@@ -55,13 +83,13 @@ def getVideoMetadata(inputPath, inPoint, outPoint):
     AspectRatio: {round(width/height, 2)}
     FPS: {round(fps, 2)}
     Number of total frames: {nframes}
-    Codec: {codec}
+    Codec: {metadata["codec"]}
     Duration: {duration} seconds
     In-Out Duration: {inOutDuration} seconds
     Total frames to be processed: {totalFramesToBeProcessed}
-    Pixel Format: {pix_fmt_str}""")
+    Pixel Format: {metadata["pixFmt"]}
+    Color: {metadata.get("colorSpace")} / {metadata.get("colorTransfer")} / {metadata.get("colorPrimaries")} ({metadata.get("colorRange")})
+    Audio Streams: {metadata.get("audioStreams", "unknown")}""")
     )
 
-    cap.release()
-
-    return width, height, fps, totalFramesToBeProcessed, pix_fmt_str
\ No newline at end of file
+    return width, height, fps, totalFramesToBeProcessed, metadata["pixFmt"]
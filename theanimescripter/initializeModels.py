@@ -205,6 +205,9 @@ def initializeModels(self):
                     self.height,
                     self.custom_model,
                     upscaleSkipProcess,
+                    self.upscale_tile_size,
+                    self.upscale_tile_overlap,
+                    self.upscale_tile_threads,
                 )
 
             case (
@@ -227,6 +230,9 @@ def initializeModels(self):
                     self.height,
                     self.custom_model,
                     upscaleSkipProcess,
+                    self.upscale_tile_size,
+                    self.upscale_tile_overlap,
+                    self.upscale_tile_threads,
                 )
 
             case "shufflecugan-ncnn" | "span-ncnn":
@@ -285,7 +291,7 @@ def initializeModels(self):
                     outputHeight,
                     self.interpolate_method,
                     self.ensemble,
-                    self.interpolate_factor,
+                    int(self.interpolate_factor),
                     self.fps,
                 )
 
@@ -322,7 +328,7 @@ def initializeModels(self):
 
                 interpolate_process = RifeTensorRT(
                     self.interpolate_method,
-                    self.interpolate_factor,
+                    int(self.interpolate_factor),
                     outputWidth,
                     outputHeight,
                     self.half,
@@ -403,6 +409,13 @@ def initializeModels(self):
                 scenechange_process = SceneChangeCuda(
                     self.scenechange_sens,
                 )
+            case "adaptive":
+                from theanimescripter.scenechange import SceneChangeAdaptive
+
+                scenechange_process = SceneChangeAdaptive(
+                    self.scenechange_sens,
+                    self.device,
+                )
             case "differential-tensorrt":
                 from theanimescripter.scenechange import DifferentialTensorRT
 
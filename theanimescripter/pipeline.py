@@ -0,0 +1,162 @@
+import logging
+import threading
+import torch
+
+from queue import Queue
+from typing import Callable
+from .profiler import profiler
+
+
+class PipelineFrame:
+    __slots__ = ("frame", "sourceFrame", "isSceneChange", "index", "repeat")
+
+    def __init__(self, frame: torch.Tensor, index: int = 0):
+        """
+        A frame on its way through the stages.
+
+        frame: torch.Tensor - The frame as the current stage sees it.
+        sourceFrame: torch.Tensor - The frame as it came out of the BuildBuffer, None once it has been handed back.
+        isSceneChange: bool - Set by the scene change stage.
+        index: int - The position of the frame in the decoded video.
+        repeat: int - How many more times the output stage writes the frame, set when retiming deduplicated frames.
+        """
+        self.frame = frame
+        self.sourceFrame = frame
+        self.isSceneChange = False
+        self.index = index
+        self.repeat = 0
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[PipelineFrame], list],
+        flush: Callable[[], list] = None,
+    ):
+        """
+        name: str - Used for logging and for naming the worker thread.
+        run: Callable - Processes a frame and returns the frames for the next stage, an empty list drops or holds it back.
+        flush: Callable - Returns the frames a stage held back, called once at the end of the video.
+        """
+        self.name = name
+        self.run = run
+        self.flush = flush
+
+
+class StagePipeline:
+    def __init__(
+        self,
+        stages: list,
+        threaded: bool = False,
+        queueSize: int = 4,
+        onError: Callable[[PipelineFrame], None] = None,
+    ):
+        """
+        Runs frames through a chain of stages in order.
+
+        In serial mode every frame goes through all stages on the thread that submitted it. In threaded mode every stage
+        gets its own worker connected to the next one by a bounded queue, so stages overlap on consecutive frames and the
+        throughput is set by the slowest stage. Every stage being a single FIFO worker keeps the frames in order.
+
+        When profiling, every stage is timed and workers book the time spent waiting for frames as <name>Idle and the
+        time spent waiting on the next stage as <name>Blocked.
+
+        stages: list - The stages to run, the last one is expected to consume the frames.
+        threaded: bool - Whether to give every stage its own worker thread.
+        queueSize: int - The amount of frames that can wait in front of a stage.
+        onError: Callable - Called with the frame whenever a stage raises, after the exception has been logged.
+        """
+        self.stages = stages
+        self.threaded = threaded
+        self.onError = onError
+        self.synchronize = threaded and torch.cuda.is_available()
+        self.submitted = 0
+        # Stages that raised, the frames they held never reached the output
+        self.errors = 0
+        self.errorLock = threading.Lock()
+
+        if self.threaded:
+            self.queues = [Queue(maxsize=queueSize) for _ in stages]
+            self.workers = [
+                threading.Thread(
+                    target=self.worker, args=(index,), name=stage.name, daemon=True
+                )
+                for index, stage in enumerate(stages)
+            ]
+            for worker in self.workers:
+                worker.start()
+
+    def runStage(self, stage: Stage, item: PipelineFrame) -> list:
+        try:
+            with profiler.measure(stage.name):
+                return stage.run(item)
+        except Exception as e:
+            logging.exception(f"Something went wrong in the {stage.name} stage, {e}")
+            with self.errorLock:
+                self.errors += 1
+            if self.onError is not None:
+                self.onError(item)
+            return []
+
+    def flushStage(self, stage: Stage) -> list:
+        if stage.flush is None:
+            return []
+        try:
+            return stage.flush()
+        except Exception as e:
+            logging.exception(f"Something went wrong while flushing the {stage.name} stage, {e}")
+            with self.errorLock:
+                self.errors += 1
+            return []
+
+    def runFrom(self, index: int, items: list):
+        for stage in self.stages[index:]:
+            if not items:
+                return
+            items = [output for item in items for output in self.runStage(stage, item)]
+
+    def worker(self, index: int):
+        stage = self.stages[index]
+        idle, blocked = f"{stage.name}Idle", f"{stage.name}Blocked"
+        inputQueue = self.queues[index]
+        outputQueue = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        # Inference mode is thread local
+        with torch.inference_mode():
+            while True:
+                item = profiler.get(inputQueue, idle)
+                outputs = self.flushStage(stage) if item is None else self.runStage(stage, item)
+
+                # Stages run on their own CUDA streams, the next stage must not see half written frames
+                if self.synchronize and outputs:
+                    torch.cuda.current_stream().synchronize()
+
+                if outputQueue is not None:
+                    for output in outputs:
+                        profiler.put(outputQueue, output, blocked)
+
+                if item is None:
+                    if outputQueue is not None:
+                        outputQueue.put(None)
+                    break
+
+    def submit(self, frame: torch.Tensor):
+        item = PipelineFrame(frame, self.submitted)
+        self.submitted += 1
+        if self.threaded:
+            self.queues[0].put(item)
+        else:
+            self.runFrom(0, [item])
+
+    def close(self):
+        """
+        Flush every stage in order and wait for the last frame to leave the pipeline.
+        """
+        if self.threaded:
+            self.queues[0].put(None)
+            for worker in self.workers:
+                worker.join()
+        else:
+            for index, stage in enumerate(self.stages):
+                self.runFrom(index + 1, self.flushStage(stage))
@@ -0,0 +1,215 @@
+import json
+import time
+import logging
+import threading
+
+from queue import Queue
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets in milliseconds
+BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf")]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, milliseconds: float):
+        for index, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += milliseconds
+        self.min = min(self.min, milliseconds)
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimated from the buckets, the upper bound of the bucket holding the percentile is returned, clamped to the observed range.
+        """
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return round(max(self.min, min(bound, self.max)), 4)
+        return round(self.max, 4)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "totalSeconds": round(self.total / 1000, 4),
+            "meanMs": round(self.total / self.count, 4) if self.count else 0,
+            "minMs": round(self.min, 4) if self.count else 0,
+            "maxMs": round(self.max, 4),
+            "p50Ms": self.percentile(0.5),
+            "p95Ms": self.percentile(0.95),
+            "p99Ms": self.percentile(0.99),
+            "histogram": {
+                f"<={bound}ms" if bound != float("inf") else f">{BUCKETS[-2]}ms": count
+                for bound, count in zip(BUCKETS, self.counts)
+                if count
+            },
+        }
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Collects per stage latencies, queue depths and stall times.
+
+        It is a no-op until enabled, so the hooks in the decoder, encoder and pipeline cost nothing in normal runs.
+        Stalls are time a thread spent blocked on a queue, which is what tells a decode bound run apart from a model
+        or encode bound one.
+        """
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.liveThread = None
+        self.stopEvent = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latencies = {}
+            self.stalls = {}
+            self.queues = {}
+            self.startTime = time.perf_counter()
+
+    def enable(self, reportPath: str, liveInterval: float = 0):
+        """
+        reportPath: str - Where the JSON report is written.
+        liveInterval: float - Rewrite the report every this many seconds while running, 0 only writes it at the end.
+        """
+        self.reportPath = reportPath
+        self.enabled = True
+        self.reset()
+
+        if liveInterval > 0:
+            self.stopEvent.clear()
+            self.liveThread = threading.Thread(
+                target=self.liveReport, args=(liveInterval,), daemon=True
+            )
+            self.liveThread.start()
+
+    def stop(self):
+        """
+        Write the final report and disable the profiler.
+        """
+        if not self.enabled:
+            return
+
+        if self.liveThread is not None:
+            self.stopEvent.set()
+            self.liveThread.join()
+            self.liveThread = None
+
+        self.writeReport()
+        self.enabled = False
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            if name not in self.latencies:
+                self.latencies[name] = LatencyHistogram()
+            self.latencies[name].add(seconds * 1000)
+
+    def stall(self, name: str, seconds: float):
+        with self.lock:
+            self.stalls[name] = self.stalls.get(name, 0.0) + seconds
+
+    def queueDepth(self, name: str, depth: int):
+        with self.lock:
+            stats = self.queues.setdefault(name, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += depth
+            stats[2] = max(stats[2], depth)
+
+    @contextmanager
+    def measure(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def get(self, queue: Queue, name: str):
+        """
+        queue.get that books the time spent waiting as a stall of name.
+        """
+        if not self.enabled:
+            return queue.get()
+
+        start = time.perf_counter()
+        item = queue.get()
+        self.stall(name, time.perf_counter() - start)
+        self.queueDepth(name, queue.qsize())
+        return item
+
+    def put(self, queue: Queue, item, name: str):
+        """
+        queue.put that books the time spent waiting for a free slot as a stall of name.
+        """
+        if not self.enabled:
+            queue.put(item)
+            return
+
+        start = time.perf_counter()
+        queue.put(item)
+        self.stall(name, time.perf_counter() - start)
+        self.queueDepth(name, queue.qsize())
+
+    def report(self) -> dict:
+        with self.lock:
+            elapsed = time.perf_counter() - self.startTime
+            stages = {name: histogram.summary() for name, histogram in self.latencies.items()}
+            stalls = {name: round(seconds, 4) for name, seconds in self.stalls.items()}
+            queues = {
+                name: {
+                    "samples": samples,
+                    "meanDepth": round(total / samples, 2) if samples else 0,
+                    "maxDepth": maximum,
+                }
+                for name, (samples, total, maximum) in self.queues.items()
+            }
+
+        busiest = max(stages, key=lambda name: stages[name]["totalSeconds"], default=None)
+        return {
+            "elapsedSeconds": round(elapsed, 4),
+            "bottleneck": self.bottleneck(stalls, busiest),
+            "stages": stages,
+            "stalls": stalls,
+            "queues": queues,
+        }
+
+    def bottleneck(self, stalls: dict, busiest: str) -> str:
+        """
+        Processing waiting on the decoder means decode bound, waiting on the encoder means encode bound, otherwise
+        the stage that spent the most time working is the one holding everything back.
+        """
+        readWait = stalls.get("read", 0)
+        writeWait = stalls.get("write", 0)
+        if max(readWait, writeWait) > 0.1 * (time.perf_counter() - self.startTime):
+            return "decode" if readWait >= writeWait else "encode"
+        return busiest or "unknown"
+
+    def writeReport(self):
+        try:
+            with open(self.reportPath, "w") as f:
+                json.dump(self.report(), f, indent=4)
+        except Exception as e:
+            logging.error(f"Could not write the profiling report: {e}")
+
+    def liveReport(self, interval: float):
+        while not self.stopEvent.wait(interval):
+            self.writeReport()
+
+
+profiler = Profiler()
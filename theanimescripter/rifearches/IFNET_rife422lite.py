@@ -127,6 +127,31 @@ class IFNet(nn.Module):
                     self.f1 = self.encode(img1[:, :3])
             self.counter += 1
 
+        return self.merge(img0, img1, self.f0, self.f1, timestep).mul(255).squeeze(0).permute(1, 2, 0)
+
+    def forwardBatch(self, img0, img1, timesteps, newPair=True):
+        """
+        Every intermediate frame of a pair in one pass, the pair is broadcast over a (N, 1, H, W) batch of timesteps.
+
+        newPair: bool - Encode img1, False reuses the encodings when a pair is split over several batches.
+
+        Returns a (N, H, W, 3) batch of frames in the 0-255 range.
+        """
+        if self.f0 is None:
+            self.f0 = self.encode(img0[:, :3])
+        if newPair or self.f1 is None:
+            self.f1 = self.encode(img1[:, :3])
+
+        n = timesteps.shape[0]
+        return self.merge(
+            img0.expand(n, -1, -1, -1),
+            img1.expand(n, -1, -1, -1),
+            self.f0.expand(n, -1, -1, -1),
+            self.f1.expand(n, -1, -1, -1),
+            timesteps,
+        ).mul(255).permute(0, 2, 3, 1)
+
+    def merge(self, img0, img1, f0, f1, timestep):
         merged = []
         warped_img0 = img0
         warped_img1 = img1
@@ -135,14 +160,14 @@ class IFNet(nn.Module):
             if flow is None:
                 flow, mask, feat = self.blocks[i](
                     torch.cat(
-                        (img0[:, :3], img1[:, :3], self.f0, self.f1, timestep), 1
+                        (img0[:, :3], img1[:, :3], f0, f1, timestep), 1
                     ),
                     None,
                     scale=self.scale_list[i],
                 )
             else:
-                wf0 = warp(self.f0, flow[:, :2])
-                wf1 = warp(self.f1, flow[:, 2:4])
+                wf0 = warp(f0, flow[:, :2])
+                wf1 = warp(f1, flow[:, 2:4])
                 fd, m0, feat = self.blocks[i](
                     torch.cat(
                         (
@@ -163,4 +188,4 @@ class IFNet(nn.Module):
             warped_img1 = warp(img1, flow[:, 2:4])
             merged.append((warped_img0, warped_img1))
         mask = torch.sigmoid(mask)
-        return (warped_img0 * mask + warped_img1 * (1 - mask)).mul(255).squeeze(0).permute(1, 2, 0)
\ No newline at end of file
+        return warped_img0 * mask + warped_img1 * (1 - mask)
\ No newline at end of file
@@ -1,34 +1,61 @@
 import torch
+import threading
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-tenGrid = None
+from collections import OrderedDict
 
+# Every scale of every model in use needs its own grid, the least recently used one is dropped beyond this
+MAX_GRIDS = 16
 
-def warp(tenInput, tenFlow):
-    global tenGrid
-    if tenGrid is None or tenGrid.size() != tenFlow.size():
-        N, _, H, W = tenFlow.shape
-        tenHorizontal = (
-            torch.linspace(-1.0, 1.0, W, device=device)
-            .view(1, 1, 1, W)
-            .expand(N, -1, H, -1)
-        )
-        tenVertical = (
-            torch.linspace(-1.0, 1.0, H, device=device)
-            .view(1, 1, H, 1)
-            .expand(N, -1, -1, W)
-        )
-        tenGrid = torch.cat([tenHorizontal, tenVertical], 1)
-
-    tenFlow = torch.cat(
-        [
-            tenFlow[:, 0:1, :, :] / ((tenInput.shape[3] - 1.0) / 2.0),
-            tenFlow[:, 1:2, :, :] / ((tenInput.shape[2] - 1.0) / 2.0),
-        ],
-        1,
+gridCache = OrderedDict()
+gridLock = threading.Lock()
+
+
+def getGrid(tenInput, tenFlow):
+    """
+    The sampling grid for a flow shape and the divisors that turn the flow from pixels into grid units.
+
+    Both are built once per shape, device and dtype and broadcast over the batch, so warping at a new scale
+    no longer throws away the grid of the previous one.
+    """
+    _, _, H, W = tenFlow.shape
+    key = (H, W, tenInput.shape[2], tenInput.shape[3], tenFlow.device, tenFlow.dtype)
+
+    with gridLock:
+        entry = gridCache.get(key)
+        if entry is not None:
+            gridCache.move_to_end(key)
+            return entry
+
+    tenHorizontal = (
+        torch.linspace(-1.0, 1.0, W, device=tenFlow.device, dtype=tenFlow.dtype)
+        .view(1, 1, 1, W)
+        .expand(1, -1, H, -1)
     )
+    tenVertical = (
+        torch.linspace(-1.0, 1.0, H, device=tenFlow.device, dtype=tenFlow.dtype)
+        .view(1, 1, H, 1)
+        .expand(1, -1, -1, W)
+    )
+    tenGrid = torch.cat([tenHorizontal, tenVertical], 1)
+    tenScale = torch.tensor(
+        [2.0 / (tenInput.shape[3] - 1.0), 2.0 / (tenInput.shape[2] - 1.0)],
+        device=tenFlow.device,
+        dtype=tenFlow.dtype,
+    ).view(1, 2, 1, 1)
+
+    with gridLock:
+        gridCache[key] = (tenGrid, tenScale)
+        if len(gridCache) > MAX_GRIDS:
+            gridCache.popitem(last=False)
+
+    return tenGrid, tenScale
+
+
+def warp(tenInput, tenFlow):
+    tenGrid, tenScale = getGrid(tenInput, tenFlow)
 
-    g = (tenGrid + tenFlow).permute(0, 2, 3, 1)
+    # grid + flow * scale in a single op, the only new tensor is the grid that is sampled
+    g = torch.addcmul(tenGrid, tenFlow, tenScale).permute(0, 2, 3, 1)
     return torch.nn.functional.grid_sample(
         input=tenInput,
         grid=g,
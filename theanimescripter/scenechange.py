@@ -2,13 +2,89 @@ import torch
 import os
 import logging
 
+from abc import ABC, abstractmethod
 from torch.nn import functional as F
 from .downloadModels import downloadModels, weightsDir, modelsMap
 
 torch.set_float32_matmul_precision("medium")
 
+# BT.601 luma weights for the pixel difference methods
+LUMA = (0.299, 0.587, 0.114)
+
+
+def areaDownsample(frames: list, size: tuple, device: torch.device) -> torch.Tensor:
+    """
+    Area downsample a list of (H, W, 3) frames in the 0-255 range into a (N, 3, size[0], size[1]) float batch in the 0-1 range.
+    """
+    if device.type != "cuda":
+        # Stacking full frames on the CPU only adds a copy that does not fit in the cache, the samples are stacked instead
+        return torch.cat(
+            [
+                F.interpolate(
+                    frame.to(device).permute(2, 0, 1).unsqueeze(0).float(),
+                    size=size,
+                    mode="area",
+                )
+                for frame in frames
+            ]
+        ).mul_(1 / 255)
+
+    batch = torch.stack([frame.to(device, non_blocking=True) for frame in frames])
+    return F.interpolate(
+        batch.permute(0, 3, 1, 2).float(), size=size, mode="area"
+    ).mul_(1 / 255)
+
+
+class SceneChangeBase(ABC):
+    """
+    Scene change detection over windows of consecutive frames, the pairs of a window are scored in one go and the
+    scores only come back to the host once per window. The last frame of a window carries over to the next one.
+    """
+
+    sceneChangeThreshold = 0.0
+    I0 = None
+
+    @abstractmethod
+    def scoreWindow(self, frames: list) -> list:
+        """
+        Returns the score of every frame against the frame before it.
+        """
+
+    def runWindow(self, frames: list) -> list:
+        """
+        Returns a list with True for every frame that starts a new scene.
+
+        frames: list - Consecutive (H, W, 3) frames.
+        """
+        return [score > self.sceneChangeThreshold for score in self.scoreWindow(frames)]
+
+    def run(self, frame) -> bool:
+        return self.runWindow([frame])[0]
+
+    def pairs(self, samples):
+        """
+        Prepend the carried over sample and return the (previous, current) samples of every pair, along with how
+        many frames at the start of the window have no previous frame to be compared against.
+        """
+        skipped = 0
+        if self.I0 is None:
+            self.I0 = samples[:1]
+            samples = samples[1:]
+            skipped = 1
+
+        previous = torch.cat([self.I0, samples[:-1]]) if len(samples) else samples
+        if len(samples):
+            self.I0 = samples[-1:].clone()
+        return previous, samples, skipped
+
+    def reset(self):
+        """
+        Forget the previous video so the instance can be reused for another one.
+        """
+        self.I0 = None
 
-class SceneChange:
+
+class SceneChange(SceneChangeBase):
     def __init__(
         self,
         half,
@@ -58,41 +134,35 @@ class SceneChange:
                 modelPath, providers=["CPUExecutionProvider"]
             )
 
-        self.I0 = None
-        self.I1 = None
+        # Models exported with a dynamic batch score the whole window in one call, the others pair by pair
+        inputShape = self.model.get_inputs()[0].shape
+        self.batched = len(inputShape) == 4 and not isinstance(inputShape[0], int)
 
-    @torch.inference_mode()
-    def processFrame(self, frame):
-        frame = frame.cpu().numpy()
-        frame = self.np.resize(frame, (224, 224, 3))
-        frame = (
-            frame.astype(self.np.float16)
-            if self.half
-            else frame.astype(self.np.float32)
-        )
-        frame = frame / 255
-        frame = frame.transpose((2, 0, 1))
-        return frame
+        self.I0 = None
+        self.device = torch.device("cpu")
 
     @torch.inference_mode()
-    def run(self, frame):
-        if self.I0 is None:
-            self.I0 = self.processFrame(frame)
-            return False
-
-        self.I1 = self.processFrame(frame)
-        inputs = self.np.concatenate((self.I0, self.I1), 0)
-
-        self.I0 = self.I1
-
-        result = self.model.run(None, {"input": inputs})[0][0][0]
+    def scoreWindow(self, frames):
+        samples = areaDownsample(frames, (224, 224), self.device)
+        previous, current, skipped = self.pairs(samples)
+        if not len(current):
+            return [0.0] * skipped
+
+        inputs = torch.cat([previous, current], dim=1).numpy()
+        inputs = inputs.astype(self.np.float16 if self.half else self.np.float32)
+
+        if self.batched:
+            result = self.model.run(None, {"input": inputs})[0]
+            scores = result.reshape(len(inputs), -1)[:, 0].tolist()
+        else:
+            scores = [
+                float(self.model.run(None, {"input": pair})[0][0][0]) for pair in inputs
+            ]
 
-        return (
-            result > self.sceneChangeThreshold
-        )
+        return [0.0] * skipped + scores
 
 
-class SceneChangeTensorRT:
+class SceneChangeTensorRT(SceneChangeBase):
     def __init__(self, half, sceneChangeThreshold=0.85, sceneChangeMethod="scenechange-tensorrt"):
         self.half = half
         self.sceneChangeThreshold = sceneChangeThreshold
@@ -177,6 +247,8 @@ class SceneChangeTensorRT:
             tensor_name = self.engine.get_tensor_name(i)
             if self.engine.get_tensor_mode(tensor_name) == self.trt.TensorIOMode.INPUT:
                 self.context.set_input_shape(tensor_name, self.dummyInput.shape)
+            else:
+                self.outputName = tensor_name
 
         with torch.cuda.stream(self.stream):
             for _ in range(10):
@@ -184,104 +256,75 @@ class SceneChangeTensorRT:
                 self.stream.synchronize()
 
         self.I0 = None
-        self.I1 = torch.zeros((3, self.height, self.width), device=self.device, dtype=self.dType)
-
-    @torch.inference_mode()
-    def processFrame(self, frame):
-        frame = (
-            frame.to(self.device, non_blocking=True, dtype=self.dType)
-            .permute(2, 0, 1)
-            .unsqueeze(0)
-            .mul(1.0 / 255.0)
-        )
-        frame = F.interpolate(frame, size=(self.height, self.width), mode="bilinear")
-        return frame.contiguous().squeeze(0)
+        self.outputs = self.dummyOutput.unsqueeze(0)
 
     @torch.inference_mode()
-    def run(self, frame):
+    def scoreWindow(self, frames):
         with torch.cuda.stream(self.stream):
-            if self.I0 is None:
-                self.I0 = self.processFrame(frame)
-                return False
-
-            self.I1 = self.processFrame(frame)
-
-            self.dummyInput.copy_(
-                torch.cat([self.I0, self.I1], dim=0),
-                non_blocking=True,
-            )
+            samples = areaDownsample(frames, (self.height, self.width), self.device)
+            previous, current, skipped = self.pairs(samples.to(self.dType))
+            if not len(current):
+                return [0.0] * skipped
+
+            if len(self.outputs) < len(current):
+                self.outputs = torch.zeros(
+                    (len(current), *self.dummyOutput.shape),
+                    device=self.device,
+                    dtype=self.dType,
+                )
+
+            # The engine takes a single pair, the executions are queued back to back on the stream and every one
+            # writes its score into its own slot so nothing has to wait for the host in between
+            for i in range(len(current)):
+                self.dummyInput[:3].copy_(previous[i], non_blocking=True)
+                self.dummyInput[3:].copy_(current[i], non_blocking=True)
+                self.context.set_tensor_address(self.outputName, self.outputs[i].data_ptr())
+                self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
 
-            self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
-            self.I0.copy_(self.I1, non_blocking=True)
+            scores = self.outputs[: len(current), 0, 0].float().cpu()
             self.stream.synchronize()
+            return [0.0] * skipped + scores.tolist()
 
-            return self.dummyOutput[0][0].item() > self.sceneChangeThreshold
 
+class SceneChangeCPU(SceneChangeBase):
+    def __init__(self, sceneChangeThreshold, device="cpu", half=False):
+        """
+        Scene change detection from the mean squared luma difference of two area downsampled frames.
 
-class SceneChangeCPU:
-    def __init__(self, sceneChangeThreshold):
-        import cv2
-        import numpy as np
-
-        self.cv2 = cv2
-        self.np = np
+        sceneChangeThreshold: float - Frames whose scaled difference is above it start a new scene.
+        device: str - The device the differences are computed on.
+        half: bool - Keep the samples in half precision.
+        """
         self.sceneChangeThreshold = sceneChangeThreshold
+        self.device = torch.device(device)
+        self.half = half and self.device.type == "cuda"
+        self.luma = torch.tensor(LUMA, device=self.device).view(1, 3, 1, 1)
+        self.stream = torch.cuda.Stream() if self.device.type == "cuda" else None
         self.I0 = None
 
-    def processFrame(self, frame):
-        frame = self.cv2.resize(frame.cpu().numpy(), (224, 224))
-        frame = self.cv2.cvtColor(frame, self.cv2.COLOR_BGR2GRAY)
-        frame = frame.astype(self.np.float16) / 255.0
-        return frame
-
-    def run(self, frame):
-        if self.I0 is None:
-            self.I0 = self.processFrame(frame)
-            return False
-
-        self.I1 = self.processFrame(frame)
-        result = self.np.clip((self.np.mean((self.I0 - self.I1) ** 2) * 10), 0, 1)
-
-        self.I0 = self.I1
-        return result > self.sceneChangeThreshold
-
-
-class SceneChangeCuda:
-    def __init__(self, sceneChangeThreshold):
-        self.sceneChangeThreshold = sceneChangeThreshold
-        self.I0 = None
-        self.stream = torch.cuda.Stream()
-        self.device = torch.device("cuda")
-
-    def processFrame(self, frame):
+    @torch.inference_mode()
+    def scoreWindow(self, frames):
         with torch.cuda.stream(self.stream):
-            frame = frame.to(self.device, non_blocking=True)
-            frame = F.interpolate(
-                frame.unsqueeze(0).float(),
-                size=(224, 224),
-                mode="bilinear",
-                align_corners=False,
+            samples = areaDownsample(frames, (224, 224), self.device)
+            samples = (samples * self.luma).sum(dim=1, keepdim=True)
+            previous, current, skipped = self.pairs(
+                samples.half() if self.half else samples
             )
-            frame = torch.mean(frame, dim=0, keepdim=True)
-            frame = frame.half() / 255.0
-        return frame
+            if not len(current):
+                return [0.0] * skipped
 
-    def run(self, frame):
-        with torch.cuda.stream(self.stream):
-            if self.I0 is None:
-                self.I0 = self.processFrame(frame)
-                return False
+            mse = (previous.float() - current.float()).square().mean(dim=(1, 2, 3))
+            scores = mse.mul(10).clamp(0, 1).cpu()
+
+        return [0.0] * skipped + scores.tolist()
 
-            self.I1 = self.processFrame(frame)
-            mse = torch.mean((self.I0 - self.I1) ** 2) * 10
-            mse = mse.clamp(0, 1)
 
-            self.I0.copy_(self.I1, non_blocking=True)
-            torch.cuda.synchronize()
-            return mse.item() > self.sceneChangeThreshold
+class SceneChangeCuda(SceneChangeCPU):
+    def __init__(self, sceneChangeThreshold):
+        super().__init__(sceneChangeThreshold, "cuda", half=True)
 
 
-class DifferentialTensorRT:
+class DifferentialTensorRT(SceneChangeBase):
     def __init__(
         self,
         scenechangeThreshold,
@@ -371,40 +414,181 @@ class DifferentialTensorRT:
             tensor_name = self.engine.get_tensor_name(i)
             if self.engine.get_tensor_mode(tensor_name) == self.trt.TensorIOMode.INPUT:
                 self.context.set_input_shape(tensor_name, self.dummyInput.shape)
+            else:
+                self.outputName = tensor_name
 
         with torch.cuda.stream(self.stream):
             for _ in range(10):
                 self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
                 self.stream.synchronize()
 
+        self.sceneChangeThreshold = self.scenechangeThreshold
         self.I0 = None
-        self.I1 = torch.zeros((1, 6, self.height, self.width), device=self.device, dtype=self.dType)
+        self.outputs = self.dummyOutput.unsqueeze(0)
 
     @torch.inference_mode()
-    def processFrame(self, frame):
-        return (
-            frame.to(self.device, non_blocking=True, dtype=self.dType)
-            .permute(2, 0, 1)
-            .unsqueeze(0)
-            .contiguous()
-        )
-
-    @torch.inference_mode()
-    def run(self, frame):
+    def scoreWindow(self, frames):
         with torch.cuda.stream(self.stream):
-            if self.I0 is None:
-                self.I0 = self.processFrame(frame)
-                return False
+            samples = torch.stack(
+                [frame.to(self.device, non_blocking=True) for frame in frames]
+            ).permute(0, 3, 1, 2).to(self.dType)
+            previous, current, skipped = self.pairs(samples)
+            if not len(current):
+                return [0.0] * skipped
+
+            if len(self.outputs) < len(current):
+                self.outputs = torch.zeros(
+                    (len(current), *self.dummyOutput.shape),
+                    device=self.device,
+                    dtype=self.dType,
+                )
+
+            for i in range(len(current)):
+                self.dummyInput[:, :3].copy_(previous[i], non_blocking=True)
+                self.dummyInput[:, 3:].copy_(current[i], non_blocking=True)
+                self.context.set_tensor_address(self.outputName, self.outputs[i].data_ptr())
+                self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
 
-            self.I1 = self.processFrame(frame)
+            scores = self.outputs[: len(current), 0].float().cpu()
+            self.stream.synchronize()
+            return [0.0] * skipped + scores.tolist()
 
-            self.dummyInput.copy_(
-                torch.cat([self.I0, self.I1], dim=1),
-                non_blocking=True,
-            )
 
-            self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
-            self.I0.copy_(self.I1, non_blocking=True)
-            self.stream.synchronize()
+class SceneChangeAdaptive(SceneChangeBase):
+    def __init__(
+        self,
+        sensitivity: float = 4.0,
+        device: str = "cpu",
+        sampleSize: int = 64,
+        bins: int = 32,
+        alpha: float = 1 / 30,
+        warmup: int = 5,
+    ):
+        """
+        Scene change detection that judges every frame against the statistics of the frames before it instead of a
+        fixed threshold, so dark, noisy and bright content all get a threshold that fits them.
+
+        Two cheap features are taken from tiny luma samples, the RMS difference to the previous frame and the
+        distance between the luma histograms of both. A frame starts a new scene when its difference is sensitivity
+        standard deviations above the running mean and the histograms changed too, a strong histogram change
+        alone is enough. After a cut no other cut is reported until the difference falls back to half the
+        threshold, which keeps flashes and whip pans from producing a burst of cuts.
+
+        sensitivity: float - How many standard deviations above the running mean a difference has to be.
+        device: str - The device the features are computed on.
+        sampleSize: int - The frames are area downsampled to sampleSize x sampleSize.
+        bins: int - The amount of luma histogram bins.
+        alpha: float - The weight of a new frame in the running statistics.
+        warmup: int - How many frames the statistics need before they are trusted, until then only the histogram rule applies.
+        """
+        self.sensitivity = sensitivity
+        self.device = torch.device(device)
+        self.sampleSize = sampleSize
+        self.bins = bins
+        self.alpha = alpha
+        self.warmup = warmup
+        self.luma = torch.tensor(LUMA, device=self.device).view(1, 3, 1, 1)
+        self.stream = torch.cuda.Stream() if self.device.type == "cuda" else None
+
+        # Differences below this are sensor noise whatever the statistics say
+        self.minDeviation = 0.01
+        self.strongHistThreshold = 0.5
+        self.reset()
+
+    def reset(self):
+        # The running statistics of the threshold belong to the previous video too
+        self.I0 = None
+        self.inCut = False
+        self.mean, self.variance, self.seen = 0.0, 0.0, 0
+        self.histThreshold = 0.15
 
-            return self.dummyOutput.item() > self.scenechangeThreshold
+    @torch.inference_mode()
+    def features(self, frames: list):
+        """
+        Returns the RMS luma difference and the histogram distance of every frame to the frame before it, both in the
+        0-1 range, None for the very first frame of a video.
+        """
+        with torch.cuda.stream(self.stream):
+            samples = areaDownsample(frames, (self.sampleSize, self.sampleSize), self.device)
+            samples = (samples * self.luma).sum(dim=1, keepdim=True)
+
+            bins = (samples.flatten(1) * self.bins).long().clamp_(0, self.bins - 1)
+            histograms = torch.zeros((len(samples), self.bins), device=self.device)
+            histograms.scatter_add_(1, bins, torch.ones_like(bins, dtype=histograms.dtype))
+            histograms /= bins.shape[1]
+
+            # The histograms ride along in the same tensor so the previous frame carries over with the samples
+            packed = torch.cat([samples.flatten(1), histograms], dim=1)
+            previous, current, skipped = self.pairs(packed)
+            if not len(current):
+                return [None] * skipped
+
+            pixels = self.sampleSize * self.sampleSize
+            rms = (previous[:, :pixels] - current[:, :pixels]).square().mean(dim=1).sqrt()
+            hist = (previous[:, pixels:] - current[:, pixels:]).abs().sum(dim=1) / 2
+            values = torch.stack([rms, hist], dim=1).cpu().tolist()
+
+        return [None] * skipped + [tuple(value) for value in values]
+
+    def decide(self, feature) -> bool:
+        """
+        Apply the hysteresis rule to the features of one frame and fold them into the running statistics.
+        """
+        if feature is None:
+            return False
+
+        rms, hist = feature
+        deviation = max(self.variance**0.5, self.minDeviation)
+        zScore = (rms - self.mean) / deviation if self.seen >= self.warmup else 0.0
+
+        isSceneChange = False
+        if self.inCut:
+            self.inCut = zScore > self.sensitivity / 2
+        elif hist > self.strongHistThreshold or (
+            zScore > self.sensitivity and hist > self.histThreshold
+        ):
+            isSceneChange = True
+            self.inCut = True
+
+        if not isSceneChange:
+            # Cuts would drag the statistics of the next scene towards them, they are left out
+            delta = rms - self.mean
+            self.mean += self.alpha * delta
+            self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+            self.seen += 1
+
+        return isSceneChange
+
+    def runWindow(self, frames):
+        return [self.decide(feature) for feature in self.features(frames)]
+
+    def scoreWindow(self, frames):
+        return [feature[0] if feature is not None else 0.0 for feature in self.features(frames)]
+
+    def calibrate(self, features: list):
+        """
+        Derive the starting statistics and the histogram threshold from the features of a whole video, so the
+        detector does not have to learn them from its first frames. The frames are then decided from the start.
+
+        features: list - The features of a calibration pass, as returned by features.
+        """
+        features = [feature for feature in features if feature is not None]
+        if len(features) < self.warmup:
+            return
+
+        rms = torch.tensor([feature[0] for feature in features])
+        hist = torch.tensor([feature[1] for feature in features])
+
+        # Median and median absolute deviation, the cuts themselves barely move them
+        mean = rms.median().item()
+        deviation = 1.4826 * (rms - mean).abs().median().item()
+
+        self.reset()
+        self.mean, self.variance, self.seen = mean, deviation**2, self.warmup
+
+        # Most frames of a video are not cuts, the threshold sits above the histogram changes of regular motion
+        self.histThreshold = min(max(hist.quantile(0.95).item(), 0.05), self.strongHistThreshold)
+        logging.info(
+            f"Calibrated the adaptive scene change detection: mean {mean:.4f}, deviation {deviation:.4f}, "
+            f"histogram threshold {self.histThreshold:.3f}"
+        )
@@ -0,0 +1,298 @@
+import logging
+import multiprocessing
+import subprocess
+import threading
+import time
+import numpy as np
+import torch
+import cv2
+
+from multiprocessing import shared_memory
+from queue import Queue
+from .ffmpegSettings import BuildBuffer, WriteBuffer, FrameRing, readInto, ffmpegLogPath
+from .profiler import profiler
+
+# Spawned workers only import this module, forking would copy the CUDA context and the loaded models
+context = multiprocessing.get_context("spawn")
+
+
+class SharedFrameRing(FrameRing):
+    def __init__(self, slots: int, frameShape: tuple, dtype=np.uint8):
+        """
+        A FrameRing whose slots live in one shared memory block, worker processes fill and drain the slots
+        and only the slot indices travel through the queues, the frames themselves are never pickled.
+
+        slots: int - The amount of frames that can be alive at once.
+        frameShape: tuple - The shape of a single frame.
+        dtype: np.dtype - The type of the samples, np.int16 for high bit depth frames.
+        """
+        self.slots = slots
+        self.frameShape = tuple(frameShape)
+        self.dtype = np.dtype(dtype)
+        size = slots * int(np.prod(self.frameShape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+
+        self.frameViews = list(
+            np.ndarray((slots, *self.frameShape), dtype=self.dtype, buffer=self.shm.buf)
+        )
+        self.frames = [torch.from_numpy(view) for view in self.frameViews]
+        self.rawFrames = self.frames
+        self.rawViews = self.frameViews
+        self.slotMap = {frame.data_ptr(): i for i, frame in enumerate(self.frames)}
+
+        self.refCounts = [0] * slots
+        self.lock = threading.Lock()
+        self.freeSlots = context.Queue()
+        self.readySlots = context.Queue()
+        for i in range(slots):
+            self.freeSlots.put(i)
+
+    def spec(self) -> tuple:
+        """
+        What a worker needs to attach to the ring.
+        """
+        return self.shm.name, self.slots, self.frameShape, self.dtype.str
+
+    def close(self):
+        self.frames = self.rawFrames = []
+        self.frameViews = self.rawViews = []
+        self.slotMap = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # A frame is still referenced somewhere, the mapping goes away with the process
+            logging.warning("Shared frame ring closed while frames were still in use")
+        self.shm.unlink()
+
+
+def attachRing(spec: tuple):
+    name, slots, frameShape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    frames = np.ndarray((slots, *frameShape), dtype=np.dtype(dtype), buffer=shm.buf)
+    return shm, frames
+
+
+def decodeFrames(command: list, spec: tuple, rawShape: tuple, convert: bool, freeSlots, readySlots):
+    """
+    Runs in the decode process, FFMPEG's output is read into a free slot of the shared ring, or into a private
+    buffer and converted to RGB straight into the slot, and the slot index is handed to the main process.
+    """
+    shm, frames = attachRing(spec)
+    raw = np.empty(rawShape, dtype=frames.dtype) if convert else None
+
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            slot = freeSlots.get()
+            if not readInto(process.stdout, raw if convert else frames[slot]):
+                freeSlots.put(slot)
+                break
+
+            if convert:
+                cv2.cvtColor(raw, cv2.COLOR_YUV2RGB_I420, dst=frames[slot])
+            readySlots.put(slot)
+    finally:
+        readySlots.put(None)
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        del frames
+        shm.close()
+
+
+def encodeFrames(command: list, spec: tuple, freeSlots, readySlots, logPath: str):
+    """
+    Runs in the encode process, the slots handed over by the main process are piped into FFMPEG without a copy.
+    """
+    shm, frames = attachRing(spec)
+    slot = -1
+    try:
+        with open(logPath, "w") as log_file:
+            with subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            ) as process:
+                while True:
+                    slot = readySlots.get()
+                    if slot is None:
+                        break
+
+                    process.stdin.write(memoryview(frames[slot]).cast("B"))
+                    freeSlots.put(slot)
+
+        # The exit code of this process tells the main process whether the encode worked
+        if process.returncode != 0:
+            raise RuntimeError(f"FFMPEG exited with code {process.returncode} while encoding")
+    except Exception:
+        # Keep handing the slots back so the main process never blocks on a dead encoder
+        while slot is not None:
+            if slot >= 0:
+                freeSlots.put(slot)
+            slot = readySlots.get()
+        raise
+    finally:
+        del frames
+        shm.close()
+
+
+class ProcessBuildBuffer(BuildBuffer):
+    def __init__(self, *args, **kwargs):
+        """
+        BuildBuffer with the decoding and the YUV to RGB conversion moved into their own process, frames arrive
+        through a SharedFrameRing and are released the same way as with the ring buffer.
+
+        Takes the same arguments as BuildBuffer, ringBuffer is implied.
+        """
+        kwargs["ringBuffer"] = False
+        super().__init__(*args, **kwargs)
+
+        self.rawShape = (self.height * 3 // 2, self.width)
+        self.frameRing = SharedFrameRing(
+            slots=self.ringSlots(),
+            frameShape=self.rawShape if self.yuv else (self.height, self.width, 3),
+            dtype=np.int16 if self.bitDepth == "16bit" else np.uint8,
+        )
+        self.decodedFrames = 0
+        self.readingDone = False
+
+    def start(self, queue: Queue = None):
+        """
+        Starts the decode process and waits for it, meant to be used in a separate thread like BuildBuffer.start.
+        """
+        command = self.decodeSettings()
+        logging.info(f"Decoding options: {' '.join(map(str, command))}")
+        logging.info("Decoding in a separate process")
+
+        self.decodedFrames = 0
+        self.readingDone = False
+        try:
+            decoder = context.Process(
+                target=decodeFrames,
+                args=(
+                    command,
+                    self.frameRing.spec(),
+                    self.rawShape,
+                    not self.yuv,
+                    self.frameRing.freeSlots,
+                    self.frameRing.readySlots,
+                ),
+                daemon=True,
+            )
+            decoder.start()
+            decoder.join()
+            if decoder.exitcode != 0:
+                logging.error(f"The decode process exited with code {decoder.exitcode}")
+                self.frameRing.readySlots.put(None)
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            self.frameRing.readySlots.put(None)
+        finally:
+            logging.info("The decode process finished")
+            self.readingDone = True
+
+    def read(self):
+        """
+        Returns a tensor in RGB format, or in planar YUV420 format if yuv or 16bit is enabled.
+        """
+        slot = profiler.get(self.frameRing.readySlots, "read")
+        if slot is None:
+            return None
+
+        self.frameRing.refCounts[slot] = 1
+        self.decodedFrames += 1
+        return self.frameRing.frames[slot]
+
+    def getSizeOfQueue(self):
+        return self.frameRing.readySlots.qsize()
+
+
+class ProcessWriteBuffer(WriteBuffer):
+    def __init__(self, *args, **kwargs):
+        """
+        WriteBuffer with the FFMPEG pipe fed from its own process. The main process only quantizes each frame
+        straight into a slot of a SharedFrameRing, writing the bytes to FFMPEG no longer holds the GIL of the pipeline.
+
+        Takes the same arguments as WriteBuffer.
+        """
+        super().__init__(*args, **kwargs)
+        if self.yuv:
+            frameShape = (self.height * 3 // 2, self.width)
+        else:
+            frameShape = (self.height, self.width, 3)
+
+        self.encodeRing = SharedFrameRing(
+            slots=self.queueSize + 4,
+            frameShape=frameShape,
+            dtype=np.uint8 if self.bitDepth == "8bit" else np.int16,
+        )
+
+    def start(self, queue: Queue = None):
+        """
+        Starts the encode process and feeds it from the queue, meant to be used in a separate thread like WriteBuffer.start.
+        """
+        command = self.encodeSettings(verbose=True)
+
+        self.latestFrame = None
+        self.writeBuffer = queue if queue is not None else Queue(maxsize=self.queueSize)
+        self.isWritingDone = False
+        self.failed = False
+
+        logging.info(f"Encoding options: {' '.join(map(str, command))}")
+        logging.info("Encoding in a separate process")
+
+        encoder = context.Process(
+            target=encodeFrames,
+            args=(
+                command,
+                self.encodeRing.spec(),
+                self.encodeRing.freeSlots,
+                self.encodeRing.readySlots,
+                ffmpegLogPath,
+            ),
+            daemon=True,
+        )
+
+        try:
+            encoder.start()
+            writtenFrames = 0
+            while True:
+                frame = profiler.get(self.writeBuffer, "encodeQueue")
+                if frame is None:
+                    logging.info(f"Encoded {writtenFrames} frames")
+                    break
+
+                if self.frameLimit and writtenFrames >= self.frameLimit:
+                    if self.frameRing is not None:
+                        self.frameRing.release(frame)
+                    continue
+
+                encodeStart = time.perf_counter()
+                slot = profiler.get(self.encodeRing.freeSlots, "encodeSlot")
+                self.toHost(frame, self.encodeRing.frames[slot])
+                self.encodeRing.readySlots.put(slot)
+                writtenFrames += 1
+                if profiler.enabled:
+                    profiler.record("encode", time.perf_counter() - encodeStart)
+
+                if self.frameRing is not None:
+                    self.frameRing.release(frame)
+
+        except Exception as e:
+            self.failed = True
+            logging.error(f"An error occurred: {str(e)}")
+
+        finally:
+            self.encodeRing.readySlots.put(None)
+            if encoder.pid is not None:
+                encoder.join()
+                if encoder.exitcode != 0:
+                    self.failed = True
+                    logging.error(f"The encode process exited with code {encoder.exitcode}")
+            self.encodeRing.close()
+            self.isWritingDone = True
@@ -41,6 +41,8 @@ class RifeCuda:
         self.ensemble = ensemble
         self.interpolateFactor = interpolateFactor
         self.inputFPS = inputFPS
+        # The most intermediate frames a batched forward pass renders at once, bounds the memory of long retimed gaps
+        self.maxBatch = 8
 
         if self.width > 1920 and self.height > 1080:
             self.scale = 0.5
@@ -133,6 +135,31 @@ class RifeCuda:
 
         self.firstRun = True
         self.stream = torch.cuda.Stream() if self.isCudaAvailable else None
+        self.timestepCache = {}
+        # Batching the timesteps saves kernel launches on the GPU, on the CPU the convolutions are already large enough
+        # and the batch only adds memory traffic
+        self.batchTimesteps = self.isCudaAvailable and hasattr(self.model, "forwardBatch")
+
+    def timestepBatch(self, timesteps: tuple) -> torch.Tensor:
+        """
+        The constant (N, 1, H, W) timestep planes for a set of timesteps, built once per set instead of once per frame.
+
+        A fixed factor only ever uses one set, retimed gaps use a few more and the cache is cleared if they pile up.
+        """
+        batch = self.timestepCache.get(timesteps)
+        if batch is None:
+            if len(self.timestepCache) >= 16:
+                self.timestepCache.clear()
+
+            batch = torch.tensor(
+                timesteps,
+                dtype=torch.float16 if self.half else torch.float32,
+                device=self.device,
+            ).view(-1, 1, 1, 1).expand(
+                -1, 1, self.height + self.padding[3], self.width + self.padding[1]
+            ).contiguous(memory_format=torch.channels_last)
+            self.timestepCache[timesteps] = batch
+        return batch
 
     @torch.inference_mode()
     def cacheFrame(self):
@@ -168,7 +195,11 @@ class RifeCuda:
         )
 
     @torch.inference_mode()
-    def run(self, frame, benchmark, writeBuffer):
+    def run(self, frame, benchmark, writeBuffer, timesteps=None):
+        """
+        timesteps: list - The positions of the frames to generate between the previous frame and this one,
+        defaults to evenly spaced by the interpolation factor.
+        """
         with torch.cuda.stream(self.stream):
             if self.firstRun:
                 self.I0 = self.padFrame(self.processFrame(frame))
@@ -177,20 +208,45 @@ class RifeCuda:
             
             self.I1 = self.padFrame(self.processFrame(frame))
 
-            for i in range(self.interpolateFactor - 1):
-                timestep = torch.full(
-                    (1, 1, self.height + self.padding[3], self.width + self.padding[1]),
-                    (i + 1) * 1 / self.interpolateFactor,
-                    dtype=torch.float16 if self.half else torch.float32,
-                    device=self.device,
-                )
-                output = self.model(self.I0, self.I1, timestep)[: self.height, : self.width, :]
-                self.stream.synchronize()
+            if timesteps is None:
+                timesteps = [(i + 1) * 1 / self.interpolateFactor for i in range(self.interpolateFactor - 1)]
+            if hasattr(self.model, "counter"):
+                # The architectures that cache their encodings count calls per pair, a retimed gap leaves the count
+                # mid cycle so every pair starts a new one explicitly
+                self.model.counter = self.model.interpolateFactor
+
+            if self.batchTimesteps:
+                for start in range(0, len(timesteps), self.maxBatch):
+                    batch = tuple(timesteps[start : start + self.maxBatch])
+                    output = self.model.forwardBatch(
+                        self.I0, self.I1, self.timestepBatch(batch), newPair=start == 0
+                    )[:, : self.height, : self.width, :]
+                    if self.stream is not None:
+                        self.stream.synchronize()
+                    if not benchmark:
+                        for intermediate in output:
+                            writeBuffer.write(intermediate)
+
+                self.cacheFrame()
+                return
+
+            planes = self.timestepBatch(tuple(timesteps))
+            for i in range(len(timesteps)):
+                output = self.model(self.I0, self.I1, planes[i : i + 1])[: self.height, : self.width, :]
+                if self.stream is not None:
+                    self.stream.synchronize()
                 if not benchmark:
                     writeBuffer.write(output)
 
             self.cacheFrame()
 
+    def reset(self):
+        self.firstRun = True
+        self.model.f0 = None
+        self.model.f1 = None
+        self.model.counter = 1
+
+
 class RifeTensorRT:
     def __init__(
         self,
@@ -214,15 +270,11 @@ class RifeTensorRT:
             nt (int, optional): Number of threads. Defaults to 1.
         """
         import tensorrt as trt
-        from .utils.trtHandler import (
-            TensorRTEngineCreator,
-            TensorRTEngineLoader,
-            TensorRTEngineNameHandler,
-        )
+        from .utils.trtHandler import TensorRTDynamicBatch
+        from .utils.engineRegistry import engineRegistry
 
-        self.TensorRTEngineCreator = TensorRTEngineCreator
-        self.TensorRTEngineLoader = TensorRTEngineLoader
-        self.TensorRTEngineNameHandler = TensorRTEngineNameHandler
+        self.engineRegistry = engineRegistry
+        self.TensorRTDynamicBatch = TensorRTDynamicBatch
         self.trt = trt
 
         self.interpolateMethod = interpolateMethod
@@ -277,77 +329,72 @@ class RifeTensorRT:
             if self.half:
                 torch.set_default_dtype(torch.float16)
 
-        enginePath = self.TensorRTEngineNameHandler(
+        # All the intermediate frames of a pair share one execution when the model takes a batch
+        self.batchSize = (
+            max(self.interpolateFactor - 1, 1)
+            if self.TensorRTDynamicBatch(self.modelPath)
+            else 1
+        )
+
+        inputsMin = [1, 7, self.height, self.width]
+        inputsOpt = [self.batchSize, 7, self.height, self.width]
+        inputsMax = [self.batchSize, 7, self.height, self.width]
+
+        # RIFE keeps static spatial shapes, its flow estimation is tuned for the exact resolution
+        self.engine, self.context = self.engineRegistry.load(
             modelPath=self.modelPath,
             fp16=self.half,
-            optInputShape=[1, 7, self.height, self.width],
+            inputsMin=inputsMin,
+            inputsOpt=inputsOpt,
+            inputsMax=inputsMax,
         )
 
-
-        inputsMin = [1, 7, self.height, self.width]
-        inputsOpt = [1, 7, self.height, self.width]
-        inputsMax = [1, 7, self.height, self.width]
-
-        self.engine, self.context = self.TensorRTEngineLoader(enginePath)
-        if (
-            self.engine is None
-            or self.context is None
-            or not os.path.exists(enginePath)
-        ):
-            logging.info("Loading engine failed, creating a new one")
-            self.engine, self.context = self.TensorRTEngineCreator(
-                modelPath=self.modelPath,
-                enginePath=enginePath,
-                fp16=self.half,
-                inputsMin=inputsMin,
-                inputsOpt=inputsOpt,
-                inputsMax=inputsMax,
-            )
+        for i in range(self.engine.num_io_tensors):
+            tensorName = self.engine.get_tensor_name(i)
+            if self.engine.get_tensor_mode(tensorName) == self.trt.TensorIOMode.INPUT:
+                self.inputName = tensorName
+            else:
+                self.outputName = tensorName
 
         self.dType = torch.float16 if self.half else torch.float32
         self.stream = torch.cuda.Stream()
-        self.I0 = torch.zeros(
-            1,
-            3,
-            self.height,
-            self.width,
-            dtype=self.dType,
-            device=self.device,
-        ).contiguous()
+        self.inputs = None
+        self.allocateInputs(max(self.interpolateFactor - 1, 1))
 
-        self.I1 = torch.zeros(
-            1,
-            3,
-            self.height,
-            self.width,
-            dtype=self.dType,
-            device=self.device,
-        ).contiguous()
+        self.firstRun = True
 
-        self.dummyInput = torch.empty(
-            (1, 7, self.height, self.width),
+    def allocateInputs(self, count):
+        """
+        One persistent (7, H, W) input per timestep, the source frame, the destination frame and the timestep plane
+        are written straight into their channels so nothing has to be concatenated per intermediate frame.
+        """
+        inputs = torch.zeros(
+            (count, 7, self.height, self.width),
             device=self.device,
             dtype=self.dType,
         ).contiguous()
 
-        self.dummyOutput = torch.zeros(
-            (1, 3, self.height, self.width),
+        if self.inputs is not None:
+            # Keep the frame the next pair starts from
+            inputs[:, 3:6].copy_(self.inputs[:1, 3:6].expand(count, -1, -1, -1))
+
+        self.inputs = inputs
+        self.outputs = torch.zeros(
+            (count, 3, self.height, self.width),
             device=self.device,
             dtype=self.dType,
         ).contiguous()
+        self.timesteps = None
 
-        self.bindings = [self.dummyInput.data_ptr(), self.dummyOutput.data_ptr()]
+    def setTimesteps(self, timesteps):
+        if len(timesteps) > len(self.inputs):
+            self.allocateInputs(len(timesteps))
 
-        for i in range(self.engine.num_io_tensors):
-            self.context.set_tensor_address(
-                self.engine.get_tensor_name(i), self.bindings[i]
-            )
-            tensor_name = self.engine.get_tensor_name(i)
-            if self.engine.get_tensor_mode(tensor_name) == self.trt.TensorIOMode.INPUT:
-                self.context.set_input_shape(tensor_name, self.dummyInput.shape)
-
-        self.firstRun = True
-        self.useI0AsSource = True
+        # The timestep planes only change when the retimed gaps do, a fixed factor fills them once
+        if timesteps != self.timesteps:
+            for i, t in enumerate(timesteps):
+                self.inputs[i, 6].fill_(t)
+            self.timesteps = list(timesteps)
 
     @torch.inference_mode()
     def processFrame(self, frame):
@@ -360,48 +407,65 @@ class RifeTensorRT:
             .permute(2, 0, 1)
             .unsqueeze(0)
             .mul(1 / 255)
-            .contiguous()
         )
 
     @torch.inference_mode()
     def cacheFrame(self):
-        self.I0.copy_(self.I1, non_blocking=True)
+        self.inputs[:, :3].copy_(self.inputs[:, 3:6], non_blocking=True)
 
     @torch.inference_mode()
     def cacheFrameReset(self, frame):
-        self.I0.copy_(self.processFrame(frame), non_blocking=True)
-        self.useI0AsSource = True
+        with torch.cuda.stream(self.stream):
+            self.inputs[:, 3:6].copy_(
+                self.processFrame(frame).expand(len(self.inputs), -1, -1, -1),
+                non_blocking=True,
+            )
+        self.stream.synchronize()
 
     @torch.inference_mode()
-    def run(self, frame, benchmark, writeBuffer):
+    def run(self, frame, benchmark, writeBuffer, timesteps=None):
         with torch.cuda.stream(self.stream):
             if self.firstRun:
-                self.I0.copy_(self.processFrame(frame), non_blocking=True)
+                self.inputs[:, 3:6].copy_(
+                    self.processFrame(frame).expand(len(self.inputs), -1, -1, -1),
+                    non_blocking=True,
+                )
                 self.firstRun = False
                 return
 
-            source = self.I0 if self.useI0AsSource else self.I1
-            destination = self.I1 if self.useI0AsSource else self.I0
-            destination.copy_(self.processFrame(frame), non_blocking=True)
-
-            for i in range(self.interpolateFactor - 1):
-                timestep = torch.full(
-                    (1, 1, self.height, self.width),
-                    (i + 1) * 1 / self.interpolateFactor,
-                    dtype=self.dType,
-                    device=self.device,
-                ).contiguous()
-
-                self.dummyInput.copy_(
-                    torch.cat([source, destination, timestep], dim=1), non_blocking=True
-                ).contiguous()
+            if timesteps is None:
+                timesteps = [(i + 1) * 1 / self.interpolateFactor for i in range(self.interpolateFactor - 1)]
+
+            self.setTimesteps(timesteps)
+
+            # The previous destination becomes the source, the new frame is written once into every input
+            self.cacheFrame()
+            self.inputs[:, 3:6].copy_(
+                self.processFrame(frame).expand(len(self.inputs), -1, -1, -1),
+                non_blocking=True,
+            )
+
+            for start in range(0, len(timesteps), self.batchSize):
+                count = min(self.batchSize, len(timesteps) - start)
+                self.context.set_input_shape(
+                    self.inputName, (count, 7, self.height, self.width)
+                )
+                self.context.set_tensor_address(
+                    self.inputName, self.inputs[start].data_ptr()
+                )
+                self.context.set_tensor_address(
+                    self.outputName, self.outputs[start].data_ptr()
+                )
                 self.context.execute_async_v3(stream_handle=self.stream.cuda_stream)
-                output = self.dummyOutput.squeeze_(0).permute(1, 2, 0).mul(255)
-                self.stream.synchronize()
-                if not benchmark:
-                    writeBuffer.write(output)
 
-            self.useI0AsSource = not self.useI0AsSource
+            output = self.outputs[: len(timesteps)].permute(0, 2, 3, 1).mul(255)
+            self.stream.synchronize()
+            if not benchmark:
+                for intermediate in output:
+                    writeBuffer.write(intermediate)
+
+    def reset(self):
+        self.firstRun = True
 
 
 class RifeNCNN:
@@ -483,18 +547,23 @@ class RifeNCNN:
     def cacheFrameReset(self, frame):
         self.frame1 = frame.cpu().numpy().astype("uint8")
 
-    def run(self, frame, benchmark, writeBuffer):
+    def run(self, frame, benchmark, writeBuffer, timesteps=None):
         if self.frame1 is None:
             self.frame1 = frame.cpu().numpy().astype("uint8")
             return False
 
         self.frame2 = frame.cpu().numpy().astype("uint8")
 
-        for i in range(self.interpolateFactor - 1):
-            timestep = (i + 1) * 1 / self.interpolateFactor
+        if timesteps is None:
+            timesteps = [(i + 1) * 1 / self.interpolateFactor for i in range(self.interpolateFactor - 1)]
+
+        for timestep in timesteps:
             output = self.rife.process_cv2(self.frame1, self.frame2, timestep=timestep)
             output = torch.from_numpy(output).to(frame.device)
             if not benchmark:
                 writeBuffer.write(output)
 
         self.cacheFrame()
+
+    def reset(self):
+        self.frame1 = None
@@ -19,6 +19,9 @@ class UniversalPytorch:
         height: int = 1080,
         customModel: str = None,
         upscaleSkip: bool | None = None,
+        tileSize: int = 0,
+        tileOverlap: int = 16,
+        tileThreads: int = 1,
     ):
         """
         Initialize the upscaler with the desired model
@@ -32,6 +35,9 @@ class UniversalPytorch:
             customModel (str): The path to a custom model file
             nt (int): The number of threads to use
             trt (bool): Whether to use tensorRT
+            tileSize (int): Upscale in tiles of this size to bound memory usage, 0 disables tiling
+            tileOverlap (int): The overlap between tiles in input pixels
+            tileThreads (int): How many tiles to upscale at once
         """
         self.upscaleMethod = upscaleMethod
         self.upscaleFactor = upscaleFactor
@@ -40,6 +46,9 @@ class UniversalPytorch:
         self.height = height
         self.customModel = customModel
         self.upscaleSkip = upscaleSkip
+        self.tileSize = tileSize
+        self.tileOverlap = tileOverlap
+        self.tileThreads = tileThreads
 
         self.handleModel()
 
@@ -88,7 +97,7 @@ class UniversalPytorch:
                 torch.set_default_dtype(torch.float16)
                 self.model.half()
 
-        self.stream = torch.cuda.Stream()
+        self.stream = torch.cuda.Stream() if self.isCudaAvailable else None
         if self.upscaleSkip is not None:
             self.skippedCounter = 0
             self.prevFrame = torch.zeros(
@@ -99,6 +108,18 @@ class UniversalPytorch:
 
         self.model = self.model.model.to(memory_format=torch.channels_last)
 
+        self.tiler = None
+        if self.tileSize:
+            from .utils.tiling import TiledUpscaler
+
+            self.tiler = TiledUpscaler(
+                self.model,
+                self.upscaleFactor,
+                self.tileSize,
+                self.tileOverlap,
+                self.tileThreads,
+            )
+
     def run(self, frame: torch.tensor) -> torch.tensor:
         with torch.cuda.stream(self.stream):
             if self.upscaleSkip is not None:
@@ -117,17 +138,49 @@ class UniversalPytorch:
                 .to(memory_format=torch.channels_last)
                 .mul(1 / 255)
             )
-            output = self.model(frame).squeeze(0).mul(255).permute(1, 2, 0)
-            self.stream.synchronize()
+            output = self.upscaleFrames(frame).squeeze(0).mul(255).permute(1, 2, 0)
+            if self.stream is not None:
+                self.stream.synchronize()
 
             if self.upscaleSkip is not None:
                 self.prevFrame.copy_(output, non_blocking=True)
 
             return output
 
+    def upscaleFrames(self, frames: torch.tensor) -> torch.tensor:
+        return self.tiler.run(frames) if self.tiler is not None else self.model(frames)
+
+    @torch.inference_mode()
+    def runBatch(self, frames: torch.tensor) -> torch.tensor:
+        """
+        Upscale a (N, H, W, 3) batch of frames in a single forward pass, the stream is only synchronized once per batch.
+        Upscale skip is not supported here.
+        """
+        with torch.cuda.stream(self.stream):
+            frames = (
+                frames.to(
+                    self.device,
+                    non_blocking=True,
+                    dtype=torch.float16 if self.half else torch.float32,
+                )
+                .permute(0, 3, 1, 2)
+                .to(memory_format=torch.channels_last)
+                .mul(1 / 255)
+            )
+            output = self.upscaleFrames(frames).mul(255).permute(0, 2, 3, 1)
+            if self.stream is not None:
+                self.stream.synchronize()
+
+            return output
+
     def getSkippedCounter(self):
         return self.skippedCounter
 
+    def reset(self):
+        if self.upscaleSkip is not None:
+            self.skippedCounter = 0
+            self.upscaleSkip.reset()
+
 
 class UniversalTensorRT:
     def __init__(
@@ -156,16 +209,10 @@ class UniversalTensorRT:
         # Attempt to lazy load for faster startup
 
         import tensorrt as trt
-        from .utils.trtHandler import (
-            TensorRTEngineCreator,
-            TensorRTEngineLoader,
-            TensorRTEngineNameHandler,
-        )
+        from .utils.engineRegistry import engineRegistry
 
         self.trt = trt
-        self.TensorRTEngineCreator = TensorRTEngineCreator
-        self.TensorRTEngineLoader = TensorRTEngineLoader
-        self.TensorRTEngineNameHandler = TensorRTEngineNameHandler
+        self.engineRegistry = engineRegistry
 
         self.upscaleMethod = upscaleMethod
         self.upscaleFactor = upscaleFactor
@@ -210,27 +257,16 @@ class UniversalTensorRT:
             if self.half:
                 torch.set_default_dtype(torch.float16)
 
-        enginePath = self.TensorRTEngineNameHandler(
+        # New engines accept every resolution up to the next bound, a 720p engine also runs 1080p content
+        self.engine, self.context = self.engineRegistry.load(
             modelPath=self.modelPath,
             fp16=self.half,
-            optInputShape=[1, 3, self.height, self.width],
+            inputsMin=[1, 3, 8, 8],
+            inputsOpt=[1, 3, self.height, self.width],
+            inputsMax=[1, 3, self.height, self.width],
+            dynamic=True,
         )
 
-        self.engine, self.context = self.TensorRTEngineLoader(enginePath)
-        if (
-            self.engine is None
-            or self.context is None
-            or not os.path.exists(enginePath)
-        ):
-            self.engine, self.context = self.TensorRTEngineCreator(
-                modelPath=self.modelPath,
-                enginePath=enginePath,
-                fp16=self.half,
-                inputsMin=[1, 3, 8, 8],
-                inputsOpt=[1, 3, self.height, self.width],
-                inputsMax=[1, 3, 1080, 1920],
-            )
-
         self.stream = torch.cuda.Stream()
         self.dummyInput = torch.zeros(
             (1, 3, self.height, self.width),
@@ -300,6 +336,11 @@ class UniversalTensorRT:
     def getSkippedCounter(self):
         return self.skippedCounter
 
+    def reset(self):
+        if self.upscaleSkip is not None:
+            self.skippedCounter = 0
+            self.upscaleSkip.reset()
+
 
 class UniversalDirectML:
     def __init__(
@@ -311,6 +352,9 @@ class UniversalDirectML:
         height: int,
         customModel: str,
         upscaleSkip: bool | None = None,
+        tileSize: int = 0,
+        tileOverlap: int = 16,
+        tileThreads: int = 1,
     ):
         """
         Initialize the upscaler with the desired model
@@ -323,6 +367,9 @@ class UniversalDirectML:
             height (int): The height of the input frame
             customModel (str): The path to a custom model file
             nt (int): The number of threads to use
+            tileSize (int): Upscale in tiles of this size to bound memory usage, 0 disables tiling
+            tileOverlap (int): The overlap between tiles in input pixels
+            tileThreads (int): Ignored, the tiles share a single IO binding and run one at a time
         """
 
         import onnxruntime as ort
@@ -339,6 +386,11 @@ class UniversalDirectML:
         self.height = height
         self.customModel = customModel
         self.upscaleSkip = upscaleSkip
+        self.tileSize = tileSize
+        self.tileOverlap = tileOverlap
+
+        if self.tileSize and tileThreads > 1:
+            logging.info("DirectML tiles share a single IO binding, running them one at a time")
 
         self.handleModel()
 
@@ -402,15 +454,27 @@ class UniversalDirectML:
             self.numpyDType = self.np.float32
             self.torchDType = torch.float32
 
+        # With tiling the bindings only ever see a single tile
+        self.tiler = None
+        bindHeight, bindWidth = self.height, self.width
+        if self.tileSize:
+            from .utils.tiling import TiledUpscaler
+
+            bindHeight = min(self.tileSize, self.height)
+            bindWidth = min(self.tileSize, self.width)
+            self.tiler = TiledUpscaler(
+                self.runTile, self.upscaleFactor, self.tileSize, self.tileOverlap
+            )
+
         self.IoBinding = self.model.io_binding()
         self.dummyInput = torch.zeros(
-            (1, 3, self.height, self.width),
+            (1, 3, bindHeight, bindWidth),
             device=self.deviceType,
             dtype=self.torchDType,
         ).contiguous()
 
         self.dummyOutput = torch.zeros(
-            (1, 3, self.height * self.upscaleFactor, self.width * self.upscaleFactor),
+            (1, 3, bindHeight * self.upscaleFactor, bindWidth * self.upscaleFactor),
             device=self.deviceType,
             dtype=self.torchDType,
         ).contiguous()
@@ -455,11 +519,15 @@ class UniversalDirectML:
         else:
             frame = frame.permute(2, 0, 1).unsqueeze(0).float().mul(1 / 255)
 
-        self.dummyInput.copy_(frame.contiguous())
+        if self.tiler is not None:
+            output = self.tiler.run(frame)
+        else:
+            self.dummyInput.copy_(frame.contiguous())
+            self.model.run_with_iobinding(self.IoBinding)
+            output = self.dummyOutput
 
-        self.model.run_with_iobinding(self.IoBinding)
         frame = (
-            self.dummyOutput.squeeze(0)
+            output.squeeze(0)
             .permute(1, 2, 0)
             .mul(255)
             .clamp_(0, 255)
@@ -471,9 +539,20 @@ class UniversalDirectML:
 
         return frame
 
+    def runTile(self, tile: torch.tensor) -> torch.tensor:
+        self.dummyInput.copy_(tile)
+        self.model.run_with_iobinding(self.IoBinding)
+        return self.dummyOutput.clone()
+
     def getSkippedCounter(self):
         return self.skippedCounter
 
+    def reset(self):
+        if self.upscaleSkip is not None:
+            self.skippedCounter = 0
+            self.upscaleSkip.reset()
+
+
 class UniversalNCNN:
     def __init__(self, upscaleMethod, upscaleFactor, upscaleSkip):
         self.upscaleMethod = upscaleMethod
@@ -537,3 +616,9 @@ class UniversalNCNN:
 
     def getSkippedCounter(self):
         return self.skippedCounter
+
+    def reset(self):
+        if self.upscaleSkip is not None:
+            self.skippedCounter = 0
+            self.prevFrame = None
+            self.upscaleSkip.reset()
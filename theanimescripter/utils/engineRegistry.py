@@ -0,0 +1,280 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+from theanimescripter.coloredPrints import green, red, yellow
+
+# A dynamic engine covers every resolution up to the first of these (height, width) bounds that fits its optimal shape
+SHAPE_BOUNDS = [(1080, 1920), (1440, 2560), (2160, 3840)]
+
+
+def modelHash(modelPath: str) -> str:
+    """
+    The sha256 of a model file, read in chunks so large models do not end up in memory.
+    """
+    digest = hashlib.sha256()
+    with open(modelPath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shapeBound(shape: list) -> list:
+    """
+    Widen the height and width of an NCHW shape to the first bound of SHAPE_BOUNDS that fits it.
+    """
+    height, width = shape[-2], shape[-1]
+    for boundHeight, boundWidth in SHAPE_BOUNDS:
+        if height <= boundHeight and width <= boundWidth:
+            return [*shape[:-2], boundHeight, boundWidth]
+    return list(shape)
+
+
+class EngineRegistry:
+    def __init__(self, builder=None, loader=None, trtVersion: str = None):
+        """
+        Keeps track of the TensorRT engines built for every model. Each engine has a manifest next to it with the hash of the
+        model it was built from, the TensorRT version, the precision and the range of input shapes its profile accepts.
+
+        An engine is reused for any shape inside its range, so a dynamic engine serves every resolution up to its bound. Engines
+        built by another TensorRT version or from another model are skipped without being deserialized, and an engine that
+        matches its manifest but fails to load is reported with the actual error before it is rebuilt.
+
+        builder: callable - builder(modelPath, enginePath, fp16, inputsMin, inputsOpt, inputsMax, inputName) -> (engine, context),
+                            TensorRTEngineCreator if None.
+        loader: callable - loader(enginePath) -> (engine, context), (None, None) if it fails, TensorRTEngineLoader if None.
+        trtVersion: str - The version the engines are built with, the installed TensorRT version if None.
+        """
+        self.builder = builder
+        self.loader = loader
+        self.trtVersion = trtVersion
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    def defaults(self):
+        if self.builder is not None and self.loader is not None and self.trtVersion is not None:
+            return
+
+        import tensorrt as trt
+        from .trtHandler import TensorRTEngineCreator, TensorRTEngineLoader
+
+        self.builder = self.builder or TensorRTEngineCreator
+        self.loader = self.loader or TensorRTEngineLoader
+        self.trtVersion = self.trtVersion or trt.__version__
+
+    def enginePath(self, modelPath: str, fp16: bool, inputsMin: list, inputsOpt: list, inputsMax: list) -> str:
+        """
+        Static NCHW engines keep the name TensorRTEngineNameHandler gives them, so engines built before the registry are found.
+        """
+        precision = "fp16" if fp16 else "fp32"
+        base = os.path.splitext(modelPath)[0]
+        if len(inputsOpt) == 4 and list(inputsMin[1:]) == list(inputsMax[1:]) and list(inputsOpt) == list(inputsMax):
+            batch = f"_b{inputsOpt[0]}" if inputsOpt[0] > 1 else ""
+            return f"{base}_{precision}_{inputsOpt[2]}x{inputsOpt[3]}{batch}.engine"
+
+        shapeRange = "-".join("x".join(map(str, shape)) for shape in (inputsMin, inputsMax))
+        return f"{base}_{precision}_{shapeRange}.engine"
+
+    def modelIdentity(self, modelPath: str) -> dict:
+        """
+        The hash of a model is only recomputed when its size or modification time changes.
+        """
+        stat = os.stat(modelPath)
+        key = (os.path.abspath(modelPath), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if key not in self.hashes:
+                self.hashes[key] = modelHash(modelPath)
+            return {"modelHash": self.hashes[key], "modelSize": stat.st_size}
+
+    def readManifest(self, enginePath: str) -> dict:
+        try:
+            with open(enginePath + ".json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f"Could not read the manifest of {enginePath}: {e}")
+            return None
+
+    def writeManifest(self, enginePath: str, manifest: dict):
+        temporary = f"{enginePath}.json.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temporary, enginePath + ".json")
+
+    def describe(self, identity: dict, fp16: bool, inputsMin: list, inputsOpt: list, inputsMax: list, inputName: str) -> dict:
+        return {
+            **identity,
+            "trtVersion": self.trtVersion,
+            "precision": "fp16" if fp16 else "fp32",
+            "inputName": inputName,
+            "min": list(inputsMin),
+            "opt": list(inputsOpt),
+            "max": list(inputsMax),
+        }
+
+    def covers(self, manifest: dict, identity: dict, fp16: bool, inputsMin: list, inputsMax: list) -> bool:
+        """
+        Whether an engine was built from this model by this TensorRT version and accepts every shape from inputsMin to inputsMax.
+        """
+        if (
+            manifest.get("modelHash") != identity["modelHash"]
+            or manifest.get("trtVersion") != self.trtVersion
+            or manifest.get("precision") != ("fp16" if fp16 else "fp32")
+            or len(manifest.get("min", [])) != len(inputsMin)
+        ):
+            return False
+
+        return all(low <= wanted for low, wanted in zip(manifest["min"], inputsMin)) and all(
+            high >= wanted for high, wanted in zip(manifest["max"], inputsMax)
+        )
+
+    def find(self, modelPath: str, identity: dict, fp16: bool, inputsMin: list, inputsOpt: list, inputsMax: list) -> str:
+        """
+        The registered engine that fits best, one optimized for exactly inputsOpt first and then the one with the narrowest range.
+        """
+        folder = os.path.dirname(os.path.abspath(modelPath))
+        prefix = os.path.basename(os.path.splitext(modelPath)[0]) + ("_fp16_" if fp16 else "_fp32_")
+
+        candidates = []
+        for name in os.listdir(folder):
+            if not (name.startswith(prefix) and name.endswith(".engine")):
+                continue
+
+            enginePath = os.path.join(folder, name)
+            manifest = self.readManifest(enginePath)
+            if manifest is None:
+                continue
+            if not self.covers(manifest, identity, fp16, inputsMin, inputsMax):
+                if manifest.get("trtVersion") != self.trtVersion:
+                    logging.info(f"{name} was built with TensorRT {manifest.get('trtVersion')}, skipping it")
+                continue
+
+            spread = sum(high - low for low, high in zip(manifest["min"], manifest["max"]))
+            candidates.append((manifest["opt"] != list(inputsOpt), spread, enginePath))
+
+        return min(candidates)[2] if candidates else None
+
+    def load(
+        self,
+        modelPath: str,
+        fp16: bool,
+        inputsMin: list,
+        inputsOpt: list,
+        inputsMax: list,
+        inputName: str = "input",
+        dynamic: bool = False,
+    ):
+        """
+        Load an engine that accepts every shape from inputsMin to inputsMax, or build and register one.
+
+        modelPath: str - The path to the ONNX model.
+        fp16: bool - Use half precision for the engine.
+        inputsMin: list - The smallest shape the caller is going to run.
+        inputsOpt: list - The shape the caller runs most, new engines are optimized for it.
+        inputsMax: list - The largest shape the caller is going to run.
+        inputName: str - The name of the input tensor.
+        dynamic: bool - Build new engines up to the next bound of SHAPE_BOUNDS instead of exactly up to inputsMax, so other
+                        resolutions can reuse them.
+
+        Returns the engine and an execution context.
+        """
+        self.defaults()
+        identity = self.modelIdentity(modelPath)
+
+        enginePath = self.find(modelPath, identity, fp16, inputsMin, inputsOpt, inputsMax)
+        if enginePath is not None:
+            engine, context = self.loader(enginePath)
+            if engine is not None and context is not None:
+                logging.info(f"Loaded the engine {enginePath}")
+                return engine, context
+            logging.error(f"{enginePath} matches its manifest but could not be loaded, rebuilding it")
+
+        # Engines from before the registry have no manifest, they were built for exactly inputsOpt and are adopted if they
+        # still load. Their manifest only claims that shape, a smaller resolution must not pick them up later
+        legacyPath = self.enginePath(modelPath, fp16, inputsOpt, inputsOpt, inputsOpt)
+        if (
+            enginePath is None
+            and list(inputsMax) == list(inputsOpt)
+            and os.path.exists(legacyPath)
+            and self.readManifest(legacyPath) is None
+        ):
+            engine, context = self.loader(legacyPath)
+            if engine is not None and context is not None:
+                logging.info(f"Registered the existing engine {legacyPath}")
+                self.writeManifest(
+                    legacyPath, self.describe(identity, fp16, inputsOpt, inputsOpt, inputsOpt, inputName)
+                )
+                return engine, context
+
+        return self.build(modelPath, identity, fp16, inputsMin, inputsOpt, inputsMax, inputName, dynamic)
+
+    def build(self, modelPath, identity, fp16, inputsMin, inputsOpt, inputsMax, inputName="input", dynamic=False):
+        if dynamic:
+            inputsMax = shapeBound(inputsMax)
+
+        enginePath = self.enginePath(modelPath, fp16, inputsMin, inputsOpt, inputsMax)
+        logging.info(
+            f"Building {enginePath} for shapes {inputsMin} to {inputsMax}, engines can be built ahead of time with --build_engines"
+        )
+        engine, context = self.builder(
+            modelPath=modelPath,
+            enginePath=enginePath,
+            fp16=fp16,
+            inputsMin=inputsMin,
+            inputsOpt=inputsOpt,
+            inputsMax=inputsMax,
+            inputName=inputName,
+        )
+
+        self.writeManifest(enginePath, self.describe(identity, fp16, inputsMin, inputsOpt, inputsMax, inputName))
+        return engine, context
+
+
+engineRegistry = EngineRegistry()
+
+
+def buildEngines(models: list, resolutions: list, half: bool = True, upscaleFactor: int = 2, interpolateFactor: int = 2, ensemble: bool = False):
+    """
+    Build the engines of TensorRT models for a list of resolutions ahead of time, so render jobs only ever load them.
+
+    models: list - TensorRT upscale and interpolation methods, e.g. "span-tensorrt" or "rife4.22-tensorrt".
+    resolutions: list - "WIDTHxHEIGHT" strings, the resolution the model is fed with.
+    half: bool - Build half precision engines.
+    upscaleFactor: int - The factor of the upscale models.
+    interpolateFactor: int - The factor the RIFE engines are batched for.
+    ensemble: bool - Build the ensemble variants of the RIFE models.
+    """
+    failed = []
+    for model in models:
+        model = model.lower()
+        for resolution in resolutions:
+            try:
+                width, height = map(int, resolution.lower().split("x"))
+                if not model.endswith("-tensorrt"):
+                    raise ValueError(f"{model} is not a TensorRT model")
+
+                toPrint = f"Building the engine of {model} for {width}x{height}"
+                logging.info(toPrint)
+                print(green(toPrint))
+
+                if model.startswith("rife"):
+                    from theanimescripter.unifiedInterpolate import RifeTensorRT
+
+                    RifeTensorRT(model, interpolateFactor, width, height, half, ensemble)
+                else:
+                    from theanimescripter.unifiedUpscale import UniversalTensorRT
+
+                    UniversalTensorRT(model, upscaleFactor, half, width, height)
+
+            except Exception as e:
+                failed.append(f"{model} {resolution}")
+                logging.error(f"Could not build the engine of {model} for {resolution}: {e}")
+                print(red(f"Could not build the engine of {model} for {resolution}: {e}"))
+
+    if failed:
+        print(yellow(f"{len(failed)} engines failed to build: {', '.join(failed)}"))
+    else:
+        print(green("All engines are built!"))
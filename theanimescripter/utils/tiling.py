@@ -0,0 +1,149 @@
+import torch
+
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def tileStarts(size: int, tileSize: int, overlap: int) -> list:
+    """
+    Offsets of fixed size tiles covering an axis, the last tile is moved back so it ends on the border instead of being cut short.
+    """
+    if size <= tileSize:
+        return [0]
+
+    starts = list(range(0, size - tileSize, tileSize - overlap))
+    starts.append(size - tileSize)
+    return starts
+
+
+def featherRamp(length: int, overlap: int, blendStart: bool, blendEnd: bool) -> torch.Tensor:
+    """
+    A 1D blending weight that fades in and out over the overlap on the sides that touch another tile.
+    """
+    ramp = torch.ones(length)
+    if overlap > 0:
+        edge = torch.arange(1, overlap + 1, dtype=torch.float32) / (overlap + 1)
+        if blendStart:
+            ramp[:overlap] = edge
+        if blendEnd:
+            ramp[-overlap:] = torch.minimum(ramp[-overlap:], edge.flip(0))
+    return ramp
+
+
+class TiledUpscaler:
+    def __init__(
+        self,
+        runTile: Callable[[torch.Tensor], torch.Tensor],
+        upscaleFactor: int = 2,
+        tileSize: int = 512,
+        overlap: int = 16,
+        threads: int = 1,
+    ):
+        """
+        Runs an upscaler over overlapping tiles and feathers the seams, peak memory then depends on the tile size
+        rather than the frame size.
+
+        runTile: Callable - Upscales a (N, C, tileH, tileW) tensor, every call gets the same tile shape for a given frame size.
+        upscaleFactor: int - The factor the model upscales by.
+        tileSize: int - The size of the square tiles in input pixels.
+        overlap: int - How many input pixels neighbouring tiles share, the seams are blended across them.
+        threads: int - How many tiles run at once, runTile has to be thread safe when this is above 1.
+        """
+        self.runTile = runTile
+        self.upscaleFactor = upscaleFactor
+        self.tileSize = tileSize
+        self.overlap = min(max(overlap, 0), tileSize // 2)
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self.layoutKey = None
+
+    def prepareLayout(self, height: int, width: int, device: torch.device, dtype: torch.dtype):
+        """
+        Tile positions, blending masks and the normalization map only depend on the frame size, they are built once.
+        """
+        scale = self.upscaleFactor
+        tileH, tileW = min(self.tileSize, height), min(self.tileSize, width)
+        startsY = tileStarts(height, tileH, self.overlap)
+        startsX = tileStarts(width, tileW, self.overlap)
+        overlap = self.overlap * scale
+
+        self.tiles = []
+        weights = torch.zeros((1, 1, height * scale, width * scale), device=device, dtype=torch.float32)
+        masks = {}
+        for i, y in enumerate(startsY):
+            for j, x in enumerate(startsX):
+                edges = (i > 0, i < len(startsY) - 1, j > 0, j < len(startsX) - 1)
+                if edges not in masks:
+                    rampY = featherRamp(tileH * scale, overlap, edges[0], edges[1])
+                    rampX = featherRamp(tileW * scale, overlap, edges[2], edges[3])
+                    masks[edges] = (rampY[:, None] * rampX[None, :]).to(device)
+
+                mask = masks[edges]
+                weights[..., y * scale : (y + tileH) * scale, x * scale : (x + tileW) * scale] += mask
+                self.tiles.append((y, x, mask.to(dtype)))
+
+        self.tileShape = (tileH, tileW)
+        self.inverseWeights = weights.reciprocal_().to(dtype)
+        self.layoutKey = (height, width, device, dtype)
+
+    def runTileInThread(self, tile: torch.Tensor, ready: torch.cuda.Event = None) -> torch.Tensor:
+        # Inference mode and the current CUDA stream are thread local, the tile waits until the frame it is cut from is written
+        with torch.inference_mode():
+            if ready is not None:
+                torch.cuda.current_stream(tile.device).wait_event(ready)
+            output = self.runTile(tile)
+            if output.is_cuda:
+                torch.cuda.current_stream(output.device).synchronize()
+            return output
+
+    @torch.inference_mode()
+    def run(self, frame: torch.Tensor) -> torch.Tensor:
+        """
+        frame: torch.Tensor - A (N, C, H, W) tensor, already normalized the way the model expects it.
+
+        Returns a (N, C, H * upscaleFactor, W * upscaleFactor) tensor.
+        """
+        height, width = frame.shape[-2:]
+        if (height, width, frame.device, frame.dtype) != self.layoutKey:
+            self.prepareLayout(height, width, frame.device, frame.dtype)
+
+        if len(self.tiles) == 1:
+            return self.runTile(frame)
+
+        scale = self.upscaleFactor
+        tileH, tileW = self.tileShape
+        output = None
+
+        def accumulate(y, x, mask, tileOutput):
+            nonlocal output
+            if output is None:
+                output = torch.zeros(
+                    (*tileOutput.shape[:-2], height * scale, width * scale),
+                    device=tileOutput.device,
+                    dtype=tileOutput.dtype,
+                )
+            output[..., y * scale : (y + tileH) * scale, x * scale : (x + tileW) * scale].addcmul_(tileOutput, mask)
+
+        if self.executor is None:
+            for y, x, mask in self.tiles:
+                accumulate(y, x, mask, self.runTile(frame[..., y : y + tileH, x : x + tileW]))
+        else:
+            ready = None
+            if frame.is_cuda:
+                ready = torch.cuda.Event()
+                ready.record(torch.cuda.current_stream(frame.device))
+
+            futures = {
+                self.executor.submit(
+                    self.runTileInThread, frame[..., y : y + tileH, x : x + tileW], ready
+                ): (y, x, mask)
+                for y, x, mask in self.tiles
+            }
+            for future in as_completed(futures):
+                tileOutput = future.result()
+                if tileOutput.is_cuda:
+                    # Allocated on the stream of a worker but read here, it must not be reused before the stitching is done
+                    tileOutput.record_stream(torch.cuda.current_stream(tileOutput.device))
+                accumulate(*futures[future], tileOutput)
+
+        return output.mul_(self.inverseWeights)
@@ -87,7 +87,8 @@ def TensorRTEngineLoader(
     except FileNotFoundError:
         return None, None
 
-    except Exception:
+    except Exception as e:
+        logging.error(f"Could not load the engine {enginePath}: {e}")
         print(yellow("Model engine was found but it is outdated due to a Driver or TensorRT Update, creating a new engine."))
         return None, None
 
@@ -107,6 +108,28 @@ def TensorRTEngineNameHandler(
     """
     enginePrecision = "fp16" if fp16 else "fp32"
     height, width = optInputShape[2], optInputShape[3]
+    # Engines with a batch profile get their own name, single frame engines keep the old one
+    batch = f"_b{optInputShape[0]}" if optInputShape[0] > 1 else ""
     return modelPath.replace(
-        ".onnx", f"_{enginePrecision}_{height}x{width}.engine"
+        ".onnx", f"_{enginePrecision}_{height}x{width}{batch}.engine"
     )
+
+
+def TensorRTDynamicBatch(
+    modelPath: str = "",
+) -> bool:
+    """
+    Check whether the first input of an ONNX model has a dynamic batch dimension.
+
+    Parameters:
+        modelPath (str): The path to the ONNX model.
+    """
+    try:
+        import onnx
+
+        model = onnx.load(modelPath, load_external_data=False)
+        batch = model.graph.input[0].type.tensor_type.shape.dim[0]
+        return bool(batch.dim_param) or batch.dim_value == 0
+    except Exception as e:
+        logging.info(f"Could not read the batch dimension of {modelPath}: {e}")
+        return False
@@ -0,0 +1,228 @@
+import os
+import json
+import hashlib
+import logging
+import platform
+import subprocess
+import threading
+
+from contextlib import contextmanager
+
+if platform.system() == "Windows":
+    mainPath = os.path.join(os.getenv("APPDATA"), "TheAnimeScripter")
+else:
+    mainPath = os.path.join(
+        os.getenv("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
+        "TheAnimeScripter",
+    )
+
+cachePath = os.path.join(mainPath, "probeCache")
+
+# How much of the start and the end of a file goes into its fingerprint
+SAMPLE_SIZE = 1 << 20
+
+
+def fileFingerprint(path: str) -> str:
+    """
+    Identify a file by its path, size, modification time and a hash of its first and last megabyte.
+
+    Hashing the whole file would cost as much as probing it, the samples catch files that were replaced in place
+    by a tool that preserves the modification time.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+
+    return f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{digest.hexdigest()}"
+
+
+@contextmanager
+def fileLock(path: str):
+    """
+    Hold an exclusive lock on path between processes, the chunk workers update the same entries at once.
+    """
+    with open(path, "a+b") as f:
+        if platform.system() == "Windows":
+            import msvcrt
+
+            f.seek(0)
+            # LK_LOCK gives up after about 10 seconds, keep trying until the other process is done
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ProbeCache:
+    def __init__(self, cacheDir: str = cachePath):
+        """
+        Everything TAS learns about an input by probing it, stored on disk with one JSON file per input.
+
+        Entries are keyed by the file fingerprint, a changed file simply misses the cache. Every kind of probe result
+        is a section of the entry so the metadata and the frame index of a file live side by side.
+
+        cacheDir: str - Where the entries are stored.
+        """
+        self.cacheDir = cacheDir
+        self.lock = threading.Lock()
+
+    def entryPath(self, fingerprint: str) -> str:
+        return os.path.join(
+            self.cacheDir, hashlib.sha1(fingerprint.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def readEntry(self, fingerprint: str) -> dict:
+        path = self.entryPath(fingerprint)
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except Exception as e:
+            logging.error(f"Could not read the probe cache entry {path}: {e}")
+            return {}
+
+        return entry if entry.get("fingerprint") == fingerprint else {}
+
+    def get(self, input: str, section: str):
+        """
+        Returns the cached section for input, or None if the file changed or was never probed.
+        """
+        return self.readEntry(fileFingerprint(input)).get(section)
+
+    def put(self, input: str, section: str, data):
+        self.update(input, section, lambda _: data)
+
+    def update(self, input: str, section: str, change):
+        """
+        Replace a section with change(the section as it is on disk right now, None if there is none).
+
+        The read and the write happen under a lock shared with the other processes, so parallel chunk workers that
+        store their results in the same section never drop each other's updates.
+        """
+        fingerprint = fileFingerprint(input)
+        path = self.entryPath(fingerprint)
+
+        try:
+            with self.lock:
+                os.makedirs(self.cacheDir, exist_ok=True)
+                with fileLock(f"{path}.lock"):
+                    entry = self.readEntry(fingerprint)
+                    entry["fingerprint"] = fingerprint
+                    entry[section] = change(entry.get(section))
+
+                    tempPath = f"{path}.{os.getpid()}.tmp"
+                    with open(tempPath, "w") as f:
+                        json.dump(entry, f)
+                    os.replace(tempPath, path)
+        except Exception as e:
+            logging.error(f"Could not write the probe cache entry {path}: {e}")
+
+
+probeCache = ProbeCache()
+
+
+def parseRate(rate: str) -> float:
+    try:
+        numerator, _, denominator = str(rate).partition("/")
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probeVideo(ffprobePath: str, input: str, useCache: bool = True) -> dict:
+    """
+    Collect everything the pipeline needs to know about an input in a single ffprobe pass.
+
+    ffprobePath: str - The path to the FFPROBE executable.
+    input: str - The path to the input video file.
+    useCache: bool - Whether to look the result up in and store it into the probe cache.
+
+    Returns a dict with the properties of the first video stream, its color metadata, the stream counts and the
+    duration of the container.
+    """
+    if useCache:
+        cached = probeCache.get(input, "metadata")
+        # Entries from before the audio codec was probed are refreshed
+        if cached is not None and "audioCodec" in cached:
+            logging.info(f"Loaded the metadata of {input} from the probe cache")
+            return cached
+
+    command = [
+        ffprobePath,
+        "-v", "error",
+        "-show_streams",
+        "-show_format",
+        "-of", "json",
+        input,
+    ]
+
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout)
+    streams = probe.get("streams", [])
+    container = probe.get("format", {})
+
+    # Cover art shows up as a single frame video stream
+    videoStreams = [
+        stream
+        for stream in streams
+        if stream.get("codec_type") == "video"
+        and not stream.get("disposition", {}).get("attached_pic", 0)
+    ]
+    if not videoStreams:
+        raise ValueError(f"No video stream found in {input}")
+
+    video = videoStreams[0]
+    fps = parseRate(video.get("avg_frame_rate")) or parseRate(video.get("r_frame_rate"))
+    duration = float(video.get("duration") or container.get("duration") or 0)
+
+    nbFrames = int(video.get("nb_frames") or 0)
+    if nbFrames == 0:
+        nbFrames = round(duration * fps)
+
+    metadata = {
+        "width": int(video.get("width", 0)),
+        "height": int(video.get("height", 0)),
+        "fps": fps,
+        "nbFrames": nbFrames,
+        "duration": duration,
+        "codec": video.get("codec_name", "unknown"),
+        "pixFmt": video.get("pix_fmt", "unknown"),
+        "colorRange": video.get("color_range"),
+        "colorSpace": video.get("color_space"),
+        "colorTransfer": video.get("color_transfer"),
+        "colorPrimaries": video.get("color_primaries"),
+        "videoStreams": len(videoStreams),
+        "audioStreams": sum(stream.get("codec_type") == "audio" for stream in streams),
+        "subtitleStreams": sum(stream.get("codec_type") == "subtitle" for stream in streams),
+        "audioCodec": next(
+            (stream.get("codec_name") for stream in streams if stream.get("codec_type") == "audio"), None
+        ),
+    }
+    metadata["hasAudio"] = metadata["audioStreams"] > 0
+
+    if useCache:
+        probeCache.put(input, "metadata", metadata)
+    return metadata
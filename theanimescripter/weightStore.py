@@ -0,0 +1,318 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import requests
+
+from alive_progress import alive_bar
+
+# Seconds a connection may stay silent before a download source is given up on
+TIMEOUT = 30
+
+# The file in the weights folder, or in a mirror, that holds the checksum of every model
+INDEX_NAME = "checksums.json"
+
+
+def hashFile(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WeightStore:
+    def __init__(self, root: str, mirror: str = None):
+        """
+        Keeps the checksum of every model in the weights folder.
+
+        Downloads are written to a temporary file next to their destination while they are hashed, and only renamed into
+        place once they are complete, so a model that exists is always a whole one. The index remembers the size,
+        modification time and sha256 of every model, checking them at startup only costs a stat per file.
+
+        A mirror, a local directory or an HTTP server laid out like the weights folder or with all the files in one place,
+        is tried before the upstream URLs. The weights folder of a machine that already has the models, checksums.json
+        included, works as a mirror as is and the checksums are verified on the way.
+
+        root: str - The weights folder.
+        mirror: str - A directory or URL to fetch the models from first.
+        """
+        self.root = root
+        self.mirror = mirror
+        self.indexPath = os.path.join(root, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.mirrorIndex = None
+
+    def load(self) -> dict:
+        try:
+            with open(self.indexPath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save(self, index: dict):
+        # Prefetch threads and chunk workers update the index at the same time, a half written file must never be visible
+        temporary = f"{self.indexPath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=4, sort_keys=True)
+            os.replace(temporary, self.indexPath)
+        except Exception as e:
+            logging.error(f"Could not save the checksums of the weights: {e}")
+
+    def record(self, relative: str, sha: str):
+        path = os.path.join(self.root, relative)
+        stat = os.stat(path)
+        with self.lock:
+            index = self.load()
+            index[relative] = {"sha256": sha, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+            self.save(index)
+
+    def expected(self, relative: str) -> str:
+        """
+        The checksum the mirror publishes for a model, None without a mirror or if it does not list the model.
+        """
+        if self.mirror is None:
+            return None
+
+        if self.mirrorIndex is None:
+            self.mirrorIndex = {}
+            try:
+                if self.mirror.startswith(("http://", "https://")):
+                    response = requests.get(f"{self.mirror.rstrip('/')}/{INDEX_NAME}", timeout=TIMEOUT)
+                    if response.ok:
+                        self.mirrorIndex = response.json()
+                elif os.path.isfile(os.path.join(self.mirror, INDEX_NAME)):
+                    with open(os.path.join(self.mirror, INDEX_NAME), "r", encoding="utf-8") as f:
+                        self.mirrorIndex = json.load(f)
+            except Exception as e:
+                logging.error(f"Could not read the checksums of the mirror {self.mirror}: {e}")
+
+        entry = self.mirrorIndex.get(relative) or self.mirrorIndex.get(os.path.basename(relative))
+        return entry["sha256"] if entry else None
+
+    def check(self, relative: str, entry: dict, deep: bool = False) -> tuple:
+        """
+        Compare a model against its index entry, or against the checksum of the mirror when it has none.
+        Returns whether it matches and the entry to keep for it, None if the entry does not change.
+        """
+        path = os.path.join(self.root, relative)
+        stat = os.stat(path)
+        if entry is not None and not deep:
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                return True, None
+
+        sha = hashFile(path)
+        expected = entry["sha256"] if entry is not None else self.expected(relative)
+        if expected is not None and sha != expected:
+            logging.error(f"{path} does not match its checksum")
+            return False, None
+
+        return True, {"sha256": sha, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def verify(self, relative: str, deep: bool = False) -> bool:
+        """
+        Whether a model exists and matches its checksum.
+
+        A model whose size and modification time match the index is trusted without reading it, unless deep is set.
+        Models from before the index are hashed once and added to it, against the checksum of the mirror if it has one.
+        """
+        path = os.path.join(self.root, relative)
+        if not os.path.isfile(path):
+            return os.path.isdir(path)
+
+        matches, entry = self.check(relative, self.load().get(relative), deep)
+        if entry is not None:
+            with self.lock:
+                index = self.load()
+                index[relative] = entry
+                self.save(index)
+        return matches
+
+    def verifyAll(self, deep: bool = False) -> int:
+        """
+        Check every model in the index and delete the ones that do not match, so they are fetched again when they are needed.
+        Without deep this only stats the files. Returns how many models were removed.
+
+        Only what fetch downloaded is in the index, the engines and manifests TensorRT writes next to the models are
+        rebuilt and rewritten legitimately and are never checked.
+        """
+        with self.lock:
+            index = self.load()
+            changed = False
+            removed = 0
+            for relative, entry in list(index.items()):
+                path = os.path.join(self.root, relative)
+                if not os.path.isfile(path):
+                    del index[relative]
+                    changed = True
+                    continue
+
+                matches, newEntry = self.check(relative, entry, deep)
+                if not matches:
+                    logging.error(f"Removing {path}, it will be downloaded again when it is needed")
+                    os.remove(path)
+                    del index[relative]
+                    removed += 1
+                    changed = True
+                elif newEntry is not None and newEntry != entry:
+                    index[relative] = newEntry
+                    changed = True
+
+            if changed:
+                self.save(index)
+
+        return removed
+
+    def sources(self, relative: str, urls: list) -> list:
+        """
+        Where a model can be fetched from, the mirror first in both layouts and then the upstream URLs.
+        """
+        candidates = []
+        if self.mirror is not None:
+            for mirrored in (relative, os.path.basename(relative)):
+                if self.mirror.startswith(("http://", "https://")):
+                    candidates.append(f"{self.mirror.rstrip('/')}/{mirrored}")
+                else:
+                    candidates.append(os.path.join(self.mirror, *mirrored.split("/")))
+        return candidates + list(urls)
+
+    def fetch(self, relative: str, urls: list, title: str = "model", progress: bool = True, record: bool = True) -> str:
+        """
+        Download a model into the weights folder from the first source that has it and return its path.
+
+        relative: str - The path of the model inside the weights folder, with forward slashes.
+        urls: list - The upstream URLs, tried after the mirror.
+        title: str - The name on the progress bar.
+        progress: bool - Show a progress bar, parallel downloads turn it off.
+        record: bool - Add the model to the index, archives that are extracted right away are not kept.
+        """
+        path = os.path.join(self.root, relative)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        expected = self.expected(relative)
+
+        errors = []
+        for source in self.sources(relative, urls):
+            try:
+                if source.startswith(("http://", "https://")):
+                    sha = self.download(source, temporary, title, progress)
+                elif os.path.isfile(source):
+                    sha = self.copy(source, temporary)
+                else:
+                    continue
+
+                if expected is not None and sha != expected:
+                    raise ValueError(f"the checksum {sha} does not match the mirror's {expected}")
+
+                os.replace(temporary, path)
+                if record:
+                    self.record(relative, sha)
+                logging.info(f"Fetched {relative} from {source}")
+                return path
+
+            except Exception as e:
+                errors.append(f"{source}: {e}")
+                logging.warning(f"Could not fetch {relative} from {source}: {e}")
+            finally:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+
+        raise RuntimeError(f"Could not fetch {relative} from any source, {'; '.join(errors) or 'no source has it'}")
+
+    def copy(self, source: str, temporary: str) -> str:
+        digest = hashlib.sha256()
+        with open(source, "rb") as src, open(temporary, "wb") as dst:
+            for chunk in iter(lambda: src.read(1 << 20), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+        return digest.hexdigest()
+
+    def download(self, url: str, temporary: str, title: str, progress: bool) -> str:
+        response = requests.get(url, stream=True, timeout=TIMEOUT)
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        with open(temporary, "wb") as file:
+            if not progress:
+                for data in response.iter_content(chunk_size=1024 * 1024):
+                    digest.update(data)
+                    file.write(data)
+                return digest.hexdigest()
+
+            try:
+                totalSizeInMB = int(response.headers.get("content-length", 0)) / (1024 * 1024)
+            except Exception as e:
+                totalSizeInMB = 0
+                logging.error(e)
+
+            with alive_bar(
+                int(totalSizeInMB + 1),  # Hacky but it works
+                title=f"Downloading {title} model",
+                bar="smooth",
+                unit="MB",
+                spinner=True,
+                enrich_print=False,
+                receipt=True,
+                monitor=True,
+                elapsed=True,
+                stats=False,
+                dual_line=False,
+                force_tty=True,
+            ) as bar:
+                for data in response.iter_content(chunk_size=1024 * 1024):
+                    digest.update(data)
+                    file.write(data)
+                    bar(int(len(data) / (1024 * 1024)))
+
+        return digest.hexdigest()
+
+    def mirrorFolder(self, relative: str) -> str:
+        """
+        Copy an extracted model folder, like the NCNN models, from a local mirror. Returns its path, None if the mirror does not have it.
+        """
+        if self.mirror is None or self.mirror.startswith(("http://", "https://")):
+            return None
+
+        for mirrored in (relative, os.path.basename(relative)):
+            source = os.path.join(self.mirror, *mirrored.split("/"))
+            if os.path.isdir(source):
+                target = os.path.join(self.root, relative)
+                staging = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                shutil.copytree(source, staging)
+                if os.path.exists(target):
+                    shutil.rmtree(target)
+                os.replace(staging, target)
+                logging.info(f"Fetched {relative} from {source}")
+                return target
+
+        return None
+
+    def extract(self, relative: str, archive: str) -> str:
+        """
+        Unpack a zipped model next to the archive, the folder only appears once it is fully extracted.
+        """
+        import zipfile
+        import tempfile
+
+        folder = os.path.dirname(archive)
+        staging = tempfile.mkdtemp(prefix="extract_", dir=folder)
+        try:
+            with zipfile.ZipFile(archive, "r") as zipRef:
+                zipRef.extractall(staging)
+
+            name = os.path.basename(relative)[:-4]
+            target = os.path.join(folder, name)
+            extracted = os.path.join(staging, name)
+            if not os.path.exists(extracted):
+                # The archive has no top level folder
+                extracted = staging
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(extracted, target)
+            return target
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            os.remove(archive)